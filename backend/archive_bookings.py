@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Archive past room bookings
+Moves bookings that ended more than ARCHIVE_AFTER_DAYS days ago (default 30)
+into the booking archive, which keeps them out of live queries but available
+to the @booking-archive report. Meant to run nightly, e.g. from cron:
+
+    30 3 * * * cd /path/to/backend && venv/bin/python archive_bookings.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add instance directory to Python path
+instance_dir = Path(__file__).parent / "instance"
+sys.path.insert(0, str(instance_dir))
+
+# Script to run inside Plone
+archive_script = '''
+import transaction
+from AccessControl.SecurityManagement import newSecurityManager
+from Testing.makerequest import makerequest
+
+# Get the Zope app
+app = globals()['app']
+app = makerequest(app)
+
+# Login as admin
+acl_users = app.acl_users
+user = acl_users.getUserById('admin')
+if user:
+    newSecurityManager(None, user)
+
+# Get Plone site
+if 'Plone' in app.objectIds():
+    plone = app.Plone
+
+    # Set up the site context properly
+    from zope.component.hooks import setSite
+    setSite(plone)
+
+    import os
+    from retreat.booking_archive import ARCHIVE_AFTER_DAYS
+    from retreat.booking_archive import archive_bookings
+
+    days = int(os.environ.get('ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS))
+    print(f"Archiving bookings that ended more than {days} days ago...")
+    print("-" * 60)
+
+    count = archive_bookings(days=days)
+    transaction.commit()
+
+    print(f"Archived {count} bookings")
+    print("Done!")
+
+else:
+    print("Error: Plone site not found!")
+'''
+
+def main():
+    """Main function"""
+    print("Archiving bookings for Camp Coordinator...")
+    print("-" * 60)
+
+    # Write the script
+    script_file = instance_dir / "archive_bookings_temp.py"
+    script_file.write_text(archive_script)
+
+    # Run the script
+    import subprocess
+
+    # Activate virtualenv in the environment
+    env = os.environ.copy()
+    venv_dir = Path(__file__).parent / "venv"
+    backend_dir = Path(__file__).parent
+    env['PATH'] = f"{venv_dir}/bin:{env['PATH']}"
+    env['VIRTUAL_ENV'] = str(venv_dir)
+    # Add src directory to Python path for custom code
+    env['PYTHONPATH'] = f"{backend_dir}/src:{env.get('PYTHONPATH', '')}"
+
+    try:
+        result = subprocess.run(
+            ["zconsole", "run", "etc/zope.conf", "archive_bookings_temp.py"],
+            cwd=instance_dir,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+
+        if result.stdout:
+            print(result.stdout)
+        if result.stderr:
+            print(result.stderr)
+
+    finally:
+        # Clean up
+        if script_file.exists():
+            script_file.unlink()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""Benchmark sending a camp alert to 2,000 participants
+
+Sends one message per participant through the bulk dispatcher to a local
+fake provider. Like Resend, the provider takes a while per request,
+accepts up to 100 emails per batch request, answers 429 above its request
+rate and rejects a whole batch with 422 when one address is bad. Reports
+the time until every participant has their email, the number of provider
+requests and the per-recipient outcome:
+
+    PYTHONPATH=src venv/bin/python benchmark_bulk_send.py
+"""
+
+import threading
+import time
+from collections import Counter
+
+from retreat.bulk_email import FAILED
+from retreat.bulk_email import SENT
+from retreat.bulk_email import BulkDispatcher
+from retreat.bulk_email import TokenBucket
+
+PARTICIPANTS = 2000
+# Addresses the provider rejects, and malformed ones
+REJECTED = 5
+MALFORMED = 5
+
+PROVIDER_RATE = 2
+PROVIDER_BATCH = 100
+LATENCY = 0.25
+LATENCY_PER_EMAIL = 0.002
+
+
+class ProviderError(Exception):
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeProvider:
+    """Local stand-in for the email provider"""
+
+    def __init__(self):
+        self.requests = 0
+        self.throttled = 0
+        self.delivered = Counter()
+        self._recent = []
+        self._lock = threading.Lock()
+
+    def _request(self, emails):
+        with self._lock:
+            now = time.monotonic()
+            self._recent = [t for t in self._recent if t > now - 1]
+            self.requests += 1
+            if len(self._recent) >= PROVIDER_RATE:
+                self.throttled += 1
+                raise ProviderError(429, "Too many requests")
+            self._recent.append(now)
+        time.sleep(LATENCY + LATENCY_PER_EMAIL * len(emails))
+        if len(emails) > PROVIDER_BATCH:
+            raise ProviderError(422, "Too many emails in batch")
+        for email in emails:
+            if email['to'][0].endswith('@rejected.example.org'):
+                raise ProviderError(422, f"Invalid `to` field: {email['to'][0]}")
+        with self._lock:
+            self.delivered.update(email['to'][0] for email in emails)
+        return [f"id-{email['to'][0]}" for email in emails]
+
+    def send(self, email):
+        return self._request([email])[0]
+
+    def send_batch(self, emails):
+        return self._request(emails)
+
+
+def participants():
+    addresses = [f'participant{i}@example.org' for i in range(PARTICIPANTS - REJECTED - MALFORMED)]
+    addresses += [f'bounce{i}@rejected.example.org' for i in range(REJECTED)]
+    addresses += [f'participant{i} at example.org' for i in range(MALFORMED)]
+    # Spread the bad addresses over the batches
+    return addresses[::2] + addresses[1::2]
+
+
+def run(label, batch_size, threads, recipients):
+    provider = FakeProvider()
+    dispatcher = BulkDispatcher(provider, TokenBucket(PROVIDER_RATE), batch_size, threads)
+    email = {'from': 'test@example.org', 'subject': 'Camp alert', 'html': '<p>Test</p>'}
+    started = time.perf_counter()
+    results = dispatcher.dispatch(email, recipients)
+    elapsed = time.perf_counter() - started
+
+    states = Counter(state for state, _detail in results.values())
+    good = [a for a in recipients if a.endswith('@example.org') and '@' in a and ' ' not in a
+            and not a.endswith('@rejected.example.org')]
+    ok = (
+        states[SENT] == len(good)
+        and all(provider.delivered[a] == 1 for a in good)
+        and states[FAILED] == len(recipients) - len(good)
+    )
+    print(f"{label:<34} {len(recipients):>6} {elapsed:>9.1f} {provider.requests:>9} "
+          f"{provider.throttled:>6} {states[SENT]:>6} {states[FAILED]:>6}  {'✓' if ok else '✗'}")
+    return ok
+
+
+def main():
+    recipients = participants()
+    print(f"Camp alert to {PARTICIPANTS} participants, provider limit {PROVIDER_RATE} requests/s, "
+          f"{LATENCY * 1000:.0f} ms per request")
+    print("-" * 80)
+    print(f"{'':<34} {'to':>6} {'time (s)':>9} {'requests':>9} {'429s':>6} {'sent':>6} {'failed':>6}")
+    ok = True
+    # One request per participant takes PARTICIPANTS / PROVIDER_RATE seconds,
+    # so only a sample is sent that way
+    sample = recipients[:100]
+    ok &= run("one request each (100 of them)", 1, 4, sample)
+    print(f"{'  projected for all':<34} {PARTICIPANTS:>6} {PARTICIPANTS / PROVIDER_RATE:>9.1f}")
+    ok &= run("batches of 50, 4 threads", 50, 4, recipients)
+    ok &= run("batches of 100, 1 thread", 100, 1, recipients)
+    ok &= run("batches of 100, 4 threads", 100, 4, recipients)
+    clean = [address for address in recipients if address.startswith('participant') and ' ' not in address]
+    ok &= run("batches of 100, no bad addresses", 100, 4, clean)
+    if not ok:
+        print("✗ Some participants did not get the expected outcome")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Benchmark comment edit latency against activity log size
+
+Compares editing one comment in the bucketed activity log with the old
+approach of scanning and rewriting the whole activity_log list. Uses an
+in-memory ZODB, so no running Plone instance is needed:
+
+    PYTHONPATH=src venv/bin/python benchmark_comment_edits.py
+"""
+
+import time
+import uuid
+
+import transaction
+from persistent import Persistent
+from ZODB import DB
+
+from retreat.activity_log import ActivityLog
+
+LOG_SIZES = [10, 1000, 50000]
+EDITS = 200
+
+
+class LegacyIssue(Persistent):
+    """Stand-in for an issue storing its activities in a JSON list"""
+
+    def __init__(self):
+        self.activity_log = []
+
+
+def make_activity(i):
+    return {
+        'id': str(uuid.uuid4()),
+        'type': 'comment',
+        'timestamp': '2025-07-01T12:00:00Z',
+        'user_id': 'staff',
+        'user_fullname': 'Camp Staff',
+        'data': {'text': f'Comment number {i}'},
+        'deleted': False,
+    }
+
+
+def edit_bucketed(root, comment_id, text):
+    bucket, activity = root['log'].find(comment_id)
+    activity['data']['text'] = text
+    activity['edited'] = True
+    bucket._p_changed = True
+    transaction.commit()
+
+
+def edit_legacy(root, comment_id, text):
+    activity_log = root['legacy'].activity_log
+    for activity in activity_log:
+        if activity['id'] == comment_id:
+            activity['data']['text'] = text
+            activity['edited'] = True
+            break
+    root['legacy'].activity_log = activity_log
+    root['legacy']._p_changed = True
+    transaction.commit()
+
+
+def run(size):
+    db = DB(None)
+    connection = db.open()
+    root = connection.root()
+
+    activities = [make_activity(i) for i in range(size)]
+    root['log'] = ActivityLog()
+    root['log'].extend(dict(a, data=dict(a['data'])) for a in activities)
+    root['legacy'] = LegacyIssue()
+    root['legacy'].activity_log = [dict(a, data=dict(a['data'])) for a in activities]
+    transaction.commit()
+
+    # Edit comments spread over the whole log, like real PATCH requests
+    targets = [activities[(i * 7919) % size]['id'] for i in range(EDITS)]
+
+    results = {}
+    for name, edit in (('bucketed', edit_bucketed), ('legacy', edit_legacy)):
+        # Drop the cache so every edit pays for loading what it touches
+        connection.cacheMinimize()
+        started = time.perf_counter()
+        for i, comment_id in enumerate(targets):
+            edit(root, comment_id, f'Edited {i}')
+        results[name] = (time.perf_counter() - started) / EDITS * 1000
+
+    connection.close()
+    db.close()
+    return results
+
+
+def main():
+    print(f"Comment edit latency ({EDITS} edits per size)")
+    print("-" * 60)
+    print(f"{'activities':>12} {'bucketed (ms)':>15} {'legacy (ms)':>15} {'speedup':>10}")
+    for size in LOG_SIZES:
+        results = run(size)
+        speedup = results['legacy'] / results['bucketed']
+        print(f"{size:>12} {results['bucketed']:>15.3f} {results['legacy']:>15.3f} {speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
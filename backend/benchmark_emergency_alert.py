@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""Benchmark the time to last delivery of an emergency alert
+
+Sends an emergency alert to 2,000 participants by email, SMS and push,
+through the local fake email provider of benchmark_bulk_send.py and the
+local SMS and push stand-ins with some latency per request. Compares the
+old path, where the alert waits in the outbox behind a regular alert, with
+the emergency fan-out on its own and while a regular alert is being sent,
+with and without the emergency emails going first in the rate limit:
+
+    PYTHONPATH=src venv/bin/python benchmark_emergency_alert.py
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_bulk_send import PROVIDER_RATE
+from benchmark_bulk_send import FakeProvider
+from retreat.bulk_email import SENT
+from retreat.bulk_email import BulkDispatcher
+from retreat.bulk_email import TokenBucket
+from retreat.emergency_alerts import EMERGENCY_THREADS
+from retreat.emergency_alerts import Fanout
+from retreat.transports import EmailTransport
+from retreat.transports import LocalPushTransport
+from retreat.transports import LocalSmsTransport
+
+PARTICIPANTS = 2000
+
+SMS_LATENCY = 0.4
+PUSH_LATENCY = 0.15
+
+ALERT = {
+    'from': 'test@example.org',
+    'subject': 'Storm warning',
+    'html': '<p>Go to the main hall now</p>',
+    'text': 'Go to the main hall now',
+    'url': 'http://localhost:8080/Plone/alerts/storm-warning',
+}
+
+
+def addresses():
+    return {
+        'email': [f'participant{i}@example.org' for i in range(PARTICIPANTS)],
+        # Every third participant has no mobile number
+        'sms': [f'+4479{i:08d}' for i in range(PARTICIPANTS) if i % 3],
+        'push': [f'participant{i}' for i in range(PARTICIPANTS)],
+    }
+
+
+def regular_alert(bucket, recipients):
+    """Send a regular alert like the outbox worker does."""
+    dispatcher = BulkDispatcher(FakeProvider(), bucket, 100, 4)
+    email = {'from': 'test@example.org', 'subject': 'Dinner moved', 'html': '<p>To 7pm</p>'}
+    return dispatcher.dispatch(email, recipients)
+
+
+def check(results, expected):
+    return (sorted(results) == sorted(expected)
+            and all(state == SENT for state, _detail in results.values()))
+
+
+def report(label, times, ok):
+    line = ' '.join(f"{times[name]:>8.1f}" if name in times else f"{'-':>8}"
+                    for name in ('email', 'sms', 'push'))
+    total = max(times.values())
+    print(f"{label:<42} {line} {total:>8.1f}  {'✓' if ok else '✗'}")
+    return ok
+
+
+def queued(recipients):
+    """The old path, email only, delivered after a regular alert ahead of it."""
+    bucket = TokenBucket(PROVIDER_RATE)
+    created = time.time()
+    regular_alert(bucket, recipients['email'])
+    results = regular_alert(bucket, recipients['email'])
+    return report("outbox, behind a regular alert", {'email': time.time() - created},
+                  check(results, recipients['email']))
+
+
+def fanout(label, recipients, busy=False, priority=True):
+    bucket = TokenBucket(PROVIDER_RATE)
+    provider = FakeProvider()
+    transports = {
+        'email': EmailTransport(BulkDispatcher(provider, bucket, 100, 1, priority=priority)),
+        'sms': LocalSmsTransport(latency=SMS_LATENCY),
+        'push': LocalPushTransport(latency=PUSH_LATENCY),
+    }
+    if busy:
+        other = threading.Thread(target=regular_alert, args=(bucket, recipients['email']))
+        other.start()
+        # Let the regular alert get going
+        time.sleep(1)
+    with ThreadPoolExecutor(max_workers=EMERGENCY_THREADS) as pool:
+        sending = Fanout(ALERT, transports, recipients).start(pool)
+        sending.wait()
+    if busy:
+        other.join()
+    times = {name: finished - sending.created for name, finished in sending.finished.items()}
+    ok = (
+        all(check(sending.results[name], recipients[name]) for name in recipients)
+        and all(provider.delivered[address] == 1 for address in recipients['email'])
+        and len(transports['sms'].sent) == len(recipients['sms'])
+        and len(transports['push'].sent) == len(recipients['push'])
+    )
+    return report(label, times, ok)
+
+
+def main():
+    recipients = addresses()
+    print(f"Emergency alert to {PARTICIPANTS} participants, email provider limit "
+          f"{PROVIDER_RATE} requests/s")
+    print(f"Time to last delivery in seconds, {len(recipients['sms'])} have a mobile number")
+    print("-" * 84)
+    print(f"{'':<42} {'email':>8} {'sms':>8} {'push':>8} {'all':>8}")
+    ok = True
+    ok &= queued(recipients)
+    ok &= fanout("emergency fan-out", recipients)
+    ok &= fanout("emergency fan-out, during regular alert", recipients, busy=True)
+    ok &= fanout("  same without priority", recipients, busy=True, priority=False)
+    if not ok:
+        print("✗ Some participants did not get the alert exactly once")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
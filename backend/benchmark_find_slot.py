@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Benchmark @find-slot searches against the number of bookings
+
+Fills the booking index of five rooms with bookings during opening hours
+and times finding the first free slots, the way @find-slot does. Uses an
+in-memory ZODB, so no running Plone instance is needed:
+
+    PYTHONPATH=src venv/bin/python benchmark_find_slot.py
+"""
+
+import random
+import time
+
+import transaction
+from ZODB import DB
+
+from retreat.booking_index import SLOT_SECONDS
+from retreat.booking_index import BookingIndex
+from retreat.booking_index import find_slots
+
+ROOMS = [f'room-{i}' for i in range(5)]
+BOOKING_COUNTS = [100, 1000, 5000, 20000]
+QUERIES = 500
+
+DAY = 24 * 60 * 60
+OPENING = 8 * 3600
+CLOSING = 20 * 3600
+
+
+def opening_hours(duration):
+    """Keep slots between 8:00 and 20:00 UTC"""
+    def fit(t):
+        midnight = t - t % DAY
+        if t < midnight + OPENING:
+            return midnight + OPENING
+        if t + duration > midnight + CLOSING:
+            return midnight + DAY + OPENING
+        return t
+    return fit
+
+
+def fill(booking_index, count, rng):
+    """Book about half of the opening hours of as many days as needed"""
+    # Bookings take 2.5 slots on average
+    per_day = (CLOSING - OPENING) // SLOT_SECONDS * len(ROOMS)
+    days = max(count * 5 // per_day, 1)
+    booked = 0
+    while booked < count:
+        room_uid = rng.choice(ROOMS)
+        day = rng.randrange(days)
+        start = day * DAY + OPENING + rng.randrange(24) * SLOT_SECONDS
+        end = min(start + rng.randint(1, 4) * SLOT_SECONDS, day * DAY + CLOSING)
+        room = booking_index.room(room_uid)
+        if room is not None and list(room.overlapping(start, end)):
+            continue
+        booking_index.index(f'booking-{booked}', room_uid, start, end)
+        booked += 1
+    return days
+
+
+def run(count):
+    rng = random.Random(count)
+    db = DB(None)
+    connection = db.open()
+    root = connection.root()
+    root['index'] = BookingIndex()
+    days = fill(root['index'], count, rng)
+    transaction.commit()
+    connection.cacheMinimize()
+
+    timings = []
+    for _ in range(QUERIES):
+        duration = rng.randint(1, 4) * SLOT_SECONDS
+        start = rng.randrange(days) * DAY
+        rooms = rng.sample(ROOMS, rng.randint(1, len(ROOMS)))
+        started = time.perf_counter()
+        find_slots(root['index'], rooms, start, start + 14 * DAY, duration, 5, opening_hours(duration))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    connection.close()
+    db.close()
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+def main():
+    print(f"Find slot latency ({QUERIES} queries per size, 5 slots over 14 days)")
+    print("-" * 60)
+    print(f"{'bookings':>10} {'median (ms)':>14} {'p99 (ms)':>12}")
+    for count in BOOKING_COUNTS:
+        median, p99 = run(count)
+        print(f"{count:>10} {median:>14.3f} {p99:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
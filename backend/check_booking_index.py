@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""Randomized check of the booking interval index against a brute-force scan
+
+Adds, moves and removes random bookings in a few rooms and compares the
+single and batched overlap queries of the booking index with a linear scan
+over all bookings after every step. Uses an in-memory ZODB, so no running
+Plone instance is needed:
+
+    PYTHONPATH=src venv/bin/python check_booking_index.py [seed]
+"""
+
+import random
+import sys
+
+import transaction
+from ZODB import DB
+
+from retreat.booking_index import BookingIndex
+
+ROOMS = ['room-a', 'room-b', 'room-c']
+OPERATIONS = 5000
+QUERIES_PER_OPERATION = 5
+
+HALF_HOUR = 30 * 60
+# Two weeks of half-hour slots
+SLOTS = 14 * 48
+
+
+def random_interval(rng):
+    """Random half-hour aligned interval, with the occasional long one"""
+    start = rng.randrange(SLOTS) * HALF_HOUR
+    slots = rng.randint(1, 10) if rng.random() < 0.95 else rng.randint(11, 96)
+    return start, start + slots * HALF_HOUR
+
+
+def brute_force(bookings, room_uid, start, end, exclude_uid=None):
+    return sorted(
+        (uid, booking_start, booking_end)
+        for uid, (booking_room, booking_start, booking_end) in bookings.items()
+        if booking_room == room_uid and booking_start < end and booking_end > start
+        and uid != exclude_uid
+    )
+
+
+def main():
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else random.randrange(1 << 30)
+    rng = random.Random(seed)
+    print(f"Checking booking index with seed {seed}")
+    print("-" * 60)
+
+    db = DB(None)
+    connection = db.open()
+    root = connection.root()
+    root['index'] = BookingIndex()
+    transaction.commit()
+
+    bookings = {}
+    queries = 0
+    for step in range(OPERATIONS):
+        booking_index = root['index']
+        action = rng.random()
+        if action < 0.6 or not bookings:
+            uid = f'booking-{step}'
+            room_uid = rng.choice(ROOMS)
+            start, end = random_interval(rng)
+            booking_index.index(uid, room_uid, start, end)
+            bookings[uid] = (room_uid, start, end)
+        elif action < 0.8:
+            # Edit an existing booking, possibly moving it to another room
+            uid = rng.choice(list(bookings))
+            room_uid = rng.choice(ROOMS)
+            start, end = random_interval(rng)
+            booking_index.index(uid, room_uid, start, end)
+            bookings[uid] = (room_uid, start, end)
+        else:
+            uid = rng.choice(list(bookings))
+            booking_index.unindex(uid)
+            del bookings[uid]
+
+        if step % 100 == 0:
+            transaction.commit()
+            # Make the next queries load the index from the database
+            connection.cacheMinimize()
+
+        for _ in range(QUERIES_PER_OPERATION):
+            room_uid = rng.choice(ROOMS)
+            start, end = random_interval(rng)
+            exclude_uid = rng.choice(list(bookings)) if bookings and rng.random() < 0.2 else None
+            expected = brute_force(bookings, room_uid, start, end, exclude_uid)
+            found = sorted(root['index'].overlapping(room_uid, start, end, exclude_uid))
+            queries += 1
+            if found != expected:
+                print(f"✗ Mismatch at step {step} for {room_uid} [{start}, {end})")
+                print(f"  index:       {found}")
+                print(f"  brute force: {expected}")
+                return 1
+
+        if step % 50 == 0:
+            # Batched lookups, as used for bulk bookings
+            room_uid = rng.choice(ROOMS)
+            ranges = [random_interval(rng) for _ in range(20)]
+            batched = root['index'].overlapping_many(room_uid, ranges)
+            for (start, end), found in zip(ranges, batched):
+                queries += 1
+                if sorted(found) != brute_force(bookings, room_uid, start, end):
+                    print(f"✗ Batched mismatch at step {step} for {room_uid} [{start}, {end})")
+                    return 1
+
+    if len(root['index']) != len(bookings):
+        print(f"✗ Index holds {len(root['index'])} bookings, expected {len(bookings)}")
+        return 1
+
+    transaction.commit()
+    connection.close()
+    db.close()
+
+    print(f"✓ {OPERATIONS} operations and {queries} queries matched "
+          f"({len(bookings)} bookings left)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
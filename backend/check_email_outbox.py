@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Check the email outbox against an unreliable, slow fake provider
+
+Queues messages in committed and in aborted transactions, then lets the
+outbox worker deliver them through a fake provider that is slow and fails
+a share of the sends. Checks that every committed message arrives, that
+no message of an aborted transaction is ever sent, and that queueing
+takes the same time however slow the provider is. Uses an in-memory ZODB,
+so no running Plone instance is needed:
+
+    PYTHONPATH=src venv/bin/python check_email_outbox.py [seed]
+"""
+
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import transaction
+from ZODB import DB
+
+from retreat import email_outbox
+from retreat.email_outbox import Outbox
+from retreat.email_outbox import OutboxWorker
+
+MESSAGES = 250
+# Every fifth transaction is aborted
+ABORT_EVERY = 5
+FAILURE_RATE = 0.3
+PROVIDER_SECONDS = 0.05
+
+
+class FakeProvider:
+    """Records sends, failing some of them"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.sent = Counter()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def send(self, email_data):
+        time.sleep(PROVIDER_SECONDS)
+        with self.lock:
+            self.calls += 1
+            if self.rng.random() < FAILURE_RATE:
+                raise ConnectionError("provider unavailable")
+            self.sent[email_data['subject']] += 1
+
+
+class RootOutboxWorker(OutboxWorker):
+    """Worker on an outbox in the database root instead of a Plone site"""
+
+    def outbox(self, connection, path):
+        return connection.root().get('outbox')
+
+
+def email(subject):
+    return {'from': 'test@example.org', 'to': ['someone@example.org'],
+            'subject': subject, 'html': '<p>Test</p>'}
+
+
+def main():
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else random.randrange(1 << 30)
+    rng = random.Random(seed)
+    print(f"Checking email outbox with seed {seed}")
+    print("-" * 60)
+
+    # Retry at once instead of backing off for minutes, quietly
+    email_outbox.BACKOFF_BASE = 0
+    logging.getLogger('retreat.email_outbox').setLevel(logging.ERROR)
+
+    db = DB(None)
+    connection = db.open()
+    root = connection.root()
+    root['outbox'] = Outbox()
+    transaction.commit()
+
+    committed = set()
+    timings = []
+    for number in range(MESSAGES):
+        subject = f'message-{number}'
+        started = time.perf_counter()
+        root['outbox'].add(email(subject), 'test')
+        if number % ABORT_EVERY == ABORT_EVERY - 1:
+            transaction.abort()
+        else:
+            transaction.commit()
+            committed.add(subject)
+        timings.append(time.perf_counter() - started)
+    connection.close()
+
+    provider = FakeProvider(rng)
+    worker = RootOutboxWorker(db, send=provider.send)
+    rounds = 0
+    while worker.deliver('/') and rounds < 1000:
+        rounds += 1
+
+    connection = db.open()
+    stats = connection.root()['outbox'].stats()
+    connection.close()
+    db.close()
+
+    failed = False
+    missing = committed - set(provider.sent)
+    if missing:
+        print(f"✗ {len(missing)} committed messages were not delivered")
+        failed = True
+    leaked = set(provider.sent) - committed
+    if leaked:
+        print(f"✗ {len(leaked)} messages of aborted transactions were sent")
+        failed = True
+    duplicates = [subject for subject, count in provider.sent.items() if count > 1]
+    if duplicates:
+        print(f"✗ {len(duplicates)} messages were sent more than once")
+        failed = True
+    if stats['pending'] or stats['failed'] or stats['sent'] != len(committed):
+        print(f"✗ Unexpected outbox state {stats}")
+        failed = True
+
+    timings.sort()
+    print(f"Queued {len(committed)} committed and {len(timings) - len(committed)} aborted messages, "
+          f"median {timings[len(timings) // 2] * 1000:.2f} ms per transaction "
+          f"(provider takes {PROVIDER_SECONDS * 1000:.0f} ms per send)")
+    print(f"Delivered in {rounds} rounds with {provider.calls} provider calls, "
+          f"{provider.calls - len(provider.sent)} failed and retried")
+    if failed:
+        return 1
+    print("✓ Every committed message was delivered exactly once, none of the aborted ones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""Randomized check of the room utilization counters
+
+Adds, moves, cancels and archives random bookings and compares the
+incrementally maintained hourly counters with a brute-force count of the
+bookings that should be in them. Then recomputes the counters of the same
+bookings in one vectorized pass and checks that both agree, timing the
+recompute. Uses an in-memory ZODB, so no running Plone instance is needed:
+
+    PYTHONPATH=src venv/bin/python check_room_utilization.py [seed]
+"""
+
+import random
+import sys
+import time
+from collections import Counter
+
+import transaction
+from ZODB import DB
+
+from retreat import room_utilization
+from retreat.room_utilization import HOUR
+from retreat.room_utilization import RoomUtilization
+
+ROOMS = ['room-a', 'room-b', 'room-c', 'room-d']
+OPERATIONS = 20000
+
+HALF_HOUR = 30 * 60
+# Ninety days of half-hour slots
+SLOTS = 90 * 48
+# Bookings ending before this are in the past
+NOW = SLOTS // 2 * HALF_HOUR
+
+
+def random_interval(rng):
+    start = rng.randrange(SLOTS) * HALF_HOUR
+    return start, start + rng.randint(1, 10) * HALF_HOUR
+
+
+def brute_force(counted):
+    """Booked seconds and starts per (room, hour) of the counted bookings"""
+    booked = Counter()
+    starts = Counter()
+    for room_uid, start, end in counted:
+        for second in range(start, end, 60):
+            booked[room_uid, second // HOUR] += 60
+        starts[room_uid, start // HOUR] += 1
+    return booked, starts
+
+
+def counters(utilization):
+    booked = Counter()
+    starts = Counter()
+    for room_uid in utilization.room_uids():
+        room = utilization.room(room_uid)
+        booked.update({(room_uid, hour): seconds for hour, seconds in room.booked.items()})
+        starts.update({(room_uid, hour): count for hour, count in room.starts.items()})
+    return booked, starts
+
+
+def main():
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else random.randrange(1 << 30)
+    rng = random.Random(seed)
+    print(f"Checking room utilization with seed {seed}")
+    print("-" * 60)
+
+    db = DB(None)
+    connection = db.open()
+    root = connection.root()
+    root['utilization'] = RoomUtilization()
+    transaction.commit()
+
+    live = {}
+    # Bookings that ended before they were removed stay counted
+    kept = []
+    for step in range(OPERATIONS):
+        utilization = root['utilization']
+        action = rng.random()
+        if action < 0.6 or not live:
+            uid = f'booking-{step}'
+            live[uid] = (rng.choice(ROOMS), *random_interval(rng))
+            utilization.count(uid, *live[uid])
+        elif action < 0.8:
+            uid = rng.choice(list(live))
+            live[uid] = (rng.choice(ROOMS), *random_interval(rng))
+            utilization.count(uid, *live[uid])
+        else:
+            uid = rng.choice(list(live))
+            booking = live.pop(uid)
+            if booking[2] <= NOW:
+                kept.append(booking)
+            utilization.discount(uid, now=NOW)
+
+        if step % 500 == 0:
+            transaction.commit()
+            connection.cacheMinimize()
+
+    transaction.commit()
+    expected = brute_force(list(live.values()) + kept)
+    if counters(root['utilization']) != expected:
+        print("✗ Incremental counters differ from the brute-force count")
+        return 1
+    print(f"✓ Incremental counters match after {OPERATIONS} operations "
+          f"({len(live)} live and {len(kept)} past bookings)")
+
+    if room_utilization.numpy is None:
+        print("numpy is not installed, skipping the vectorized recompute")
+        return 0
+
+    records = [
+        (ROOMS.index(room_uid), start, end)
+        for room_uid, start, end in list(live.values()) + kept
+    ]
+    recomputed = RoomUtilization()
+    started = time.perf_counter()
+    room_utilization._recompute_numpy(recomputed, ROOMS, records)
+    elapsed = time.perf_counter() - started
+    if counters(recomputed) != expected:
+        print("✗ Vectorized recompute differs from the brute-force count")
+        return 1
+    print(f"✓ Vectorized recompute matches ({len(records)} bookings in {elapsed * 1000:.1f} ms)")
+
+    connection.close()
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Deliver queued emails from a separate process
+Runs the email outbox worker until interrupted. Start the instance with
+EMAIL_OUTBOX_WORKER=off so its processes don't deliver as well.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add instance directory to Python path
+instance_dir = Path(__file__).parent / "instance"
+sys.path.insert(0, str(instance_dir))
+
+# Script to run inside Plone
+worker_script = '''
+import logging
+from retreat.email_outbox import OutboxWorker
+
+logging.basicConfig(level=logging.INFO)
+
+# Get the Zope app
+app = globals()['app']
+
+print("Delivering queued emails, press Ctrl+C to stop")
+print("-" * 60)
+
+worker = OutboxWorker(app._p_jar.db())
+try:
+    worker.run()
+except KeyboardInterrupt:
+    print("Stopped")
+'''
+
+def main():
+    """Main function"""
+    print("Starting email outbox worker for Camp Coordinator...")
+    print("-" * 60)
+
+    # Write the script
+    script_file = instance_dir / "email_outbox_worker_temp.py"
+    script_file.write_text(worker_script)
+
+    # Run the script
+    import subprocess
+
+    # Activate virtualenv in the environment
+    env = os.environ.copy()
+    venv_dir = Path(__file__).parent / "venv"
+    backend_dir = Path(__file__).parent
+    env['PATH'] = f"{venv_dir}/bin:{env['PATH']}"
+    env['VIRTUAL_ENV'] = str(venv_dir)
+    # Add src directory to Python path for custom code
+    env['PYTHONPATH'] = f"{backend_dir}/src:{env.get('PYTHONPATH', '')}"
+    # The worker of this process is the one started below
+    env['EMAIL_OUTBOX_WORKER'] = 'off'
+
+    try:
+        # Output is streamed, the worker runs until interrupted
+        subprocess.run(
+            ["zconsole", "run", "etc/zope.conf", "email_outbox_worker_temp.py"],
+            cwd=instance_dir,
+            env=env,
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Clean up
+        if script_file.exists():
+            script_file.unlink()
+
+if __name__ == "__main__":
+    main()
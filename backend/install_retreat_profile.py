@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Install the retreat GenericSetup profile
+Adds the catalog indexes and metadata for issues and reindexes existing
+issues, or runs the pending upgrade steps if the profile is installed
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add instance directory to Python path
+instance_dir = Path(__file__).parent / "instance"
+sys.path.insert(0, str(instance_dir))
+
+# Script to run inside Plone
+install_script = '''
+import transaction
+from AccessControl.SecurityManagement import newSecurityManager
+from Testing.makerequest import makerequest
+from plone import api
+
+# Get the Zope app
+app = globals()['app']
+app = makerequest(app)
+
+# Login as admin
+acl_users = app.acl_users
+user = acl_users.getUserById('admin')
+if user:
+    newSecurityManager(None, user)
+
+# Get Plone site
+if 'Plone' in app.objectIds():
+    plone = app.Plone
+
+    # Set up the site context properly
+    from zope.component.hooks import setSite
+    setSite(plone)
+
+    print("Installing retreat profile...")
+    print("-" * 60)
+
+    setup_tool = api.portal.get_tool('portal_setup')
+    if setup_tool.getLastVersionForProfile('retreat:default') == 'unknown':
+        setup_tool.runAllImportStepsFromProfile('profile-retreat:default')
+        print("✓ Imported profile-retreat:default")
+
+        # Fill the new indexes and metadata columns for existing content
+        from retreat.identity_aliases import rebuild_aliases
+        from retreat.upgrades import reindex_bookings
+        from retreat.upgrades import reindex_issues
+        from retreat.upgrades import reindex_type
+        count = reindex_issues()
+        transaction.commit()
+        print(f"✓ Reindexed {count} issues")
+
+        rebuild_aliases()
+        count = reindex_bookings()
+        transaction.commit()
+        print(f"✓ Reindexed {count} room bookings")
+
+        count = reindex_type('conference_room')
+        transaction.commit()
+        print(f"✓ Reindexed {count} conference rooms")
+
+        from retreat.upgrades import partition_bookings
+        partition_bookings(setup_tool)
+        transaction.commit()
+        print("✓ Moved bookings into monthly containers")
+
+        from retreat.booking_index import rebuild_index
+        count = rebuild_index()
+        transaction.commit()
+        print(f"✓ Indexed {count} room bookings")
+
+        from retreat.room_utilization import recompute
+        count = recompute()
+        transaction.commit()
+        print(f"✓ Counted {count} bookings into room utilization")
+
+        from retreat.recipients import rebuild_recipients
+        count = rebuild_recipients()
+        transaction.commit()
+        print(f"✓ Indexed {count} notification recipients")
+    else:
+        # Already installed, run the pending upgrade steps
+        setup_tool.upgradeProfile('retreat:default')
+        transaction.commit()
+        version = setup_tool.getLastVersionForProfile('retreat:default')
+        print(f"✓ Upgraded retreat:default to {'.'.join(version)}")
+
+    print("Done!")
+
+else:
+    print("Error: Plone site not found!")
+'''
+
+def main():
+    """Main function"""
+    print("Installing retreat profile for Camp Coordinator...")
+    print("-" * 60)
+
+    # Write the script
+    script_file = instance_dir / "install_retreat_profile_temp.py"
+    script_file.write_text(install_script)
+
+    # Run the script
+    import subprocess
+
+    # Activate virtualenv in the environment
+    env = os.environ.copy()
+    venv_dir = Path(__file__).parent / "venv"
+    backend_dir = Path(__file__).parent
+    env['PATH'] = f"{venv_dir}/bin:{env['PATH']}"
+    env['VIRTUAL_ENV'] = str(venv_dir)
+    # Add src directory to Python path for custom code
+    env['PYTHONPATH'] = f"{backend_dir}/src:{env.get('PYTHONPATH', '')}"
+
+    try:
+        result = subprocess.run(
+            ["zconsole", "run", "etc/zope.conf", "install_retreat_profile_temp.py"],
+            cwd=instance_dir,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+
+        if result.stdout:
+            print(result.stdout)
+        if result.stderr:
+            print(result.stderr)
+
+    finally:
+        # Clean up
+        if script_file.exists():
+            script_file.unlink()
+
+if __name__ == "__main__":
+    main()
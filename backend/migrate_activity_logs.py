@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Migrate issue activity logs to the bucketed activity log storage
+Moves the legacy activity_log JSON lists into the per-issue IOBTree store
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add instance directory to Python path
+instance_dir = Path(__file__).parent / "instance"
+sys.path.insert(0, str(instance_dir))
+
+# Script to run inside Plone
+migrate_script = '''
+import transaction
+from AccessControl.SecurityManagement import newSecurityManager
+from Testing.makerequest import makerequest
+from plone import api
+
+# Get the Zope app
+app = globals()['app']
+app = makerequest(app)
+
+# Login as admin
+acl_users = app.acl_users
+user = acl_users.getUserById('admin')
+if user:
+    newSecurityManager(None, user)
+
+# Get Plone site
+if 'Plone' in app.objectIds():
+    plone = app.Plone
+
+    # Set up the site context properly
+    from zope.component.hooks import setSite
+    setSite(plone)
+
+    from retreat.activity_log import migrate_activity_log
+
+    print("Migrating issue activity logs...")
+    print("-" * 60)
+
+    catalog = api.portal.get_tool('portal_catalog')
+    migrated_issues = 0
+    migrated_activities = 0
+
+    for i, brain in enumerate(catalog(portal_type='issue'), 1):
+        issue = brain.getObject()
+        count = migrate_activity_log(issue)
+        if count:
+            migrated_issues += 1
+            migrated_activities += count
+            print(f"  ✓ {brain.getPath()}: {count} activities")
+
+        # Commit in batches to keep transactions small
+        if i % 100 == 0:
+            transaction.commit()
+
+    transaction.commit()
+
+    print("-" * 60)
+    print(f"Migrated {migrated_activities} activities on {migrated_issues} issues")
+    print("Done!")
+
+else:
+    print("Error: Plone site not found!")
+'''
+
+def main():
+    """Main function"""
+    print("Migrating activity logs for Camp Coordinator...")
+    print("-" * 60)
+
+    # Write the script
+    script_file = instance_dir / "migrate_activity_logs_temp.py"
+    script_file.write_text(migrate_script)
+
+    # Run the script
+    import subprocess
+
+    # Activate virtualenv in the environment
+    env = os.environ.copy()
+    venv_dir = Path(__file__).parent / "venv"
+    backend_dir = Path(__file__).parent
+    env['PATH'] = f"{venv_dir}/bin:{env['PATH']}"
+    env['VIRTUAL_ENV'] = str(venv_dir)
+    # Add src directory to Python path for custom code
+    env['PYTHONPATH'] = f"{backend_dir}/src:{env.get('PYTHONPATH', '')}"
+
+    try:
+        result = subprocess.run(
+            ["zconsole", "run", "etc/zope.conf", "migrate_activity_logs_temp.py"],
+            cwd=instance_dir,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+
+        if result.stdout:
+            print(result.stdout)
+        if result.stderr:
+            print(result.stderr)
+
+    finally:
+        # Clean up
+        if script_file.exists():
+            script_file.unlink()
+
+if __name__ == "__main__":
+    main()
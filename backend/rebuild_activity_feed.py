@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Rebuild the site-wide activity feed index
+Re-indexes the activities of every issue into the @activity-feed index
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add instance directory to Python path
+instance_dir = Path(__file__).parent / "instance"
+sys.path.insert(0, str(instance_dir))
+
+# Script to run inside Plone
+rebuild_script = '''
+import transaction
+from AccessControl.SecurityManagement import newSecurityManager
+from Testing.makerequest import makerequest
+
+# Get the Zope app
+app = globals()['app']
+app = makerequest(app)
+
+# Login as admin
+acl_users = app.acl_users
+user = acl_users.getUserById('admin')
+if user:
+    newSecurityManager(None, user)
+
+# Get Plone site
+if 'Plone' in app.objectIds():
+    plone = app.Plone
+
+    # Set up the site context properly
+    from zope.component.hooks import setSite
+    setSite(plone)
+
+    from retreat.activity_feed import rebuild_feed
+
+    print("Rebuilding activity feed...")
+    print("-" * 60)
+
+    count = rebuild_feed()
+    transaction.commit()
+
+    print(f"Indexed {count} activities")
+    print("Done!")
+
+else:
+    print("Error: Plone site not found!")
+'''
+
+def main():
+    """Main function"""
+    print("Rebuilding activity feed for Camp Coordinator...")
+    print("-" * 60)
+
+    # Write the script
+    script_file = instance_dir / "rebuild_activity_feed_temp.py"
+    script_file.write_text(rebuild_script)
+
+    # Run the script
+    import subprocess
+
+    # Activate virtualenv in the environment
+    env = os.environ.copy()
+    venv_dir = Path(__file__).parent / "venv"
+    backend_dir = Path(__file__).parent
+    env['PATH'] = f"{venv_dir}/bin:{env['PATH']}"
+    env['VIRTUAL_ENV'] = str(venv_dir)
+    # Add src directory to Python path for custom code
+    env['PYTHONPATH'] = f"{backend_dir}/src:{env.get('PYTHONPATH', '')}"
+
+    try:
+        result = subprocess.run(
+            ["zconsole", "run", "etc/zope.conf", "rebuild_activity_feed_temp.py"],
+            cwd=instance_dir,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+
+        if result.stdout:
+            print(result.stdout)
+        if result.stderr:
+            print(result.stderr)
+
+    finally:
+        # Clean up
+        if script_file.exists():
+            script_file.unlink()
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,10 @@
 from datetime import datetime
 import uuid
 from plone import api
+from . import activity_feed
+from . import display_names
+from .activity_log import get_activity_log
 from zope.lifecycleevent.interfaces import IObjectModifiedEvent
-import transaction
 
 
 def add_activity(issue, activity_type, data, user=None):
@@ -19,16 +21,13 @@ def add_activity(issue, activity_type, data, user=None):
     if user is None:
         user = api.user.get_current()
     
-    # Get current activity log or initialize
-    activity_log = getattr(issue, 'activity_log', []) or []
-    
     # Create new activity
     activity = {
         'id': str(uuid.uuid4()),
         'type': activity_type,
         'timestamp': datetime.now().isoformat() + 'Z',
         'user_id': user.getId(),
-        'user_fullname': user.getProperty('fullname', user.getId()),
+        'user_fullname': display_names.get_display_name(user.getId(), user),
         'data': data
     }
     
@@ -36,11 +35,10 @@ def add_activity(issue, activity_type, data, user=None):
     if activity_type == 'comment':
         activity['deleted'] = False
     
-    # Append to log
-    activity_log.append(activity)
-    
-    # Update issue with retry logic for concurrent updates
-    _update_activity_log_with_retry(issue, activity_log)
+    # Append to log - only the tail bucket is written. Concurrent appends
+    # are merged by the bucket's conflict resolution at commit time.
+    get_activity_log(issue, create=True).append(activity)
+    activity_feed.index_activity(issue, activity)
     
     return activity
 
@@ -60,23 +58,18 @@ def update_comment(issue, comment_id, new_text, user=None):
     if user is None:
         user = api.user.get_current()
     
-    activity_log = getattr(issue, 'activity_log', []) or []
+    activity_log = get_activity_log(issue, create=True)
+    bucket, activity = activity_log.find(comment_id)
+    if not _is_own_comment(activity, user):
+        return False
     
-    for activity in activity_log:
-        if (activity.get('id') == comment_id and 
-            activity.get('type') == 'comment' and
-            activity.get('user_id') == user.getId() and
-            not activity.get('deleted', False)):
-            
-            # Update the comment
-            activity['data']['text'] = new_text
-            activity['edited'] = True
-            activity['edited_timestamp'] = datetime.now().isoformat() + 'Z'
-            
-            _update_activity_log_with_retry(issue, activity_log)
-            return True
-    
-    return False
+    # Update the comment
+    activity['data']['text'] = new_text
+    activity['edited'] = True
+    activity['edited_timestamp'] = datetime.now().isoformat() + 'Z'
+    activity_log.mark_changed(bucket)
+    activity_feed.index_activity(issue, activity)
+    return True
 
 
 def delete_comment(issue, comment_id, user=None):
@@ -93,47 +86,26 @@ def delete_comment(issue, comment_id, user=None):
     if user is None:
         user = api.user.get_current()
     
-    activity_log = getattr(issue, 'activity_log', []) or []
-    
-    for activity in activity_log:
-        if (activity.get('id') == comment_id and 
-            activity.get('type') == 'comment' and
-            activity.get('user_id') == user.getId() and
-            not activity.get('deleted', False)):
-            
-            # Soft delete
-            activity['deleted'] = True
-            activity['deleted_timestamp'] = datetime.now().isoformat() + 'Z'
-            
-            _update_activity_log_with_retry(issue, activity_log)
-            return True
+    activity_log = get_activity_log(issue, create=True)
+    bucket, activity = activity_log.find(comment_id)
+    if not _is_own_comment(activity, user):
+        return False
     
-    return False
+    # Soft delete
+    activity['deleted'] = True
+    activity['deleted_timestamp'] = datetime.now().isoformat() + 'Z'
+    activity_log.mark_changed(bucket)
+    activity_log.record_deletion()
+    activity_feed.unindex_activity(activity)
+    return True
 
 
-def _update_activity_log_with_retry(issue, activity_log, max_retries=3):
-    """Update activity log with retry logic for concurrent updates."""
-    for attempt in range(max_retries):
-        try:
-            # Create a savepoint
-            savepoint = transaction.savepoint()
-            
-            # Update the field
-            issue.activity_log = activity_log
-            issue.reindexObject(idxs=['modified'])
-            
-            # Try to commit the transaction
-            transaction.commit()
-            return
-            
-        except Exception as e:
-            # Rollback to savepoint and retry
-            savepoint.rollback()
-            if attempt == max_retries - 1:
-                raise
-            # Refresh the object and its activity log
-            issue._p_jar.sync()
-            activity_log = getattr(issue, 'activity_log', []) or []
+def _is_own_comment(activity, user):
+    """Check that an activity is a live comment written by user."""
+    return (activity is not None and
+            activity.get('type') == 'comment' and
+            activity.get('user_id') == user.getId() and
+            not activity.get('deleted', False))
 
 
 def log_issue_changes(event):
@@ -8,13 +8,56 @@ from zope.interface import Interface
 from plone import api
 from plone.restapi.serializer.converters import json_compatible
 from . import activities
+from . import activity_feed
+from . import activity_log
+import hashlib
 import json
 
 
+# Upper bound for the ?limit= parameter of @activities
+MAX_LIMIT = 1000
+
+
+def _visible_to(user_id):
+    """Return a filter hiding soft-deleted comments from everyone but their authors."""
+    def visible(activity):
+        if activity.get('type') == 'comment' and activity.get('deleted', False):
+            return activity.get('user_id') == user_id
+        return True
+    return visible
+
+
+def _activities_etag(context, user_id, limit=None, before=None, since=None):
+    """ETag of a page of an issue's activity stream as seen by a user.
+    
+    Built from the activity version counter, so no log bucket is loaded.
+    Deleted comments are only shown to their authors, so the user is part
+    of the tag, as are the normalized page parameters, so that different
+    pages of the same stream never share a tag.
+    """
+    version = activity_log.get_version(context)
+    key = f'{user_id or ""}|{limit}|{before}|{since}'
+    key_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    return f'"{version}-{key_hash}"'
+
+
+def _etag_matches(request, etag):
+    """Check an ETag against the request's If-None-Match header."""
+    header = request.getHeader('If-None-Match', '') or ''
+    tags = [tag.strip() for tag in header.split(',')]
+    # If-None-Match uses weak comparison
+    tags = [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+    return etag in tags or '*' in tags
+
+
 @implementer(IExpandableElement)
 @adapter(Interface, Interface)
 class Activities:
-    """Expandable element to include activities in issue serialization."""
+    """Expandable element to include activities in issue serialization.
+    
+    A client passing the ``etag`` it got before as ``?activities_etag=``
+    gets ``not_modified`` instead of the items while the stream is unchanged.
+    """
     
     def __init__(self, context, request):
         self.context = context
@@ -29,29 +72,39 @@ class Activities:
         if not expand or getattr(self.context, 'portal_type', None) != 'issue':
             return result
 
-        # Get activity log
-        activity_log = getattr(self.context, 'activity_log', []) or []
-        
-        # Filter out soft-deleted comments for non-owners
         current_user = api.user.get_current()
-        filtered_activities = []
+        etag = _activities_etag(self.context, current_user.getId())
+        result['activities']['etag'] = etag
         
-        for activity in activity_log:
-            if activity.get('type') == 'comment' and activity.get('deleted', False):
-                # Only show deleted comments to their authors
-                if activity.get('user_id') == current_user.getId():
-                    filtered_activities.append(activity)
-            else:
-                filtered_activities.append(activity)
+        # The client already has this version - skip loading the log. The
+        # If-None-Match header belongs to the content GET, so the tag the
+        # client has comes as an explicit query parameter
+        if self.request.form.get('activities_etag') == etag:
+            result['activities']['not_modified'] = True
+            return result
         
-        result['activities']['items'] = filtered_activities
-        result['activities']['items_total'] = len(filtered_activities)
+        # Filter out soft-deleted comments for non-owners
+        entries, has_more = activity_log.get_page(
+            self.context, visible=_visible_to(current_user.getId())
+        )
+        
+        result['activities']['items'] = [activity for position, activity in entries]
+        result['activities']['items_total'] = activity_log.count_activities(self.context)
         
         return result
 
 
 class ActivitiesGet(Service):
-    """Get activities for an issue."""
+    """Get activities for an issue.
+    
+    Supports cursor pagination: ``?limit=`` returns the newest activities,
+    ``?before=<cursor>`` pages towards older ones and ``?since=<cursor>``
+    returns only the activities added after the cursor.
+    
+    Responses carry an ETag built from the issue's activity version and the
+    page parameters, and conditional requests with a matching If-None-Match
+    get a 304.
+    """
 
     def reply(self):
         # Check if this is an issue
@@ -59,25 +112,52 @@ class ActivitiesGet(Service):
             self.request.response.setStatus(400)
             return {'error': 'This endpoint is only available for issues'}
         
-        # Get activity log
-        activity_log = getattr(self.context, 'activity_log', []) or []
+        try:
+            limit = self.request.form.get('limit')
+            limit = min(int(limit), MAX_LIMIT) if limit else None
+            if limit is not None and limit < 1:
+                raise ValueError(limit)
+            before = self.request.form.get('before')
+            before = activity_log.decode_cursor(before) if before else None
+            since = self.request.form.get('since')
+            since = activity_log.decode_cursor(since) if since else None
+        except ValueError:
+            self.request.response.setStatus(400)
+            return {'error': 'Invalid limit, before or since parameter'}
         
-        # Filter out soft-deleted comments for non-owners
         current_user = api.user.get_current()
-        filtered_activities = []
         
-        for activity in activity_log:
-            if activity.get('type') == 'comment' and activity.get('deleted', False):
-                # Only show deleted comments to their authors
-                if activity.get('user_id') == current_user.getId():
-                    filtered_activities.append(activity)
-            else:
-                filtered_activities.append(activity)
+        # Answer polls for an unchanged stream from the version counter alone
+        etag = _activities_etag(self.context, current_user.getId(), limit, before, since)
+        self.request.response.setHeader('ETag', etag)
+        self.request.response.setHeader('Cache-Control', 'private, no-cache')
+        if _etag_matches(self.request, etag):
+            return self.reply_no_content(status=304)
+        
+        # Filter out soft-deleted comments for non-owners
+        entries, has_more = activity_log.get_page(
+            self.context,
+            limit=limit,
+            before=before,
+            since=since,
+            visible=_visible_to(current_user.getId())
+        )
+        
+        # Cursors of the page edges - 'before' pages back, 'since' polls for new items
+        first_cursor = activity_log.encode_cursor(entries[0][0]) if entries else None
+        last_cursor = activity_log.encode_cursor(entries[-1][0]) if entries else None
+        if last_cursor is None and since is not None:
+            last_cursor = activity_log.encode_cursor(since)
         
         return {
             '@id': f'{self.context.absolute_url()}/@activities',
-            'items': json_compatible(filtered_activities),
-            'items_total': len(filtered_activities)
+            'items': json_compatible([activity for position, activity in entries]),
+            'items_total': activity_log.count_activities(self.context),
+            'batching': {
+                'before': first_cursor,
+                'since': last_cursor,
+                'has_more': has_more
+            }
         }
 
 
@@ -201,4 +281,58 @@ class ActivitiesDelete(Service):
             return {'message': 'Comment deleted successfully'}
         else:
             self.request.response.setStatus(404)
-            return {'error': 'Comment not found or you do not have permission to delete it'}
\ No newline at end of file
+            return {'error': 'Comment not found or you do not have permission to delete it'}
+
+class ActivityFeedGet(Service):
+    """Site-wide activity feed across all issues, newest first.
+    
+    Reads the activity feed index only. Supports ``?limit=``,
+    ``?before=<cursor>``, ``?start=`` / ``?end=`` (ISO timestamps),
+    ``?type=`` (repeatable) and ``?user_id=`` filters.
+    """
+
+    def reply(self):
+        form = self.request.form
+        try:
+            limit = min(int(form.get('limit') or 50), MAX_LIMIT)
+            if limit < 1:
+                raise ValueError(limit)
+            before = form.get('before')
+            before = activity_feed.decode_cursor(before) if before else None
+            types = form.get('type') or None
+            if isinstance(types, str):
+                types = [types]
+            entries, has_more = activity_feed.query(
+                limit=limit,
+                before=before,
+                start=form.get('start') or None,
+                end=form.get('end') or None,
+                types=types,
+                user_id=form.get('user_id') or None
+            )
+        except ValueError:
+            self.request.response.setStatus(400)
+            return {'error': 'Invalid limit, before, start or end parameter'}
+        
+        # Resolve issue URLs from the catalog for this page only; issues the
+        # current user cannot see are left out
+        catalog = api.portal.get_tool('portal_catalog')
+        uids = list({entry['issue_uid'] for key, entry in entries})
+        urls = {brain.UID: brain.getURL() for brain in catalog(UID=uids)} if uids else {}
+        
+        items = []
+        for key, entry in entries:
+            if entry['issue_uid'] not in urls:
+                continue
+            item = dict(entry)
+            item['issue_url'] = urls[entry['issue_uid']]
+            items.append(item)
+        
+        return {
+            '@id': f'{self.context.absolute_url()}/@activity-feed',
+            'items': json_compatible(items),
+            'batching': {
+                'before': activity_feed.encode_cursor(entries[-1][0]) if entries else None,
+                'has_more': has_more
+            }
+        }
@@ -0,0 +1,176 @@
+"""Site-wide activity feed index.
+
+Every activity added to an issue is also recorded in a time-ordered
+``OOBTree`` stored in a portal annotation. Keys are ``(-microseconds, id)``
+so iterating the tree yields the newest activities first. Entries carry
+the issue UID and a compact summary, so the feed can be filtered and paged
+without waking any issue object.
+"""
+
+from base64 import urlsafe_b64decode
+from base64 import urlsafe_b64encode
+from BTrees.OOBTree import OOBTree
+from datetime import datetime
+from datetime import timedelta
+from plone import api
+from zope.annotation.interfaces import IAnnotations
+from .activity_log import iter_activities
+import binascii
+import logging
+
+logger = logging.getLogger('retreat.activity_feed')
+
+ANNOTATION_KEY = 'retreat.activity_feed'
+
+# Maximum length of comment text kept in a feed entry
+SUMMARY_LENGTH = 140
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_micros(timestamp):
+    """Convert an activity timestamp (ISO format) to microseconds since epoch.
+
+    Raises ValueError for malformed timestamps.
+    """
+    dt = datetime.fromisoformat(timestamp.rstrip('Z'))
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def _key(activity):
+    return (-to_micros(activity.get('timestamp')), activity['id'])
+
+
+def encode_cursor(key):
+    raw = f'{-key[0]}:{key[1]}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a feed cursor into an index key.
+
+    Raises ValueError for malformed cursors.
+    """
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        micros, activity_id = raw.split(':', 1)
+        return (-int(micros), activity_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+
+def get_feed(create=False):
+    """Get the feed index of the site, or None if there is none yet."""
+    annotations = IAnnotations(api.portal.get())
+    feed = annotations.get(ANNOTATION_KEY)
+    if feed is None and create:
+        feed = OOBTree()
+        annotations[ANNOTATION_KEY] = feed
+    return feed
+
+
+def _summarize(activity):
+    data = activity.get('data') or {}
+    if activity.get('type') == 'comment':
+        return (data.get('text') or '')[:SUMMARY_LENGTH]
+    if activity.get('type') == 'issue_created':
+        return data.get('title') or ''
+    if 'from' in data or 'to' in data:
+        return f"{data.get('from') or '-'} → {data.get('to') or '-'}"
+    return ''
+
+
+def _entry(issue, activity):
+    return {
+        'activity_id': activity['id'],
+        'type': activity.get('type'),
+        'timestamp': activity.get('timestamp'),
+        'user_id': activity.get('user_id'),
+        'user_fullname': activity.get('user_fullname'),
+        'issue_uid': issue.UID(),
+        'issue_title': issue.title,
+        'summary': _summarize(activity),
+    }
+
+
+def index_activity(issue, activity, feed=None):
+    """Add or update the feed entry of an activity."""
+    if feed is None:
+        feed = get_feed(create=True)
+    feed[_key(activity)] = _entry(issue, activity)
+
+
+def unindex_activity(activity):
+    """Remove the feed entry of an activity, e.g. a deleted comment."""
+    feed = get_feed()
+    if feed is not None:
+        feed.pop(_key(activity), None)
+
+
+def query(limit=50, before=None, start=None, end=None, types=None, user_id=None):
+    """Return feed entries newest first.
+
+    Args:
+        limit: Maximum number of entries
+        before: Only return entries older than this index key (a decoded cursor)
+        start: Earliest timestamp (inclusive), ISO format
+        end: Latest timestamp (inclusive), ISO format
+        types: Optional collection of activity types to include
+        user_id: Only include activities by this user
+
+    Returns:
+        Tuple of a list of ``(key, entry)`` pairs and a flag telling whether
+        older matching entries exist
+
+    Raises ValueError for malformed start or end timestamps.
+    """
+    # Keys are negated times, so the newest bound is the minimum key. A
+    # 1-tuple sorts before every key with the same time.
+    min_key = (-to_micros(end),) if end else None
+    max_key = (-to_micros(start) + 1,) if start else None
+
+    feed = get_feed()
+    if not feed:
+        return [], False
+
+    exclude_min = False
+    if before is not None and (min_key is None or before >= min_key):
+        min_key = before
+        exclude_min = True
+
+    entries = []
+    has_more = False
+    for key, entry in feed.items(min=min_key, max=max_key, excludemin=exclude_min):
+        if types and entry['type'] not in types:
+            continue
+        if user_id and entry['user_id'] != user_id:
+            continue
+        if len(entries) >= limit:
+            has_more = True
+            break
+        entries.append((key, entry))
+    return entries, has_more
+
+
+def rebuild_feed():
+    """Rebuild the feed from the activity logs of all issues.
+
+    Returns the number of indexed activities.
+    """
+    feed = get_feed(create=True)
+    feed.clear()
+    count = 0
+    catalog = api.portal.get_tool('portal_catalog')
+    for brain in catalog.unrestrictedSearchResults(portal_type='issue'):
+        issue = brain._unrestrictedGetObject()
+        for activity in iter_activities(issue):
+            if not activity.get('id'):
+                continue
+            if activity.get('type') == 'comment' and activity.get('deleted'):
+                continue
+            index_activity(issue, activity, feed)
+            count += 1
+    logger.info(f"Rebuilt activity feed with {count} activities")
+    return count
@@ -0,0 +1,394 @@
+"""Persistent bucketed storage for issue activity logs.
+
+The activity log used to live in the ``activity_log`` JSON field of the
+issue, which meant every new activity re-pickled the whole history. The log
+is now kept in an annotation as an ``IOBTree`` of fixed-size buckets, so an
+append only writes the tail bucket and readers only load the buckets they
+actually iterate over.
+"""
+
+from base64 import urlsafe_b64decode
+from base64 import urlsafe_b64encode
+from BTrees.IOBTree import IOBTree
+from BTrees.Length import Length
+from BTrees.OIBTree import OIBTree
+from persistent import Persistent
+from ZODB.POSException import ConflictError
+from zope.annotation.interfaces import IAnnotations
+import binascii
+import logging
+
+logger = logging.getLogger('retreat.activity_log')
+
+ANNOTATION_KEY = 'retreat.activity_log'
+
+# Number of activities stored per bucket
+BUCKET_SIZE = 50
+
+
+class ActivityBucket(Persistent):
+    """A chunk of consecutive activities.
+
+    Buckets are append-only, so concurrent transactions writing the same
+    bucket are merged by activity id at commit time instead of raising a
+    ConflictError.
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def append(self, activity):
+        self.items.append(activity)
+        self._p_changed = True
+
+    def _p_resolveConflict(self, old_state, saved_state, new_state):
+        """Merge two concurrent versions of the bucket.
+
+        Activities committed by the other transaction keep their position,
+        activities added by this transaction are appended after them. A
+        record edited by only one side takes that side's version; a record
+        edited by both sides, or removed, is a real conflict.
+        """
+        old = {a.get('id'): a for a in old_state.get('items', [])}
+        saved_items = saved_state.get('items', [])
+        new_items = new_state.get('items', [])
+        saved = {a.get('id'): a for a in saved_items}
+        new = {a.get('id'): a for a in new_items}
+
+        if None in old or None in saved or None in new:
+            raise ConflictError('Cannot merge activities without an id')
+        if not set(old) <= set(saved) or not set(old) <= set(new):
+            raise ConflictError('Activities were removed from the log')
+
+        merged = []
+        for activity in saved_items:
+            activity_id = activity['id']
+            mine = new.get(activity_id)
+            if activity_id in old and mine != old[activity_id]:
+                if activity != old[activity_id]:
+                    raise ConflictError('Activity edited concurrently')
+                activity = mine
+            merged.append(activity)
+        merged.extend(a for a in new_items if a['id'] not in saved)
+
+        state = dict(saved_state)
+        state['items'] = merged
+        return state
+
+
+class ActivityLog(Persistent):
+    """Append-only activity log split into buckets keyed by sequence number.
+
+    An ``OIBTree`` maps each activity id to the key of the bucket holding it,
+    so single activities can be found and edited without scanning the log.
+    """
+
+    # Logs created before the id index existed get it built on first write
+    _index = None
+    # Same for the soft-deleted comments counter and the version counter
+    _deleted = None
+    _version = None
+
+    def __init__(self):
+        self._buckets = IOBTree()
+        self._length = Length()
+        self._index = OIBTree()
+        self._deleted = Length()
+        self._version = Length()
+
+    def __len__(self):
+        return self._length()
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        for bucket in self._buckets.values():
+            for activity in bucket.items:
+                yield activity
+
+    def __reversed__(self):
+        for key in reversed(self.keys()):
+            for activity in reversed(self._buckets[key].items):
+                yield activity
+
+    def keys(self, min=None, max=None):
+        """Return the bucket keys between min and max (inclusive)."""
+        return list(self._buckets.keys(min=min, max=max))
+
+    def bucket_items(self, key):
+        return self._buckets[key].items
+
+    def visible_count(self):
+        """Number of activities that are not soft-deleted comments."""
+        deleted = self._deleted() if self._deleted is not None else 0
+        return len(self) - deleted
+
+    def version(self):
+        """Monotonically increasing number bumped on every change of the log.
+
+        Reading it doesn't load any bucket, so it is cheap to compare.
+        """
+        if self._version is None:
+            return len(self)
+        return self._version()
+
+    def bump_version(self):
+        if self._version is None:
+            # Start above anything version() may have returned so far
+            self._version = Length(len(self) + 1)
+        else:
+            self._version.change(1)
+
+    def mark_changed(self, bucket):
+        """Flag a bucket whose activities were edited in place."""
+        bucket._p_changed = True
+        self.bump_version()
+
+    def record_deletion(self):
+        """Count a comment that has just been soft-deleted."""
+        if self._deleted is None:
+            # The flag is already set, so the scan includes this deletion
+            self._deleted = Length(sum(1 for a in self if a.get('deleted')))
+        else:
+            self._deleted.change(1)
+
+    def _tail_bucket(self):
+        """Return the bucket new activities go into, creating it if needed."""
+        if self._buckets:
+            key = self._buckets.maxKey()
+            bucket = self._buckets[key]
+            if len(bucket) < BUCKET_SIZE:
+                return key, bucket
+            key += 1
+        else:
+            key = 0
+        bucket = ActivityBucket()
+        self._buckets[key] = bucket
+        return key, bucket
+
+    def _get_index(self):
+        if self._index is None:
+            self.rebuild_index()
+        return self._index
+
+    def rebuild_index(self):
+        """(Re)build the activity id to bucket key index."""
+        index = OIBTree()
+        for key, bucket in self._buckets.items():
+            for activity in bucket.items:
+                if activity.get('id'):
+                    index[activity['id']] = key
+        self._index = index
+
+    def append(self, activity):
+        """Append an activity, touching only the tail bucket.
+
+        The counter is a ``Length`` so concurrent appends don't conflict on it.
+        Two transactions that both open a new bucket for the same key still
+        conflict; the publisher retries the request in that case.
+        """
+        index = self._get_index()
+        key, bucket = self._tail_bucket()
+        bucket.append(activity)
+        if activity.get('id'):
+            index[activity['id']] = key
+        self._length.change(1)
+        self.bump_version()
+        if activity.get('deleted'):
+            self.record_deletion()
+
+    def extend(self, activities):
+        for activity in activities:
+            self.append(activity)
+
+    def find(self, activity_id):
+        """Return ``(bucket, activity)`` for an activity id or ``(None, None)``.
+
+        Only the bucket holding the activity is loaded.
+        """
+        key = self._get_index().get(activity_id)
+        if key is None:
+            return None, None
+        bucket = self._buckets[key]
+        for activity in bucket.items:
+            if activity.get('id') == activity_id:
+                return bucket, activity
+        return None, None
+
+
+class _LegacyLog:
+    """Read-only view of an unmigrated ``activity_log`` list.
+
+    The list is chunked the same way the migration fills buckets, so cursors
+    stay valid once the issue is migrated.
+    """
+
+    def __init__(self, activities):
+        self.activities = activities
+
+    def keys(self, min=None, max=None):
+        keys = range((len(self.activities) + BUCKET_SIZE - 1) // BUCKET_SIZE)
+        return [key for key in keys
+                if (min is None or key >= min) and (max is None or key <= max)]
+
+    def bucket_items(self, key):
+        return self.activities[key * BUCKET_SIZE:(key + 1) * BUCKET_SIZE]
+
+    def visible_count(self):
+        return sum(1 for a in self.activities if not a.get('deleted'))
+
+    def version(self):
+        # Legacy lists only change by being migrated
+        return 0
+
+
+def encode_cursor(position):
+    """Encode a ``(bucket key, offset)`` position as an opaque cursor."""
+    raw = f'{position[0]}.{position[1]}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into a ``(bucket key, offset)`` position.
+
+    Raises ValueError for malformed cursors.
+    """
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        key, offset = raw.split('.')
+        return int(key), int(offset)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+
+def _forward(log, after=None, until=None):
+    """Yield ``(position, activity)`` oldest first, strictly after ``after``."""
+    for key in log.keys(min=after[0] if after else None,
+                        max=until[0] if until else None):
+        for offset, activity in enumerate(log.bucket_items(key)):
+            position = (key, offset)
+            if after is not None and position <= after:
+                continue
+            if until is not None and position >= until:
+                return
+            yield position, activity
+
+
+def _backward(log, before=None):
+    """Yield ``(position, activity)`` newest first, strictly before ``before``."""
+    for key in reversed(log.keys(max=before[0] if before else None)):
+        items = log.bucket_items(key)
+        for offset in range(len(items) - 1, -1, -1):
+            position = (key, offset)
+            if before is not None and position >= before:
+                continue
+            yield position, items[offset]
+
+
+def get_page(issue, limit=None, before=None, since=None, visible=None):
+    """Get a page of activities of an issue.
+
+    Args:
+        issue: The issue object
+        limit: Maximum number of activities to return, None for all
+        before: Only return activities older than this position
+        since: Only return activities newer than this position
+        visible: Optional predicate filtering out activities
+
+    Without ``since`` the newest ``limit`` activities are returned, otherwise
+    the oldest ``limit`` activities after ``since``. Only the buckets that
+    hold the page are loaded.
+
+    Returns:
+        Tuple of a chronological list of ``(position, activity)`` pairs and
+        a flag telling whether more activities exist past the page
+    """
+    log = _get_log_or_legacy(issue)
+    if since is not None or limit is None:
+        source, newest_first = _forward(log, since, before), False
+    else:
+        source, newest_first = _backward(log, before), True
+
+    entries = []
+    has_more = False
+    for position, activity in source:
+        if visible is not None and not visible(activity):
+            continue
+        if limit is not None and len(entries) >= limit:
+            has_more = True
+            break
+        entries.append((position, activity))
+
+    if newest_first:
+        entries.reverse()
+    return entries, has_more
+
+
+def count_activities(issue):
+    """Number of activities on an issue, excluding soft-deleted comments."""
+    return _get_log_or_legacy(issue).visible_count()
+
+
+def get_version(issue):
+    """Current activity version of an issue, without loading any bucket."""
+    return _get_log_or_legacy(issue).version()
+
+
+def _get_log_or_legacy(issue):
+    log = get_activity_log(issue)
+    if log is None:
+        log = _LegacyLog(getattr(issue, 'activity_log', []) or [])
+    return log
+
+
+def get_activity_log(issue, create=False):
+    """Get the bucketed activity log of an issue.
+
+    Returns None if the issue has no log yet and ``create`` is False. When
+    created, any legacy ``activity_log`` list on the issue is migrated.
+    """
+    annotations = IAnnotations(issue)
+    log = annotations.get(ANNOTATION_KEY)
+    if log is None and create:
+        log = ActivityLog()
+        annotations[ANNOTATION_KEY] = log
+        _migrate_legacy_list(issue, log)
+    return log
+
+
+def iter_activities(issue):
+    """Iterate over all activities of an issue in chronological order."""
+    log = get_activity_log(issue)
+    if log is not None:
+        return iter(log)
+    # Issue has not been migrated yet - read the legacy JSON list
+    return iter(getattr(issue, 'activity_log', []) or [])
+
+
+def _migrate_legacy_list(issue, log):
+    legacy = getattr(issue, 'activity_log', None) or []
+    if not legacy:
+        return 0
+    log.extend(dict(activity) for activity in legacy)
+    # Empty the JSON field so the history is no longer serialized with the issue
+    issue.activity_log = []
+    return len(legacy)
+
+
+def migrate_activity_log(issue):
+    """Move the legacy ``activity_log`` list of an issue into the bucketed log.
+
+    Returns the number of migrated activities.
+    """
+    annotations = IAnnotations(issue)
+    if ANNOTATION_KEY in annotations:
+        return 0
+    log = ActivityLog()
+    annotations[ANNOTATION_KEY] = log
+    count = _migrate_legacy_list(issue, log)
+    logger.info(f"Migrated {count} activities for {issue.absolute_url()}")
+    return count
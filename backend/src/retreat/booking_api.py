@@ -1,10 +1,30 @@
 """Custom API endpoints for booking management"""
 
+from datetime import datetime
+from datetime import timedelta
+from dateutil.rrule import rrulestr
+from itertools import islice
 from plone import api
 from plone.restapi.services import Service
 from zope.interface import implementer
 from zope.publisher.interfaces import IPublishTraverse
+from plone.restapi.serializer.converters import json_compatible
+from z3c.relationfield import RelationValue
+from zope.component import getUtility
+from zope.intid.interfaces import IIntIds
+from . import booking_archive
+from . import booking_index
+from . import display_names
+from . import identity_aliases
+from . import room_utilization
+from .booking_utils import BOOKINGS_PATH
+from .booking_utils import check_booking_conflicts
+from .booking_utils import get_bookings_container
+from .booking_utils import get_room_bookings
+from .booking_utils import validate_booking_times
+import json
 import logging
+import transaction
 
 logger = logging.getLogger(__name__)
 
@@ -34,49 +54,34 @@ class CancelBooking(Service):
             self.request.response.setStatus(401)
             return {"error": "Authentication required"}
         
-        # Try to find the booking
+        # Find the booking by UID; ids are only unique per monthly container,
+        # but older clients still send them
         catalog = api.portal.get_tool('portal_catalog')
-        results = catalog(id=booking_id, portal_type='room_booking')
+        results = catalog(UID=booking_id, portal_type='room_booking')
+        if not results:
+            results = catalog(id=booking_id, portal_type='room_booking')
         
         if not results:
             self.request.response.setStatus(404)
             return {"error": "Booking not found"}
         
-        booking = results[0].getObject()
+        brain = results[0]
+        booking = brain.getObject()
         
-        # Check ownership - handle OAuth users
+        # Ownership goes through the identity alias map, so bookings created
+        # under another identity of an OAuth user (email, numeric id) match
         user_id = current_user.getId()
-        user_email = current_user.getProperty('email', '')
-        user_fullname = current_user.getProperty('fullname', '')
-        
-        # Get creator info
-        creator_id = booking.creators[0] if booking.creators else booking.Creator()
-        
-        # Enhanced ownership check for OAuth users
-        is_owner = False
-        
-        # Direct ID match
-        if creator_id == user_id:
-            is_owner = True
-        # OAuth numeric ID match (Google OAuth IDs are numeric)
-        elif creator_id.isdigit() and user_id.endswith(creator_id):
-            is_owner = True
-        # Email match
-        elif user_email and creator_id == user_email:
-            is_owner = True
-        # Check if booking title contains user's name (common pattern)
-        elif user_fullname and user_fullname in booking.title:
-            is_owner = True
-        # Check if user ID contains creator ID (OAuth pattern)
-        elif creator_id in user_id:
-            is_owner = True
+        owner = brain.booking_owner
+        if not isinstance(owner, str):
+            # Missing.Value for bookings indexed before the column existed
+            owner = identity_aliases.owner_key(brain.Creator)
+        is_owner = owner == identity_aliases.owner_key(user_id)
         
         # Also allow managers
         if api.user.has_permission('Manage portal', user=current_user, obj=booking):
             is_owner = True
         
-        logger.info(f"Cancel booking check - User: {user_id}, Creator: {creator_id}, "
-                   f"Email: {user_email}, Fullname: {user_fullname}, "
+        logger.info(f"Cancel booking check - User: {user_id}, Owner: {owner}, "
                    f"Is Owner: {is_owner}")
         
         if not is_owner:
@@ -116,46 +121,712 @@ class MyBookings(Service):
             return {"error": "Authentication required"}
         
         user_id = current_user.getId()
-        user_email = current_user.getProperty('email', '')
-        user_fullname = current_user.getProperty('fullname', '')
         
-        # Search for bookings
+        # One indexed query on the canonical owner of each booking
         catalog = api.portal.get_tool('portal_catalog')
-        all_bookings = catalog(portal_type='room_booking')
+        brains = catalog(
+            portal_type='room_booking',
+            booking_owner=identity_aliases.owner_key(user_id),
+            sort_on='start_datetime',
+            sort_order='ascending'
+        )
         
-        my_bookings = []
+        room_uids = {brain.room_uid for brain in brains if isinstance(brain.room_uid, str)}
+        room_titles = {}
+        if room_uids:
+            room_titles = {
+                room.UID: room.Title
+                for room in catalog(portal_type='conference_room', UID=list(room_uids))
+            }
         
-        for brain in all_bookings:
-            booking = brain.getObject()
-            creator_id = booking.creators[0] if booking.creators else booking.Creator()
-            
-            # Check if this is user's booking (same logic as cancel)
-            is_mine = False
-            
-            if creator_id == user_id:
-                is_mine = True
-            elif creator_id.isdigit() and user_id.endswith(creator_id):
-                is_mine = True
-            elif user_email and creator_id == user_email:
-                is_mine = True
-            elif user_fullname and user_fullname in booking.title:
-                is_mine = True
-            elif creator_id in user_id:
-                is_mine = True
-            
-            if is_mine:
-                my_bookings.append({
-                    'id': booking.getId(),
-                    'uid': booking.UID(),
-                    'title': booking.title,
-                    'start_datetime': booking.start_datetime.isoformat(),
-                    'end_datetime': booking.end_datetime.isoformat(),
-                    'room': booking.room.to_object.title if booking.room else 'Unknown',
-                    'purpose': booking.purpose or '',
-                    'url': booking.absolute_url()
-                })
+        my_bookings = []
+        for brain in brains:
+            my_bookings.append({
+                'id': brain.getId,
+                'uid': brain.UID,
+                'title': brain.Title,
+                'start_datetime': brain.start_datetime.isoformat(),
+                'end_datetime': brain.end_datetime.isoformat(),
+                'room': room_titles.get(brain.room_uid, 'Unknown'),
+                'purpose': brain.purpose if isinstance(brain.purpose, str) else '',
+                'url': brain.getURL()
+            })
         
         return {
             'bookings': my_bookings,
             'count': len(my_bookings)
-        }
\ No newline at end of file
+        }
+
+
+# Half-hour slots per day
+SLOTS_PER_DAY = 24 * 60 * 60 // booking_index.SLOT_SECONDS
+
+DEFAULT_DAYS = 7
+MAX_DAYS = 31
+
+
+def _parse_datetime(value):
+    """Parse an ISO date or datetime query parameter, stored like booking times."""
+    dt = datetime.fromisoformat(value.rstrip('Z'))
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    return dt
+
+
+class RoomAvailability(Service):
+    """Free/busy bitmaps of all conference rooms in half-hour slots.
+
+    Query parameters:
+        start: First day, ISO date or datetime (default: today in UTC)
+        days: Number of days, at most 31 (default: 7)
+        free_start, free_end: Optional range; rooms get a ``free`` flag and
+            the rooms without bookings in it are listed in ``free_rooms``
+
+    Each room has a ``busy`` bitmap as a hex string. Bit i, counted from the
+    least significant bit, is set when the half-hour slot starting
+    ``start + i * 30 minutes`` overlaps a booking.
+    """
+
+    def reply(self):
+        form = self.request.form
+        try:
+            if form.get('start'):
+                start = _parse_datetime(form['start'])
+            else:
+                start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            days = int(form.get('days', DEFAULT_DAYS))
+            free_start = _parse_datetime(form['free_start']) if form.get('free_start') else None
+            free_end = _parse_datetime(form['free_end']) if form.get('free_end') else None
+        except ValueError:
+            self.request.response.setStatus(400)
+            return {'error': 'start, free_start and free_end must be ISO dates, days an integer'}
+
+        if not 1 <= days <= MAX_DAYS:
+            self.request.response.setStatus(400)
+            return {'error': f'days must be between 1 and {MAX_DAYS}'}
+        if (free_start is None) != (free_end is None) or (free_start and free_end <= free_start):
+            self.request.response.setStatus(400)
+            return {'error': 'free_start and free_end must be given together, in order'}
+
+        # Align the grid on a slot boundary
+        start_epoch = booking_index.to_epoch(start.replace(second=0, microsecond=0))
+        start_epoch -= start_epoch % booking_index.SLOT_SECONDS
+        slots = days * SLOTS_PER_DAY
+        end_epoch = start_epoch + slots * booking_index.SLOT_SECONDS
+
+        catalog = api.portal.get_tool('portal_catalog')
+        rooms = catalog(portal_type='conference_room', sort_on='sortable_title')
+
+        index = booking_index.get_index()
+        if index is None:
+            logger.warning("Booking index missing, reading room bookings from the catalog; "
+                           "run rebuild_booking_index.py")
+            index = self._catalog_index(
+                rooms, booking_index.from_epoch(start_epoch), booking_index.from_epoch(end_epoch)
+            )
+
+        free_range = None
+        if free_start is not None:
+            free_range = (booking_index.to_epoch(free_start), booking_index.to_epoch(free_end))
+
+        items = []
+        free_rooms = []
+        for room in rooms:
+            bitmap = index.busy_bitmap(room.UID, start_epoch, slots)
+            item = {
+                '@id': room.getURL(),
+                'UID': room.UID,
+                'title': room.Title,
+                'busy': format(bitmap, 'x'),
+                'busy_slots': bin(bitmap).count('1'),
+            }
+            if free_range is not None:
+                item['free'] = self._is_free(index, room.UID, bitmap, start_epoch, end_epoch, *free_range)
+                if item['free']:
+                    free_rooms.append(room.UID)
+            items.append(item)
+
+        result = {
+            '@id': f'{self.context.absolute_url()}/@room-availability',
+            'start': booking_index.from_epoch(start_epoch).isoformat(),
+            'days': days,
+            'slot_minutes': booking_index.SLOT_SECONDS // 60,
+            'slots': slots,
+            'rooms': items,
+        }
+        if free_range is not None:
+            result['free_rooms'] = free_rooms
+        return result
+
+    def _is_free(self, index, room_uid, bitmap, start_epoch, end_epoch, free_start, free_end):
+        """Check a range against the bitmap, or the index if it's off the grid."""
+        slot = booking_index.SLOT_SECONDS
+        aligned = (free_start - start_epoch) % slot == 0 and (free_end - start_epoch) % slot == 0
+        if aligned and start_epoch <= free_start and free_end <= end_epoch:
+            mask = booking_index.slot_mask(
+                (free_start - start_epoch) // slot, (free_end - start_epoch) // slot
+            )
+            return not bitmap & mask
+        return not index.overlapping(room_uid, free_start, free_end)
+
+    def _catalog_index(self, rooms, start, end):
+        """Build a transient booking index from catalog metadata."""
+        index = booking_index.BookingIndex()
+        for room in rooms:
+            for brain in get_room_bookings(room.UID, start, end):
+                index.index(
+                    brain.UID,
+                    room.UID,
+                    booking_index.to_epoch(brain.start_datetime),
+                    booking_index.to_epoch(brain.end_datetime),
+                )
+        return index
+
+
+# Maximum number of bookings created by one bulk request
+MAX_OCCURRENCES = 200
+
+
+def _get_booking_index():
+    """Get the booking index, building it if the site doesn't have one yet."""
+    index = booking_index.get_index()
+    if index is None:
+        # An empty index would miss every existing booking
+        logger.warning("Booking index missing, building it")
+        booking_index.rebuild_index()
+        index = booking_index.get_index()
+    return index
+
+
+def _default_title(room, user):
+    return f"Booking: {room.title} - {display_names.get_display_name(user.getId(), user)}"
+
+
+def _create_booking(room, title, start_dt, end_dt, purpose):
+    """Create a booking in the monthly container of its start."""
+    intids = getUtility(IIntIds)
+    return api.content.create(
+        container=get_bookings_container(start_dt),
+        type='room_booking',
+        title=title,
+        room=RelationValue(intids.getId(room)),
+        start_datetime=start_dt,
+        end_datetime=end_dt,
+        purpose=purpose,
+    )
+
+
+def _booking_summary(booking, room_uid):
+    return {
+        '@id': booking.absolute_url(),
+        'UID': booking.UID(),
+        'id': booking.getId(),
+        'title': booking.title,
+        'room': room_uid,
+        'start_datetime': json_compatible(booking.start_datetime),
+        'end_datetime': json_compatible(booking.end_datetime),
+        'purpose': booking.purpose,
+    }
+
+
+def _conflict_summary(brain):
+    return {
+        '@id': brain.getURL(),
+        'UID': brain.UID,
+        'title': brain.Title,
+        'start_datetime': json_compatible(brain.start_datetime),
+        'end_datetime': json_compatible(brain.end_datetime),
+    }
+
+
+class BookRoom(Service):
+    """Create a booking after checking it for conflicts, atomically.
+
+    Body: ``room`` (UID of the conference room), ``start_datetime`` and
+    ``end_datetime`` (ISO, UTC), optional ``purpose`` and ``title``.
+
+    The room is reserved in the booking index before the conflict check,
+    which bumps a per-room serial without conflict resolution. Two requests
+    booking the same room at once can't both commit: the second one fails
+    with a ConflictError, is retried by the publisher, and then finds the
+    first booking and answers 409. A rejected request dooms its
+    transaction, so the reservation is never written and the room's
+    calendar feeds stay as they are.
+    """
+
+    def reply(self):
+        if api.user.is_anonymous():
+            self.request.response.setStatus(401)
+            return {'error': 'Authentication required'}
+
+        try:
+            data = json.loads(self.request.get('BODY') or '{}')
+            room_uid = data['room']
+            start_dt = _parse_datetime(data['start_datetime'])
+            end_dt = _parse_datetime(data['end_datetime'])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            self.request.response.setStatus(400)
+            return {'error': 'room, start_datetime and end_datetime are required, as UID and ISO datetimes'}
+
+        errors = validate_booking_times(start_dt, end_dt)
+        if errors:
+            self.request.response.setStatus(400)
+            return {'error': errors[0], 'errors': errors}
+
+        room = api.content.get(UID=room_uid)
+        if room is None or room.portal_type != 'conference_room':
+            self.request.response.setStatus(404)
+            return {'error': 'Conference room not found'}
+
+        if api.content.get(path=BOOKINGS_PATH) is None:
+            self.request.response.setStatus(500)
+            return {'error': 'Bookings folder not found'}
+
+        # Serialize with other transactions changing this room, then check
+        _get_booking_index().reserve(room_uid)
+        conflicts = check_booking_conflicts(room_uid, start_dt, end_dt)
+        if conflicts:
+            # Don't commit the reservation, nothing changed in the room
+            transaction.doom()
+            self.request.response.setStatus(409)
+            return {
+                'error': 'The room is already booked at this time',
+                'conflicts': [_conflict_summary(brain) for brain in conflicts],
+            }
+
+        user = api.user.get_current()
+        booking = _create_booking(
+            room,
+            data.get('title') or _default_title(room, user),
+            start_dt,
+            end_dt,
+            data.get('purpose') or '',
+        )
+
+        logger.info(f"Room {room_uid} booked by {user.getId()} "
+                    f"from {start_dt.isoformat()} to {end_dt.isoformat()}")
+        self.request.response.setStatus(201)
+        return _booking_summary(booking, room_uid)
+
+
+class BookRoomBulk(Service):
+    """Create many bookings of a room at once, all or nothing.
+
+    Body: ``room`` (UID of the conference room), optional ``purpose`` and
+    ``title``, and either
+
+        ``slots``: list of ``{"start_datetime", "end_datetime"}`` objects, or
+        ``start_datetime``, ``end_datetime`` and ``rrule``: the first
+        occurrence and an RFC 5545 recurrence rule such as
+        ``FREQ=DAILY;COUNT=5`` or ``FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20250801``
+
+    All occurrences are validated and checked for conflicts, with existing
+    bookings and with each other, in one pass over the booking index. If any
+    of them fails nothing is created and the response reports every slot
+    with its errors and conflicts. Otherwise all bookings are created in the
+    same transaction; their catalog indexing is queued and processed once
+    at the end of the request.
+    """
+
+    def reply(self):
+        if api.user.is_anonymous():
+            self.request.response.setStatus(401)
+            return {'error': 'Authentication required'}
+
+        try:
+            data = json.loads(self.request.get('BODY') or '{}')
+            room_uid = data['room']
+            slots = self._slots(data)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            self.request.response.setStatus(400)
+            return {'error': 'room and either slots or start_datetime, end_datetime '
+                             'and rrule are required'}
+
+        if not slots:
+            self.request.response.setStatus(400)
+            return {'error': 'No occurrences to book'}
+        if len(slots) > MAX_OCCURRENCES:
+            self.request.response.setStatus(400)
+            return {'error': f'At most {MAX_OCCURRENCES} bookings can be created at once'}
+
+        room = api.content.get(UID=room_uid)
+        if room is None or room.portal_type != 'conference_room':
+            self.request.response.setStatus(404)
+            return {'error': 'Conference room not found'}
+
+        if api.content.get(path=BOOKINGS_PATH) is None:
+            self.request.response.setStatus(500)
+            return {'error': 'Bookings folder not found'}
+
+        index = _get_booking_index()
+        index.reserve(room_uid)
+
+        report, failed = self._check(index, room_uid, slots)
+        if failed:
+            # Don't commit the reservation, nothing changed in the room
+            transaction.doom()
+            self.request.response.setStatus(409)
+            return {
+                'error': f'{failed} of {len(slots)} bookings cannot be made, none were created',
+                'slots': report,
+            }
+
+        user = api.user.get_current()
+        title = data.get('title') or _default_title(room, user)
+        purpose = data.get('purpose') or ''
+        bookings = [
+            _create_booking(room, title, start_dt, end_dt, purpose)
+            for start_dt, end_dt in slots
+        ]
+
+        logger.info(f"Room {room_uid} booked {len(bookings)} times by {user.getId()}")
+        self.request.response.setStatus(201)
+        return {
+            'items': [_booking_summary(booking, room_uid) for booking in bookings],
+            'items_total': len(bookings),
+        }
+
+    def _slots(self, data):
+        """Expand the request into a sorted list of ``(start, end)`` datetimes."""
+        if 'slots' in data:
+            slots = [
+                (_parse_datetime(slot['start_datetime']), _parse_datetime(slot['end_datetime']))
+                for slot in data['slots']
+            ]
+            return sorted(slots)
+
+        start_dt = _parse_datetime(data['start_datetime'])
+        duration = _parse_datetime(data['end_datetime']) - start_dt
+        rule = rrulestr(data['rrule'], dtstart=start_dt)
+        # One more than allowed, so too long or unbounded rules are rejected
+        starts = list(islice(rule, MAX_OCCURRENCES + 1))
+        return [(start, start + duration) for start in starts]
+
+    def _check(self, index, room_uid, slots):
+        """Validate all slots and find their conflicts.
+
+        Returns:
+            Tuple of the per-slot report and the number of failing slots
+        """
+        intervals = [
+            (booking_index.to_epoch(start_dt), booking_index.to_epoch(end_dt))
+            for start_dt, end_dt in slots
+        ]
+        overlapping = index.overlapping_many(room_uid, intervals)
+
+        conflicting_uids = {uid for found in overlapping for uid, _start, _end in found}
+        brains = {}
+        if conflicting_uids:
+            catalog = api.portal.get_tool('portal_catalog')
+            brains = {
+                brain.UID: brain
+                for brain in catalog.unrestrictedSearchResults(UID=list(conflicting_uids))
+            }
+
+        report = []
+        failed = 0
+        latest_end = None
+        for i, (start_dt, end_dt) in enumerate(slots):
+            errors = validate_booking_times(start_dt, end_dt)
+            # Slots are sorted by start, so a slot overlaps an earlier one of
+            # the request if it starts before the latest end so far
+            if latest_end is not None and start_dt < latest_end:
+                errors.append("Overlaps with another booking in this request")
+            latest_end = max(latest_end or end_dt, end_dt)
+            conflicts = [
+                _conflict_summary(brains[uid])
+                for uid, _start, _end in overlapping[i] if uid in brains
+            ]
+            if errors or conflicts:
+                failed += 1
+            report.append({
+                'start_datetime': json_compatible(start_dt),
+                'end_datetime': json_compatible(end_dt),
+                'ok': not (errors or conflicts),
+                'errors': errors,
+                'conflicts': conflicts,
+            })
+        return report, failed
+
+
+class BookingArchiveReport(Service):
+    """Report on archived bookings.
+
+    Query parameters:
+        start, end: Optional ISO date range
+        room: Optional UID of a conference room
+        items: Set to include the archived bookings, not only the totals
+
+    Returns the number of bookings and booked hours per room, and per month
+    of the whole archive.
+    """
+
+    def reply(self):
+        form = self.request.form
+        try:
+            start = booking_index.to_epoch(_parse_datetime(form['start'])) if form.get('start') else None
+            end = booking_index.to_epoch(_parse_datetime(form['end'])) if form.get('end') else None
+        except ValueError:
+            self.request.response.setStatus(400)
+            return {'error': 'start and end must be ISO dates'}
+
+        archive = booking_archive.get_archive()
+        if archive is None:
+            return {'rooms': [], 'months': [], 'items_total': 0}
+
+        rooms = {}
+        items = []
+        for record in archive.records(start, end, form.get('room')):
+            room = rooms.setdefault(record['room_uid'], {
+                'UID': record['room_uid'],
+                'title': record['room_title'],
+                'bookings': 0,
+                'hours': 0.0,
+            })
+            room['bookings'] += 1
+            room['hours'] += (record['end'] - record['start']) / 3600
+            if form.get('items'):
+                items.append(dict(
+                    record,
+                    start=booking_index.from_epoch(record['start']).isoformat(),
+                    end=booking_index.from_epoch(record['end']).isoformat(),
+                ))
+
+        result = {
+            'rooms': sorted(rooms.values(), key=lambda room: room['title']),
+            'months': [
+                {'month': f'{key // 100}-{key % 100:02d}', 'bookings': count}
+                for key, count in archive.months()
+            ],
+            'items_total': sum(room['bookings'] for room in rooms.values()),
+        }
+        if form.get('items'):
+            result['items'] = items
+        return result
+
+
+# Defaults and limits of @find-slot
+DEFAULT_SLOTS = 5
+MAX_SLOTS = 50
+DEFAULT_SEARCH_DAYS = 14
+MAX_SEARCH_DAYS = 60
+
+
+def _parse_time_of_day(value):
+    """Parse HH:MM into seconds after midnight."""
+    hours, minutes = value.split(':')
+    seconds = int(hours) * 3600 + int(minutes) * 60
+    if not 0 <= seconds <= 24 * 3600:
+        raise ValueError(value)
+    return seconds
+
+
+def _opening_hours(day_start, day_end, tz_offset, duration):
+    """Build a ``fit`` function keeping slots within daily opening hours.
+
+    ``day_start`` and ``day_end`` are seconds after local midnight and
+    ``tz_offset`` the local offset from UTC in seconds. Slots that would
+    end after closing move to the opening of the next day.
+    """
+    day = 24 * 60 * 60
+
+    def fit(t):
+        local = t + tz_offset
+        midnight = local - local % day
+        if local < midnight + day_start:
+            return midnight + day_start - tz_offset
+        if local + duration > midnight + day_end:
+            return midnight + day + day_start - tz_offset
+        return t
+    return fit
+
+
+class FindSlot(Service):
+    """Find the first free slots across conference rooms.
+
+    Query parameters:
+        duration: Length in minutes, a multiple of 30 (required)
+        start: Earliest start, ISO datetime in UTC (default: now)
+        days: How many days ahead to search (default: 14)
+        capacity: Minimum room capacity
+        room: UIDs of the rooms to consider, repeatable (default: all)
+        limit: Number of slots to return (default: 5)
+        day_start, day_end: Optional opening hours as local HH:MM
+        tz_offset: Minutes the local time is ahead of UTC, for opening hours
+
+    Rooms are picked with the catalog, then the booking index of each room
+    is swept lazily from the start, merging rooms by slot start until
+    enough slots are found.
+    """
+
+    def reply(self):
+        form = self.request.form
+        try:
+            duration = int(form['duration']) * 60
+            if form.get('start'):
+                start = _parse_datetime(form['start'])
+            else:
+                start = datetime.utcnow()
+            days = int(form.get('days', DEFAULT_SEARCH_DAYS))
+            limit = int(form.get('limit', DEFAULT_SLOTS))
+            capacity = int(form['capacity']) if form.get('capacity') else None
+            tz_offset = int(form.get('tz_offset', 0)) * 60
+            day_start = _parse_time_of_day(form.get('day_start') or '00:00')
+            day_end = _parse_time_of_day(form.get('day_end') or '24:00')
+        except (KeyError, ValueError):
+            self.request.response.setStatus(400)
+            return {'error': 'duration (minutes) is required; start must be an ISO datetime, '
+                             'days, limit, capacity and tz_offset integers, '
+                             'day_start and day_end HH:MM'}
+
+        slot = booking_index.SLOT_SECONDS
+        if duration <= 0 or duration % slot:
+            self.request.response.setStatus(400)
+            return {'error': 'duration must be a positive multiple of 30 minutes'}
+        # Same duration rules as for bookings
+        start_probe = datetime(2000, 1, 1)
+        errors = validate_booking_times(start_probe, start_probe + timedelta(seconds=duration))
+        if errors:
+            self.request.response.setStatus(400)
+            return {'error': errors[0], 'errors': errors}
+        if not 1 <= days <= MAX_SEARCH_DAYS or not 1 <= limit <= MAX_SLOTS:
+            self.request.response.setStatus(400)
+            return {'error': f'days must be 1 to {MAX_SEARCH_DAYS}, limit 1 to {MAX_SLOTS}'}
+        if day_start % slot or day_end % slot or tz_offset % slot:
+            self.request.response.setStatus(400)
+            return {'error': 'Opening hours and tz_offset must be on half-hour boundaries'}
+        if day_end - day_start < duration:
+            self.request.response.setStatus(400)
+            return {'error': 'The opening hours are shorter than the duration'}
+
+        query = {'portal_type': 'conference_room', 'sort_on': 'sortable_title'}
+        if capacity:
+            query['capacity'] = {'query': capacity, 'range': 'min'}
+        rooms = form.get('room')
+        if rooms:
+            query['UID'] = [rooms] if isinstance(rooms, str) else rooms
+        catalog = api.portal.get_tool('portal_catalog')
+        rooms = {brain.UID: brain for brain in catalog(query)}
+
+        start_epoch = booking_index.align_up(booking_index.to_epoch(start))
+        end_epoch = start_epoch + days * 24 * 60 * 60
+        fit = None
+        if day_start > 0 or day_end < 24 * 3600:
+            fit = _opening_hours(day_start, day_end, tz_offset, duration)
+
+        slots = booking_index.find_slots(
+            _get_booking_index(), list(rooms), start_epoch, end_epoch, duration, limit, fit
+        )
+
+        items = []
+        for slot_start, room_uid in slots:
+            room = rooms[room_uid]
+            items.append({
+                'room': {
+                    '@id': room.getURL(),
+                    'UID': room_uid,
+                    'title': room.Title,
+                    'capacity': room.capacity if isinstance(room.capacity, int) else None,
+                },
+                'start_datetime': booking_index.from_epoch(slot_start).isoformat(),
+                'end_datetime': booking_index.from_epoch(slot_start + duration).isoformat(),
+            })
+        return {
+            '@id': f'{self.context.absolute_url()}/@find-slot',
+            'items': items,
+            'items_total': len(items),
+        }
+
+
+# Defaults and limits of @room-utilization
+DEFAULT_REPORT_DAYS = 28
+MAX_REPORT_DAYS = 366
+
+
+class RoomUtilizationReport(Service):
+    """Utilization of conference rooms per day and per hour of the week.
+
+    Query parameters:
+        start: First day, ISO date (default: four weeks ago)
+        days: Number of days, at most 366 (default: 28)
+        room: UIDs of the rooms to report, repeatable (default: all)
+        hours_per_day: Opening hours a day, the base of the daily
+            utilization (default: 24)
+        tz_offset: Minutes the local time is ahead of UTC, a multiple of 60
+
+    Utilization is the share of available time that is booked. The numbers
+    come from the precomputed hourly counters of ``room_utilization``, so
+    the report costs the same no matter how many bookings there are.
+    """
+
+    def reply(self):
+        form = self.request.form
+        try:
+            days = int(form.get('days', DEFAULT_REPORT_DAYS))
+            if form.get('start'):
+                start = _parse_datetime(form['start']).date()
+            else:
+                start = datetime.utcnow().date() - timedelta(days=days)
+            hours_per_day = float(form.get('hours_per_day', 24))
+            tz_offset = int(form.get('tz_offset', 0))
+        except ValueError:
+            self.request.response.setStatus(400)
+            return {'error': 'start must be an ISO date; days, hours_per_day and tz_offset numbers'}
+        if not 1 <= days <= MAX_REPORT_DAYS or not 0 < hours_per_day <= 24:
+            self.request.response.setStatus(400)
+            return {'error': f'days must be 1 to {MAX_REPORT_DAYS}, hours_per_day above 0 up to 24'}
+        if tz_offset % 60:
+            self.request.response.setStatus(400)
+            return {'error': 'tz_offset must be whole hours'}
+
+        tz_hours = tz_offset // 60
+        first_day = booking_index.to_epoch(datetime.combine(start, datetime.min.time())) // 86400
+        first = first_day * 24 - tz_hours
+        last = first + days * 24
+        week_hours = room_utilization.hours_of_week_count(first, last, tz_hours)
+
+        query = {'portal_type': 'conference_room', 'sort_on': 'sortable_title'}
+        rooms = form.get('room')
+        if rooms:
+            query['UID'] = [rooms] if isinstance(rooms, str) else rooms
+        catalog = api.portal.get_tool('portal_catalog')
+        utilization = room_utilization.get_utilization()
+
+        items = []
+        for brain in catalog(query):
+            counters = utilization.room(brain.UID) if utilization is not None else None
+            by_day, by_hour = room_utilization.summarize(counters, first, last, tz_hours)
+            booked = sum(seconds for seconds, _bookings in by_day.values())
+            daily = []
+            for day in range(first_day, first_day + days):
+                seconds, bookings = by_day.get(day, (0, 0))
+                daily.append({
+                    'date': (start + timedelta(days=day - first_day)).isoformat(),
+                    'booked_hours': seconds / 3600,
+                    'bookings': bookings,
+                    'utilization': round(seconds / (hours_per_day * 3600), 4),
+                })
+            items.append({
+                '@id': brain.getURL(),
+                'UID': brain.UID,
+                'title': brain.Title,
+                'booked_hours': booked / 3600,
+                'bookings': sum(bookings for _seconds, bookings in by_day.values()),
+                'utilization': round(booked / (days * hours_per_day * 3600), 4),
+                'days': daily,
+                # Monday 00:00 first, relative to the hour being available
+                # on every one of its days in the range
+                'hours_of_week': [
+                    round(seconds / (count * 3600), 4) if count else 0
+                    for seconds, count in zip(by_hour, week_hours)
+                ],
+            })
+
+        return {
+            '@id': f'{self.context.absolute_url()}/@room-utilization',
+            'start': start.isoformat(),
+            'days': days,
+            'hours_per_day': hours_per_day,
+            'items': items,
+            'items_total': len(items),
+        }
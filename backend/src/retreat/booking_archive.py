@@ -0,0 +1,182 @@
+"""Compact archive of past room bookings.
+
+Bookings that ended a while ago are only needed for reports. The archive
+job copies them into a compact store in a portal annotation and deletes
+the booking objects, so they leave the catalog, the booking index and the
+monthly booking containers. Live queries never see archived bookings.
+
+The archive is an ``IOBTree`` keyed by month (``YYYYMM``) holding one
+persistent bucket of plain tuples per month, so a report over a date
+range only loads the months it covers.
+"""
+
+from BTrees.IOBTree import IOBTree
+from BTrees.Length import Length
+from datetime import datetime
+from datetime import timedelta
+from persistent import Persistent
+from plone import api
+from zope.annotation.interfaces import IAnnotations
+from .booking_index import booking_interval
+from .booking_index import from_epoch
+from .booking_utils import BOOKINGS_PATH
+from .identity_aliases import owner_key
+import logging
+import re
+import transaction
+
+logger = logging.getLogger('retreat.booking_archive')
+
+ANNOTATION_KEY = 'retreat.booking_archive'
+
+# Bookings that ended more than this many days ago are archived
+ARCHIVE_AFTER_DAYS = 30
+
+# Number of bookings archived between savepoints
+BATCH_SIZE = 100
+
+# Ids of the monthly booking containers
+MONTH_ID = re.compile(r'^\d{4}-\d{2}$')
+
+# Fields of an archived booking, in the order stored
+FIELDS = ('uid', 'room_uid', 'room_title', 'start', 'end', 'title', 'owner', 'purpose')
+
+
+def month_key(epoch):
+    dt = from_epoch(epoch)
+    return dt.year * 100 + dt.month
+
+
+class ArchiveMonth(Persistent):
+    """Archived bookings of one month, as tuples in ``FIELDS`` order."""
+
+    def __init__(self):
+        self.records = []
+
+    def append(self, record):
+        self.records.append(record)
+        self._p_changed = True
+
+
+class BookingArchive(Persistent):
+    """Archived bookings of the site, partitioned by month of start."""
+
+    def __init__(self):
+        self._months = IOBTree()
+        self._length = Length()
+
+    def __len__(self):
+        return self._length()
+
+    def add(self, record):
+        """Add a record, a tuple in ``FIELDS`` order."""
+        key = month_key(record[3])
+        month = self._months.get(key)
+        if month is None:
+            month = self._months[key] = ArchiveMonth()
+        month.append(tuple(record))
+        self._length.change(1)
+
+    def records(self, start=None, end=None, room_uid=None):
+        """Yield archived bookings overlapping a range, as dicts.
+
+        Args:
+            start: Earliest time in epoch seconds (inclusive)
+            end: Latest time in epoch seconds (exclusive)
+            room_uid: Only include bookings of this room
+        """
+        # Bookings are filed by start and last at most a few hours, so one
+        # ending after start began at most a day earlier
+        min_key = month_key(start - 24 * 60 * 60) if start is not None else None
+        max_key = month_key(end) if end is not None else None
+        for month in self._months.values(min_key, max_key):
+            for record in month.records:
+                item = dict(zip(FIELDS, record))
+                if start is not None and item['end'] <= start:
+                    continue
+                if end is not None and item['start'] >= end:
+                    continue
+                if room_uid and item['room_uid'] != room_uid:
+                    continue
+                yield item
+
+    def months(self):
+        """Return ``(YYYYMM, number of bookings)`` for each archived month."""
+        return [(key, len(month.records)) for key, month in self._months.items()]
+
+
+def get_archive(create=False):
+    """Get the booking archive of the site, or None if there is none yet."""
+    annotations = IAnnotations(api.portal.get())
+    archive = annotations.get(ANNOTATION_KEY)
+    if archive is None and create:
+        archive = BookingArchive()
+        annotations[ANNOTATION_KEY] = archive
+    return archive
+
+
+def _record(booking):
+    interval = booking_interval(booking)
+    if interval is None:
+        return None
+    room_uid, start, end = interval
+    creator_id = booking.creators[0] if booking.creators else booking.Creator()
+    return (
+        booking.UID(),
+        room_uid,
+        booking.room.to_object.title,
+        start,
+        end,
+        booking.title,
+        owner_key(creator_id),
+        booking.purpose or '',
+    )
+
+
+def archive_bookings(days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE):
+    """Move bookings that ended more than ``days`` ago into the archive.
+
+    Bookings without a room or times can't be reported on and are left in
+    place. Monthly containers that are empty afterwards are removed.
+
+    Returns the number of archived bookings.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    catalog = api.portal.get_tool('portal_catalog')
+    brains = catalog.unrestrictedSearchResults(
+        portal_type='room_booking',
+        end_datetime={'query': cutoff, 'range': 'max'},
+        sort_on='start_datetime'
+    )
+    archive = get_archive(create=True)
+    count = 0
+    for brain in list(brains):
+        booking = brain._unrestrictedGetObject()
+        record = _record(booking)
+        if record is None:
+            logger.warning(f"Not archiving incomplete booking {brain.getPath()}")
+            continue
+        archive.add(record)
+        api.content.delete(obj=booking, check_linkintegrity=False)
+        count += 1
+        if count % batch_size == 0:
+            transaction.savepoint(optimistic=True)
+            logger.info(f"Archived {count} bookings")
+
+    _remove_empty_containers(cutoff)
+    logger.info(f"Archived {count} bookings that ended before {cutoff.isoformat()}")
+    return count
+
+
+def _remove_empty_containers(cutoff):
+    """Remove monthly containers of past months that hold no bookings."""
+    bookings = api.content.get(path=BOOKINGS_PATH)
+    if bookings is None:
+        return
+    current = cutoff.strftime('%Y-%m')
+    for month_id in list(bookings.objectIds()):
+        if not MONTH_ID.match(month_id):
+            continue
+        # Ids are YYYY-MM, so they compare in date order
+        if month_id < current and not bookings[month_id].objectIds():
+            api.content.delete(obj=bookings[month_id], check_linkintegrity=False)
@@ -0,0 +1,412 @@
+"""Per-room interval index of room bookings.
+
+Checking a new booking for conflicts used to wake every booking ever made
+and resolve its room relation. The index keeps, for every room, an
+``OOBTree`` keyed by ``(start, booking_uid)`` with the end as value, where
+start and end are integer seconds since the epoch (UTC).
+
+Bookings are short (see ``validate_booking_times``), so every booking
+overlapping ``[start, end)`` starts in ``(start - max_duration, end)``,
+where ``max_duration`` is the longest booking ever indexed for the room.
+An overlap query is one range scan of that window: O(log n + k), with k
+bounded by the number of bookings that fit in the window.
+
+The index is stored in a portal annotation and kept up to date by event
+subscribers on ``room_booking`` objects.
+"""
+
+from bisect import bisect_left
+from BTrees.OOBTree import OOBTree
+from heapq import merge
+from itertools import islice
+from datetime import datetime
+from datetime import timedelta
+from persistent import Persistent
+from plone import api
+from zope.annotation.interfaces import IAnnotations
+import logging
+import time
+
+logger = logging.getLogger('retreat.booking_index')
+
+ANNOTATION_KEY = 'retreat.booking_index'
+
+EPOCH = datetime(1970, 1, 1)
+
+# Bookings start and end on half-hour boundaries
+SLOT_SECONDS = 30 * 60
+
+
+def to_epoch(dt):
+    """Convert a datetime to integer seconds since the epoch.
+
+    Naive datetimes are taken as UTC, aware ones are converted to UTC.
+    """
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    return (dt - EPOCH) // timedelta(seconds=1)
+
+
+def from_epoch(seconds):
+    """Convert epoch seconds back to a naive UTC datetime."""
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class RoomIntervals(Persistent):
+    """Bookings of one room, ordered by start."""
+
+    # Longest indexed booking in seconds. Only grows, so removing bookings
+    # never needs a rescan; a rebuild resets it.
+    max_duration = 0
+
+    # Bumped on every change. This object has no conflict resolution, so two
+    # transactions changing the bookings of the same room can't both commit:
+    # the loser gets a ConflictError and is retried, and then sees the
+    # booking of the winner.
+    serial = 0
+
+    # Time of the last change in epoch seconds, for Last-Modified headers
+    changed = 0
+
+    def __init__(self):
+        self._intervals = OOBTree()
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def add(self, uid, start, end):
+        self._intervals[(start, uid)] = end
+        if end - start > self.max_duration:
+            self.max_duration = end - start
+        self.bump()
+
+    def remove(self, uid, start):
+        self._intervals.pop((start, uid), None)
+        self.bump()
+
+    def bump(self):
+        self.serial += 1
+        self.changed = int(time.time())
+
+    def overlapping(self, start, end):
+        """Yield ``(uid, start, end)`` of bookings overlapping ``[start, end)``."""
+        # A 1-tuple sorts before every key with the same start
+        items = self._intervals.items(
+            min=(start - self.max_duration,),
+            max=(end,),
+            excludemax=True,
+        )
+        for (booking_start, uid), booking_end in items:
+            if booking_end > start:
+                yield uid, booking_start, booking_end
+
+    def overlapping_many(self, intervals):
+        """Find the bookings overlapping each of many ``(start, end)`` ranges.
+
+        The index is scanned once over the span of all ranges; each range
+        is then matched against that sorted list by bisection.
+
+        Returns:
+            List with, for each range in order, the list of overlapping
+            ``(uid, start, end)`` tuples
+        """
+        if not intervals:
+            return []
+        span_start = min(start for start, _end in intervals)
+        span_end = max(end for _start, end in intervals)
+        existing = list(self.overlapping(span_start, span_end))
+        starts = [booking_start for _uid, booking_start, _end in existing]
+
+        result = []
+        for start, end in intervals:
+            first = bisect_left(starts, start - self.max_duration)
+            last = bisect_left(starts, end)
+            result.append([
+                interval for interval in existing[first:last] if interval[2] > start
+            ])
+        return result
+
+    def busy_bitmap(self, start, slots):
+        """Bitmap of the half-hour slots occupied from ``start`` on.
+
+        Python ints serve as bit arrays: bit i is set when slot i, which
+        covers ``[start + i * SLOT_SECONDS, start + (i + 1) * SLOT_SECONDS)``,
+        overlaps a booking. Each booking sets its run of bits with one shift
+        and one OR, however long it is.
+        """
+        end = start + slots * SLOT_SECONDS
+        bitmap = 0
+        for _uid, booking_start, booking_end in self.overlapping(start, end):
+            # Partially covered slots count as busy
+            first = max(booking_start - start, 0) // SLOT_SECONDS
+            last = min(-(-(booking_end - start) // SLOT_SECONDS), slots)
+            bitmap |= slot_mask(first, last)
+        return bitmap
+
+    def intervals(self):
+        """Yield ``(uid, start, end)`` of all bookings, by start."""
+        for (booking_start, uid), booking_end in self._intervals.items():
+            yield uid, booking_start, booking_end
+
+
+class BookingIndex(Persistent):
+    """Interval index of bookings for all rooms."""
+
+    def __init__(self):
+        # room UID -> RoomIntervals
+        self._rooms = OOBTree()
+        # booking UID -> (room UID, start, end), to find stale entries
+        self._bookings = OOBTree()
+
+    def __len__(self):
+        return len(self._bookings)
+
+    def __contains__(self, uid):
+        return uid in self._bookings
+
+    def items(self):
+        """Iterate ``(uid, (room UID, start, end))`` of all bookings, by UID."""
+        return self._bookings.items()
+
+    def room(self, room_uid):
+        """Return the intervals of a room, or None if it has no bookings."""
+        return self._rooms.get(room_uid)
+
+    def reserve(self, room_uid):
+        """Claim the room for the current transaction.
+
+        Bumps the serial of the room, so a concurrent transaction that
+        reserves or changes the same room fails to commit with a
+        ConflictError. Call this before checking for conflicts and creating
+        a booking to make both atomic.
+        """
+        room = self._rooms.get(room_uid)
+        if room is None:
+            room = self._rooms[room_uid] = RoomIntervals()
+        room.bump()
+        return room
+
+    def index(self, uid, room_uid, start, end):
+        """Add a booking, replacing any previous entry for it.
+
+        Returns False if the booking was already indexed with these values.
+        """
+        current = self._bookings.get(uid)
+        if current == (room_uid, start, end):
+            return False
+        if current is not None:
+            self.unindex(uid)
+        room = self._rooms.get(room_uid)
+        if room is None:
+            room = self._rooms[room_uid] = RoomIntervals()
+        room.add(uid, start, end)
+        self._bookings[uid] = (room_uid, start, end)
+        return True
+
+    def touch(self, uid):
+        """Bump the room of a booking whose other fields changed."""
+        current = self._bookings.get(uid)
+        if current is None:
+            return
+        room = self._rooms.get(current[0])
+        if room is not None:
+            room.bump()
+
+    def version(self, room_uid):
+        """Return ``(serial, changed)`` of a room, ``(0, 0)`` if it has no bookings."""
+        room = self._rooms.get(room_uid)
+        if room is None:
+            return 0, 0
+        return room.serial, room.changed
+
+    def unindex(self, uid):
+        """Remove a booking. Unknown bookings are ignored."""
+        current = self._bookings.pop(uid, None)
+        if current is None:
+            return
+        room_uid, start, _end = current
+        room = self._rooms.get(room_uid)
+        if room is not None:
+            room.remove(uid, start)
+
+    def overlapping(self, room_uid, start, end, exclude_uid=None):
+        """List ``(uid, start, end)`` of room bookings overlapping ``[start, end)``.
+
+        Args:
+            room_uid: UID of the conference room
+            start: Start of the range in epoch seconds
+            end: End of the range in epoch seconds (exclusive)
+            exclude_uid: Optional booking UID to leave out, e.g. the booking
+                being edited
+
+        Returns:
+            List of ``(uid, start, end)`` tuples ordered by start
+        """
+        room = self._rooms.get(room_uid)
+        if room is None:
+            return []
+        return [
+            interval for interval in room.overlapping(start, end)
+            if interval[0] != exclude_uid
+        ]
+
+    def overlapping_many(self, room_uid, intervals):
+        """Find room bookings overlapping each range, see RoomIntervals."""
+        room = self._rooms.get(room_uid)
+        if room is None:
+            return [[] for _interval in intervals]
+        return room.overlapping_many(intervals)
+
+    def busy_bitmap(self, room_uid, start, slots):
+        """Bitmap of the occupied half-hour slots of a room, see RoomIntervals."""
+        room = self._rooms.get(room_uid)
+        if room is None:
+            return 0
+        return room.busy_bitmap(start, slots)
+
+    def clear(self):
+        self._rooms.clear()
+        self._bookings.clear()
+
+
+def align_up(seconds):
+    """Round epoch seconds up to the next slot boundary."""
+    return -(-seconds // SLOT_SECONDS) * SLOT_SECONDS
+
+
+def free_slots(bookings, start, end, duration, fit=None):
+    """Yield the starts of free ranges of ``duration`` seconds in ``[start, end)``.
+
+    Sweeps the bookings of a room once, in order, and yields every slot
+    boundary at which a booking of ``duration`` could start.
+
+    Args:
+        bookings: ``(uid, start, end)`` tuples of one room ordered by start,
+            e.g. from ``RoomIntervals.overlapping``
+        start: Earliest start in epoch seconds, on a slot boundary
+        end: Latest end in epoch seconds
+        duration: Length of the wanted range in seconds
+        fit: Optional function mapping a candidate start to the first
+            acceptable start at or after it, e.g. within opening hours
+    """
+    if fit is None:
+        fit = lambda t: t  # noqa: E731
+    t = fit(start)
+    for _uid, booking_start, booking_end in bookings:
+        while t + duration <= min(booking_start, end):
+            yield t
+            t = fit(t + SLOT_SECONDS)
+        if t + duration > end:
+            return
+        if booking_end > t:
+            t = fit(align_up(booking_end))
+    while t + duration <= end:
+        yield t
+        t = fit(t + SLOT_SECONDS)
+
+
+def find_slots(booking_index, room_uids, start, end, duration, limit, fit=None):
+    """Find the first free ranges over several rooms.
+
+    The free slots of each room are generated lazily and merged by start,
+    so only as much of each room's bookings is read as the first ``limit``
+    results need.
+
+    Returns:
+        List of up to ``limit`` ``(start, room_uid)`` tuples, earliest first
+    """
+    def room_slots(room_uid):
+        room = booking_index.room(room_uid) if booking_index is not None else None
+        bookings = room.overlapping(start, end) if room is not None else ()
+        for slot_start in free_slots(bookings, start, end, duration, fit):
+            yield slot_start, room_uid
+
+    return list(islice(merge(*(room_slots(uid) for uid in room_uids)), limit))
+
+
+def get_index(create=False):
+    """Get the booking index of the site, or None if there is none yet."""
+    annotations = IAnnotations(api.portal.get())
+    booking_index = annotations.get(ANNOTATION_KEY)
+    if booking_index is None and create:
+        booking_index = BookingIndex()
+        annotations[ANNOTATION_KEY] = booking_index
+    return booking_index
+
+
+def booking_interval(booking):
+    """Return ``(room_uid, start, end)`` of a booking, or None if incomplete."""
+    room = booking.room.to_object if getattr(booking, 'room', None) else None
+    start = getattr(booking, 'start_datetime', None)
+    end = getattr(booking, 'end_datetime', None)
+    if room is None or start is None or end is None:
+        return None
+    return room.UID(), to_epoch(start), to_epoch(end)
+
+
+def index_booking(booking, booking_index=None):
+    """Add or update the index entry of a booking.
+
+    Returns False if the entry was already up to date.
+    """
+    if booking_index is None:
+        booking_index = get_index(create=True)
+    interval = booking_interval(booking)
+    if interval is None:
+        booking_index.unindex(booking.UID())
+        return True
+    return booking_index.index(booking.UID(), *interval)
+
+
+def booking_added(obj, event):
+    """Event subscriber indexing new bookings."""
+    if obj.portal_type != 'room_booking':
+        return
+    index_booking(obj)
+
+
+def booking_modified(obj, event):
+    """Event subscriber reindexing edited bookings."""
+    if obj.portal_type != 'room_booking':
+        return
+    if not index_booking(obj):
+        # Same room and times, but the title or purpose may have changed,
+        # which invalidates cached calendar feeds of the room
+        get_index().touch(obj.UID())
+
+
+def booking_removed(obj, event):
+    """Event subscriber dropping deleted bookings."""
+    if obj.portal_type != 'room_booking':
+        return
+    booking_index = get_index()
+    if booking_index is not None:
+        booking_index.unindex(obj.UID())
+
+
+def rebuild_index():
+    """Rebuild the booking index from all room bookings.
+
+    Returns the number of indexed bookings.
+    """
+    booking_index = get_index(create=True)
+    booking_index.clear()
+    count = 0
+    catalog = api.portal.get_tool('portal_catalog')
+    for brain in catalog.unrestrictedSearchResults(portal_type='room_booking'):
+        booking = brain._unrestrictedGetObject()
+        interval = booking_interval(booking)
+        if interval is None:
+            logger.warning(f"Skipping booking {brain.getPath()} without room or times")
+            continue
+        booking_index.index(booking.UID(), *interval)
+        count += 1
+    logger.info(f"Rebuilt booking index with {count} bookings")
+    return count
+
+
+def slot_mask(first, last):
+    """Bitmap with the bits of slots ``first`` up to ``last`` (exclusive) set."""
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
@@ -2,10 +2,46 @@
 
 from datetime import datetime, timedelta
 from plone import api
+from .booking_index import get_index
+from .booking_index import to_epoch
+from .identity_aliases import owner_key
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Bookings are stored in one container per month below this folder
+BOOKINGS_PATH = '/conference-rooms/bookings'
+
+
+def partition_id(dt):
+    """Id of the monthly container for bookings starting at dt"""
+    return dt.strftime('%Y-%m')
+
+
+def get_bookings_container(start_dt):
+    """Get the monthly container for a booking, creating it if needed
+
+    Returns None if the bookings folder doesn't exist.
+    """
+    bookings = api.content.get(path=BOOKINGS_PATH)
+    if bookings is None:
+        return None
+    
+    month_id = partition_id(start_dt)
+    if month_id not in bookings.objectIds():
+        # Members may add bookings, but not the containers holding them
+        with api.env.adopt_roles(['Manager']):
+            api.content.create(
+                container=bookings,
+                type=bookings.portal_type,
+                id=month_id,
+                title=start_dt.strftime('%B %Y'),
+                exclude_from_nav=True
+            )
+        logger.info(f"Created booking container {month_id}")
+    
+    return bookings[month_id]
+
 
 def round_to_half_hour(dt):
     """Round datetime to nearest half hour"""
@@ -49,53 +85,57 @@ def validate_booking_times(start_dt, end_dt):
 
 
 def check_booking_conflicts(room_uid, start_dt, end_dt, exclude_booking_uid=None):
-    """Check if there are any booking conflicts for a room"""
+    """Check if there are any booking conflicts for a room
+
+    Overlapping bookings are looked up in the per-room interval index and
+    returned as catalog brains ordered by start, so no booking is loaded.
+    Bookings the current user can't see still count as conflicts.
+    """
+    booking_index = get_index()
+    if booking_index is None:
+        logger.warning("Booking index missing, querying the catalog instead; "
+                       "run rebuild_booking_index.py")
+        return query_booking_conflicts(room_uid, start_dt, end_dt, exclude_booking_uid)
+
+    overlapping = booking_index.overlapping(
+        room_uid, to_epoch(start_dt), to_epoch(end_dt), exclude_uid=exclude_booking_uid
+    )
+    if not overlapping:
+        return []
+
     catalog = api.portal.get_tool('portal_catalog')
-    
-    # Search for bookings of this room
-    query = {
-        'portal_type': 'room_booking',
-        'path': '/'.join(api.portal.get().getPhysicalPath()) + '/conference-rooms/bookings'
-    }
-    
-    bookings = catalog(query)
-    conflicts = []
-    
-    for brain in bookings:
-        booking = brain.getObject()
-        
-        # Skip if this is the booking we're editing
-        if exclude_booking_uid and booking.UID() == exclude_booking_uid:
-            continue
-        
-        # Skip if it's a different room
-        if not booking.room or booking.room.to_object.UID() != room_uid:
-            continue
-        
-        # Check for time overlap
-        booking_start = booking.start_datetime
-        booking_end = booking.end_datetime
-        
-        # Overlap occurs if:
-        # 1. New booking starts during existing booking
-        # 2. New booking ends during existing booking  
-        # 3. New booking completely contains existing booking
-        # 4. Existing booking completely contains new booking
-        
-        if (start_dt < booking_end and end_dt > booking_start):
-            conflicts.append({
-                'booking': booking,
-                'start': booking_start,
-                'end': booking_end,
-                'title': booking.title,
-                'user': booking.Creator()
-            })
-    
-    return conflicts
+    return catalog.unrestrictedSearchResults(
+        portal_type='room_booking',
+        UID=[uid for uid, _start, _end in overlapping],
+        sort_on='start_datetime',
+        sort_order='ascending'
+    )
+
+
+def query_booking_conflicts(room_uid, start_dt, end_dt, exclude_booking_uid=None):
+    """Check for booking conflicts with the catalog indexes only
+
+    The date indexes only support inclusive ranges, so bookings that merely
+    touch the requested range are dropped using the brain metadata.
+    """
+    catalog = api.portal.get_tool('portal_catalog')
+    brains = catalog.unrestrictedSearchResults(
+        portal_type='room_booking',
+        room_uid=room_uid,
+        start_datetime={'query': end_dt, 'range': 'max'},
+        end_datetime={'query': start_dt, 'range': 'min'},
+        sort_on='start_datetime',
+        sort_order='ascending'
+    )
+    return [
+        brain for brain in brains
+        if brain.UID != exclude_booking_uid
+        and start_dt < brain.end_datetime and end_dt > brain.start_datetime
+    ]
 
 
 def get_user_bookings(username=None):
-    """Get all bookings for a user"""
+    """Get all bookings for a user as catalog brains"""
     if not username:
         username = api.user.get_current().getId()
     
@@ -103,7 +143,7 @@ def get_user_bookings(username=None):
     
     query = {
         'portal_type': 'room_booking',
-        'Creator': username,
+        'booking_owner': owner_key(username),
         'sort_on': 'start_datetime',
         'sort_order': 'ascending'
     }
@@ -112,37 +152,26 @@ def get_user_bookings(username=None):
 
 
 def get_room_bookings(room_uid, start_date=None, end_date=None):
-    """Get all bookings for a specific room within a date range"""
+    """Get all bookings for a specific room within a date range
+
+    Returns catalog brains ordered by start. Bookings are included if they
+    end on or after start_date and start on or before end_date.
+    """
     catalog = api.portal.get_tool('portal_catalog')
     
     query = {
         'portal_type': 'room_booking',
+        'room_uid': room_uid,
         'sort_on': 'start_datetime',
         'sort_order': 'ascending'
     }
     
-    # Note: We'll need to filter by room relation and date range in the results
-    # since catalog queries don't easily support relation filtering
-    
-    bookings = catalog(query)
-    filtered = []
+    if start_date:
+        query['end_datetime'] = {'query': start_date, 'range': 'min'}
+    if end_date:
+        query['start_datetime'] = {'query': end_date, 'range': 'max'}
     
-    for brain in bookings:
-        booking = brain.getObject()
-        
-        # Check if it's for this room
-        if not booking.room or booking.room.to_object.UID() != room_uid:
-            continue
-        
-        # Check date range if provided
-        if start_date and booking.end_datetime < start_date:
-            continue
-        if end_date and booking.start_datetime > end_date:
-            continue
-            
-        filtered.append(booking)
-    
-    return filtered
+    return catalog(query)
 
 
 def can_user_cancel_booking(booking, user=None):
@@ -150,8 +179,8 @@ def can_user_cancel_booking(booking, user=None):
     if not user:
         user = api.user.get_current()
     
-    # Users can cancel their own bookings
-    if booking.Creator() == user.getId():
+    # Users can cancel their own bookings, under any of their identities
+    if owner_key(booking.Creator()) == owner_key(user.getId()):
         return True
     
     # Managers can cancel any booking
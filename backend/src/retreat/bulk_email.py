@@ -0,0 +1,355 @@
+"""Rate-limited bulk sending of emails to many recipients.
+
+Camp alerts go to every participant. Rather than one provider call with
+everybody in ``to``, which hits recipient limits, shows every address to
+everyone and fails as a whole on one bad address, ``BulkDispatcher``
+sends one message per recipient. Messages are grouped into provider
+batches of ``EMAIL_BATCH_SIZE`` and the batches sent concurrently, while a
+token bucket shared by the process keeps the requests under
+``EMAIL_RATE_LIMIT`` per second.
+
+Every recipient ends up ``sent``, ``failed`` (rejected for good, e.g. an
+invalid address) or ``retry`` (the provider was unavailable). Malformed
+addresses fail without a request. A batch the provider rejects as a bad
+request (400 or 422) is split in halves until the rejected messages are
+found, so a bad address fails only its own message at the cost of a few
+requests. Any other permanent error, e.g. 403 for a bad API key or an
+unverified sending domain, fails the rest of the dispatch without
+further requests.
+``DeliveryReport`` keeps these statuses for a piece of content, e.g. on
+the alert.
+
+A message with ``personalize``, a dict of per-recipient field values, has
+an ``html`` template (see ``email_templates``) rendered for each recipient.
+In ``RESEND_TEST_MODE`` the rendered messages go into ``sink`` instead of
+the provider.
+"""
+
+from BTrees.OOBTree import OOBTree
+from collections import Counter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from persistent import Persistent
+from zope.annotation.interfaces import IAnnotations
+from . import email_templates
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+logger = logging.getLogger('retreat.bulk_email')
+
+REPORT_KEY = 'retreat.delivery_report'
+
+# Provider limits, Resend allows 2 requests a second and 100 emails a batch
+DEFAULT_RATE_LIMIT = 2
+DEFAULT_BATCH_SIZE = 100
+
+# Batches in flight at once
+DISPATCH_THREADS = 4
+
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+RETRY = 'retry'
+
+# Provider status codes of requests that fail the same way when repeated
+PERMANENT_CODES = {400, 403, 404, 422}
+
+# Status codes of a batch rejected over some of its messages
+REJECTED_CODES = {400, 422}
+
+# Times a request answered with 429 Too Many Requests is sent again
+THROTTLED_RETRIES = 3
+
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing ``rate`` acquisitions a second.
+
+    The default capacity of one token spaces requests evenly, so no window
+    of a second sees more than ``rate`` of them. While a priority request,
+    e.g. of an emergency alert, waits, other requests get no tokens.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._priority = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, priority=False):
+        """Take a token, waiting until one is available."""
+        with self._lock:
+            self._priority += priority
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1 and (priority or not self._priority):
+                        self._tokens -= 1
+                        return
+                    # Without a token, or leaving it to a priority request
+                    wait = max(1 - self._tokens, 0) / self.rate or 1 / self.rate
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self._priority -= priority
+
+
+def status_code(error):
+    """HTTP status code of a provider error, or None."""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    try:
+        return int(code)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_permanent(error):
+    """Whether a provider error would repeat on retry."""
+    return status_code(error) in PERMANENT_CODES
+
+
+def describe(error):
+    return f'{error.__class__.__name__}: {error}'
+
+
+class ResendProvider:
+    """Sends through the Resend API."""
+
+    def __init__(self):
+        import resend
+        resend.api_key = os.environ.get('RESEND_API_KEY')
+        if not resend.api_key:
+            raise RuntimeError("RESEND_API_KEY not found in environment variables")
+        self.resend = resend
+
+    def send(self, email):
+        return self.resend.Emails.send(email).get('id', 'unknown')
+
+    def send_batch(self, emails):
+        """Send up to 100 emails in one request, returning their ids."""
+        response = self.resend.Batch.send(emails)
+        return [item.get('id', 'unknown') for item in response.get('data', [])]
+
+
+class MessageSink:
+    """Keeps the last messages sent in test mode, for tests and benchmarks."""
+
+    def __init__(self, size=1000):
+        self._messages = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def add(self, messages):
+        with self._lock:
+            self._messages.extend(messages)
+
+    def messages(self, to=None):
+        """List the kept messages, optionally only those to an address."""
+        with self._lock:
+            messages = list(self._messages)
+        return [m for m in messages if to is None or to in m.get('to', [])]
+
+    def clear(self):
+        with self._lock:
+            self._messages.clear()
+
+
+sink = MessageSink()
+
+
+class TestModeProvider:
+    """Keeps messages in a sink instead of sending them, for ``RESEND_TEST_MODE``."""
+
+    def __init__(self, sink=sink):
+        self.sink = sink
+
+    def send(self, email):
+        return self.send_batch([email])[0]
+
+    def send_batch(self, emails):
+        self.sink.add(emails)
+        logger.info(f"TEST MODE - Kept '{emails[0]['subject']}' to {len(emails)} recipients")
+        return [f'test-{uuid.uuid4().hex[:12]}' for _email in emails]
+
+
+class BulkDispatcher:
+    """Sends one message per recipient in concurrent, rate-limited batches."""
+
+    def __init__(self, provider, rate_limiter, batch_size=DEFAULT_BATCH_SIZE,
+                 threads=DISPATCH_THREADS, priority=False):
+        self.provider = provider
+        self.rate_limiter = rate_limiter
+        self.batch_size = batch_size
+        self.threads = threads
+        self.priority = priority
+
+    def dispatch(self, email_data, recipients):
+        """Send ``email_data`` to each recipient on its own.
+
+        Args:
+            email_data: Provider message without ``to``, optionally with
+                ``personalize`` mapping addresses to their field values
+            recipients: Email addresses
+
+        Returns:
+            Dict mapping each address to ``(state, provider id or error)``
+        """
+        email_data = dict(email_data)
+        personalize = email_data.pop('personalize', None)
+        if personalize is not None:
+            template = email_templates.compile_template(email_data['html'])
+        results = {}
+        messages = []
+        for address in recipients:
+            if not EMAIL.match(address):
+                results[address] = (FAILED, 'Invalid email address')
+                continue
+            message = dict(email_data, to=[address])
+            if personalize is not None:
+                message['html'] = template.render(dict(personalize.get(address, ()), email=address))
+            messages.append(message)
+        batches = [
+            messages[i:i + self.batch_size]
+            for i in range(0, len(messages), self.batch_size)
+        ]
+        # Set to the error when the provider refuses all sending
+        refused = []
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            for batch_results in pool.map(lambda batch: self._send_batch(batch, refused), batches):
+                results.update(batch_results)
+        return results
+
+    def _request(self, batch):
+        """Send a batch, waiting for the rate limiter and retrying 429s."""
+        for attempt in range(THROTTLED_RETRIES + 1):
+            self.rate_limiter.acquire(self.priority)
+            try:
+                if len(batch) == 1:
+                    return [self.provider.send(batch[0])]
+                return self.provider.send_batch(batch)
+            except Exception as e:
+                if status_code(e) != 429 or attempt == THROTTLED_RETRIES:
+                    raise
+
+    def _send_batch(self, batch, refused):
+        if refused:
+            return {message['to'][0]: (FAILED, refused[0]) for message in batch}
+        try:
+            ids = self._request(batch)
+        except Exception as e:
+            if status_code(e) in REJECTED_CODES and len(batch) > 1:
+                # One bad message rejects the whole batch, split it to find it
+                half = len(batch) // 2
+                results = self._send_batch(batch[:half], refused)
+                results.update(self._send_batch(batch[half:], refused))
+                return results
+            if is_permanent(e) and status_code(e) not in REJECTED_CODES:
+                # Every other request would be refused the same way
+                refused.append(describe(e))
+            state = FAILED if is_permanent(e) else RETRY
+            return {message['to'][0]: (state, describe(e)) for message in batch}
+        return {message['to'][0]: (SENT, message_id) for message, message_id in zip(batch, ids)}
+
+
+_rate_limiter = None
+_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """The token bucket of the process, shared by all sends to the provider."""
+    global _rate_limiter
+    with _lock:
+        if _rate_limiter is None:
+            rate = float(os.environ.get('EMAIL_RATE_LIMIT', DEFAULT_RATE_LIMIT))
+            _rate_limiter = TokenBucket(rate)
+        return _rate_limiter
+
+
+def get_dispatcher():
+    """Build a dispatcher for the configured provider."""
+    if os.environ.get('RESEND_TEST_MODE', 'false').lower() == 'true':
+        provider = TestModeProvider()
+    else:
+        provider = ResendProvider()
+    batch_size = int(os.environ.get('EMAIL_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+    return BulkDispatcher(provider, get_rate_limiter(), batch_size)
+
+
+class DeliveryReport(Persistent):
+    """Delivery status of one message for each of its recipients."""
+
+    def __init__(self, recipients, now=None):
+        self.queued = time.time() if now is None else now
+        self.last_sent = None
+        # address -> (state, provider id or error, time)
+        self._status = OOBTree()
+        for address in recipients:
+            self._status[address] = (PENDING, None, None)
+
+    def __len__(self):
+        return len(self._status)
+
+    def record(self, results, now=None):
+        """Store ``{address: (state, detail)}`` results of a send."""
+        now = time.time() if now is None else now
+        for address, (state, detail) in results.items():
+            self._status[address] = (state, detail, now)
+        if any(state == SENT for state, _detail in results.values()):
+            self.last_sent = now
+
+    def counts(self):
+        counts = Counter({PENDING: 0, SENT: 0, FAILED: 0, RETRY: 0})
+        counts.update(state for state, _detail, _time in self._status.values())
+        return dict(counts)
+
+    def time_to_last_delivery(self):
+        """Seconds from queueing to the last delivery, or None while any is due."""
+        counts = self.counts()
+        if counts[PENDING] or counts[RETRY] or self.last_sent is None:
+            return None
+        return self.last_sent - self.queued
+
+    def items(self, state=None):
+        """Yield ``(address, state, detail, time)``, optionally of one state."""
+        for address, (item_state, detail, when) in self._status.items():
+            if state is None or item_state == state:
+                yield address, item_state, detail, when
+
+
+def _report_key(transport):
+    # Email reports predate the other transports and keep the plain key
+    return REPORT_KEY if transport == 'email' else f'{REPORT_KEY}.{transport}'
+
+
+def create_report(obj, recipients, transport='email', now=None):
+    """Start a new delivery report on a content object."""
+    report = DeliveryReport(recipients, now)
+    IAnnotations(obj)[_report_key(transport)] = report
+    return report
+
+
+def get_report(obj, transport='email'):
+    return IAnnotations(obj).get(_report_key(transport))
+
+
+def get_reports(obj):
+    """Return the delivery reports of a content object by transport."""
+    reports = {}
+    for key, value in IAnnotations(obj).items():
+        if key == REPORT_KEY:
+            reports['email'] = value
+        elif key.startswith(REPORT_KEY + '.'):
+            reports[key[len(REPORT_KEY) + 1:]] = value
+    return reports
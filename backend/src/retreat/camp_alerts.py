@@ -2,6 +2,12 @@
 import os
 import logging
 from plone import api
+from . import bulk_email
+from . import display_names
+from . import email_outbox
+from . import email_templates
+from . import emergency_alerts
+from . import transports
 
 logger = logging.getLogger('retreat.camp_alerts')
 
@@ -29,40 +35,39 @@ def send_camp_alert(obj, event):
     # Check for test mode
     test_mode = os.environ.get('RESEND_TEST_MODE', 'false').lower() == 'true'
     
+    if not test_mode and not os.environ.get('RESEND_API_KEY'):
+        logger.error("RESEND_API_KEY not found in environment variables")
+        return
+    
     try:
-        # Import resend here to avoid import errors if not installed
-        import resend
-        
-        # Initialize Resend API
-        resend.api_key = os.environ.get('RESEND_API_KEY')
-        
-        if not resend.api_key:
-            logger.error("RESEND_API_KEY not found in environment variables")
-            return
+        # Get alert details
+        alert_type = getattr(obj, 'alert_type', 'info')
+        message = getattr(obj, 'message', '')
         
-        # Get all users to notify
-        recipients = []
+        # Emergencies go out over every transport, everything else by email
+        if alert_type == 'emergency':
+            alert_transports = {t.name: t for t in transports.get_transports()}
+        else:
+            alert_transports = {'email': transports.EmailTransport()}
         
+        # Get the address of every user on each transport, and the names to
+        # greet them with by email
+        addresses = {name: [] for name in alert_transports}
+        personalize = {}
         for user in api.user.get_users():
-            email = user.getProperty('email')
-            if email:
-                recipients.append({
-                    'email': email,
-                    'fullname': user.getProperty('fullname', user.getId())
-                })
-        
-        if not recipients:
+            for name, transport in alert_transports.items():
+                address = transport.address(user)
+                if address:
+                    addresses[name].append(address)
+                    if name == 'email' and address not in personalize:
+                        fullname = display_names.get_display_name(user.getId(), user)
+                        personalize[address] = {'fullname': fullname}
+        addresses = {name: list(dict.fromkeys(found)) for name, found in addresses.items()}
+        
+        if not any(addresses.values()):
             logger.info("No recipients found for camp alert notification")
             return
         
-        # Get alert details
-        alert_type = getattr(obj, 'alert_type', 'info')
-        message = getattr(obj, 'message', '')
-        
-        # Get sender info
-        sender = api.user.get_current()
-        sender_name = sender.getProperty('fullname', sender.getId()) if sender else 'System'
-        
         # Format alert type for display
         alert_type_map = {
             'emergency': {
@@ -84,63 +89,54 @@ def send_camp_alert(obj, event):
         
         alert_config = alert_type_map.get(alert_type, alert_type_map['info'])
         
-        # Create email content
-        email_html = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <div style="background-color: {alert_config['color']}; color: white; padding: 20px; text-align: center;">
-                <h1 style="margin: 0; font-size: 24px;">
-                    {alert_config['emoji']} {alert_config['title']}
-                </h1>
-            </div>
-            
-            <div style="padding: 30px; background-color: #f8f9fa;">
-                <h2 style="color: #333; margin-top: 0;">{obj.title}</h2>
-                
-                <div style="background-color: white; padding: 20px; border-radius: 5px; margin: 20px 0;">
-                    <p style="margin: 0; line-height: 1.6; white-space: pre-wrap;">{message}</p>
-                </div>
-                
-                <div style="color: #666; font-size: 14px; margin-top: 20px;">
-                    <p>Sent by: {sender_name}</p>
-                </div>
-            </div>
-            
-            <div style="background-color: #e9ecef; padding: 20px; text-align: center; font-size: 12px; color: #666;">
-                <p>This is an automated message from the Camp Coordinator system.</p>
-                <p>You are receiving this because you are registered at the camp.</p>
-            </div>
-        </div>
-        """
+        def shared_fields():
+            # Get sender info
+            sender = api.user.get_current()
+            return {
+                'color': alert_config['color'],
+                'emoji': alert_config['emoji'],
+                'heading': alert_config['title'],
+                'title': obj.title,
+                'message': message,
+                'sender': display_names.get_display_name(sender.getId(), sender) if sender else 'System',
+            }
+        
+        # The alert part of the email, rendered once for all recipients
+        template = email_templates.render_shared('camp_alert', obj, shared_fields)
         
         # Prepare email data
         email_data = {
             "from": "Camp Coordinator <noreply@coolapps.jackwimbish.com>",
-            "to": [r['email'] for r in recipients],
             "subject": f"{alert_config['emoji']} {obj.title}",
-            "html": email_html
+            "html": template.source,
+            "personalize": personalize,
         }
         
-        if test_mode:
-            # Test mode - just log the email details
-            logger.info("=== TEST MODE - Camp Alert Email would be sent ===")
-            logger.info(f"Alert Type: {alert_type}")
-            logger.info(f"From: {email_data['from']}")
-            logger.info(f"To: {len(recipients)} recipients")
-            logger.info(f"Subject: {email_data['subject']}")
-            logger.info(f"Message: {message[:100]}{'...' if len(message) > 100 else ''}")
-            logger.info(f"Recipients: {[r['fullname'] + ' <' + r['email'] + '>' for r in recipients[:3]]}... and {len(recipients)-3} more")
-            logger.info("=== End of test email ===")
-        else:
-            # Production mode - send the email
-            result = resend.Emails.send(email_data)
-            logger.info(f"Camp alert email sent successfully. Resend ID: {result.get('id', 'unknown')}")
-            logger.info(f"Alert type: {alert_type}, Sent to {len(recipients)} recipients")
+        if alert_type == 'emergency':
+            # Sent right after this transaction commits, skipping the outbox
+            alert = dict(
+                email_data,
+                text=message,
+                url=obj.absolute_url(),
+                sms=getattr(obj, 'sms_placeholder', None),
+                push=getattr(obj, 'push_notification_placeholder', None),
+            )
+            emergency_alerts.send_emergency_alert(
+                obj, alert, alert_transports, addresses, api.portal.get()
+            )
+            counts = ', '.join(f"{len(found)} by {name}" for name, found in addresses.items())
+            logger.info(f"Alert type: {alert_type}, sending to {counts}")
+            return
+        
+        # Everybody gets a copy of their own, sent in rate-limited batches by
+        # the outbox worker once this transaction commits
+        report = bulk_email.create_report(obj, addresses['email'])
+        email_outbox.queue_email(email_data, 'camp_alert', recipients=addresses['email'], report=report)
+        logger.info(f"Alert type: {alert_type}, queued for {len(addresses['email'])} recipients")
     
-    except ImportError:
-        logger.error("resend package not installed. Run: pip install resend")
     except Exception as e:
         # Log error but don't block alert creation
-        logger.error(f"Failed to send camp alert email: {str(e)}", exc_info=True)
+        logger.error(f"Failed to send camp alert: {str(e)}", exc_info=True)
         
         
 def set_camp_alert_permissions():
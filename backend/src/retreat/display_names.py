@@ -0,0 +1,173 @@
+"""Process-wide cache of user display names.
+
+Activities, notifications and the booking and user endpoints all need the
+fullname of users by id. Looking a user up goes through every PAS plugin,
+so names are kept in a bounded LRU cache shared by all threads of the
+process. Entries are dropped when the user's properties change and expire
+after ``TTL`` seconds, so changes made through another process show up
+eventually.
+"""
+
+from collections import OrderedDict
+from plone import api
+from Products.PlonePAS.plugins.ufactory import PloneUser
+from Products.PluggableAuthService.interfaces.plugins import IPropertiesPlugin
+import logging
+import threading
+import time
+
+logger = logging.getLogger('retreat.display_names')
+
+# Maximum number of cached users
+MAX_SIZE = 2000
+
+# Seconds before a cached name is looked up again
+TTL = 300
+
+# Cached value for user ids that don't exist
+_MISSING = object()
+
+
+class DisplayNameCache:
+    """Thread-safe LRU cache mapping user ids to fullnames."""
+
+    def __init__(self, max_size=MAX_SIZE, ttl=TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Return the cached fullname, ``_MISSING``, or None on a cache miss."""
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._data.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, user_id, value):
+        with self._lock:
+            self._data[user_id] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'max_size': self.max_size,
+            }
+
+
+_cache = DisplayNameCache()
+
+
+def get_fullname(user_id, user=None):
+    """Get the fullname of a user.
+
+    Args:
+        user_id: The user id
+        user: Optional user object, used instead of a lookup on a cache miss
+
+    Returns:
+        The fullname ('' if the user has none) or None if the user doesn't exist
+    """
+    if not user_id:
+        return None
+    cached = _cache.get(user_id)
+    if cached is None:
+        if user is None:
+            user = api.user.get(userid=user_id)
+        cached = (user.getProperty('fullname', '') or '') if user else _MISSING
+        _cache.set(user_id, cached)
+    return None if cached is _MISSING else cached
+
+
+def get_display_name(user_id, user=None):
+    """Get the name to show for a user: the fullname, or the user id."""
+    return get_fullname(user_id, user) or user_id
+
+
+def get_fullnames(user_ids):
+    """Get the fullnames of many users at once.
+
+    Cache misses are found with ``searchUsers`` and their fullname is read
+    from the property plugins directly, so unlike ``getUserById`` no roles
+    or groups are computed for them.
+
+    Returns:
+        Dict mapping each user id to its fullname, or None if the user
+        doesn't exist
+    """
+    result = {}
+    missing = []
+    for user_id in dict.fromkeys(user_ids):
+        if not user_id:
+            continue
+        cached = _cache.get(user_id)
+        if cached is None:
+            missing.append(user_id)
+        else:
+            result[user_id] = None if cached is _MISSING else cached
+
+    if not missing:
+        return result
+
+    acl_users = api.portal.get_tool('acl_users')
+    plugins = acl_users.plugins.listPlugins(IPropertiesPlugin)
+    for user_id in missing:
+        found = acl_users.searchUsers(id=user_id, exact_match=True)
+        if found:
+            user = PloneUser(user_id, found[0].get('login') or user_id)
+            fullname = _property(plugins, user, 'fullname')
+        else:
+            fullname = _MISSING
+        _cache.set(user_id, fullname)
+        result[user_id] = None if fullname is _MISSING else fullname
+    return result
+
+
+def _property(plugins, user, name):
+    """Read a property of a user from the first plugin that has it set."""
+    for _plugin_id, plugin in plugins:
+        sheet = plugin.getPropertiesForUser(user, None)
+        if not sheet:
+            continue
+        # Plugins return a property sheet or a plain dict
+        value = sheet.getProperty(name) if hasattr(sheet, 'getProperty') else sheet.get(name)
+        if value:
+            return value
+    return ''
+
+
+def invalidate(user_id=None):
+    """Drop a user from the cache, or clear it if no user id is given."""
+    _cache.invalidate(user_id)
+
+
+def stats():
+    """Hit/miss counters and size of the cache."""
+    return _cache.stats()
+
+
+def principal_changed(event):
+    """Event subscriber dropping users that were changed, created or deleted."""
+    principal = event.principal
+    # Deletion events carry the bare user id
+    user_id = principal if isinstance(principal, str) else principal.getId()
+    invalidate(user_id)
@@ -0,0 +1,384 @@
+"""Transactional outbox for outgoing emails.
+
+Notifiers don't talk to the email provider. ``queue_email`` stores the
+message in a persistent outbox in a portal annotation, as part of the
+transaction that created the issue or alert. If that transaction aborts,
+the message is gone with it; once it commits, an after-commit hook wakes
+the delivery worker.
+
+The worker runs in a daemon thread of every Zope process, or, with
+``EMAIL_OUTBOX_WORKER=off`` in the instance, as a separate process through
+``email_outbox_worker.py``. It uses its own database connection and
+delivers in three steps, so no transaction is open while the provider is
+called:
+
+1. Claim due messages for ``LEASE`` seconds and commit. A message claimed
+   by another worker is skipped until its lease runs out.
+2. Send the claimed messages on a small thread pool.
+3. Drop the delivered messages and reschedule the failed ones with
+   exponential backoff. After ``MAX_ATTEMPTS`` a message is moved to the
+   failed messages, listed by ``@email-outbox``.
+
+Delivery is at least once: a worker dying between sending and step 3
+sends the message again after the lease.
+
+Messages queued with a list of ``recipients`` are bulk messages: each
+recipient gets a copy of their own through ``bulk_email``. Only the
+recipients that failed for a transient reason are retried, and the
+status of every recipient goes into the message's ``DeliveryReport``.
+"""
+
+from BTrees.Length import Length
+from BTrees.LOBTree import LOBTree
+from concurrent.futures import ThreadPoolExecutor
+from persistent import Persistent
+from plone import api
+from Products.CMFPlone.interfaces import IPloneSiteRoot
+from ZODB.POSException import ConflictError
+from zope.annotation.interfaces import IAnnotations
+from . import bulk_email
+import logging
+import os
+import random
+import threading
+import time
+import transaction
+
+logger = logging.getLogger('retreat.email_outbox')
+
+ANNOTATION_KEY = 'retreat.email_outbox'
+
+# Messages claimed and sent per round
+BATCH_SIZE = 50
+
+# Concurrent sends per worker
+SEND_THREADS = 4
+
+# Seconds a claimed message is reserved for the claiming worker
+LEASE = 300
+
+# Seconds between polls when no commit wakes the worker
+POLL_INTERVAL = 30
+
+# Retry delays grow from BACKOFF_BASE seconds, doubling up to BACKOFF_MAX
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+
+
+def backoff(attempts):
+    """Seconds to wait before the next attempt, with 20% jitter."""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return int(delay * random.uniform(0.8, 1.2))
+
+
+class Outbox(Persistent):
+    """Emails waiting for delivery, and the ones that gave up."""
+
+    def __init__(self):
+        # message id -> message dict, ids grow with the time of queueing
+        self._pending = LOBTree()
+        self._failed = LOBTree()
+        self._sent = Length()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, email_data, kind, now=None, recipients=None, report=None):
+        """Queue a message, returning its id.
+
+        Args:
+            email_data: Keyword arguments of the provider send call, with
+                ``from``, ``to``, ``subject`` and ``html``
+            kind: What the message is about, e.g. ``issue``, for the logs
+            now: Time of queueing in epoch seconds, for tests
+            recipients: Addresses to send a copy each to, for bulk messages
+                without ``to``
+            report: Optional DeliveryReport of a bulk message
+        """
+        now = time.time() if now is None else now
+        # Microseconds plus a random tail, so concurrent transactions don't
+        # pick the same id and the BTree keeps them in queueing order
+        message_id = int(now * 1e6) * 1000 + random.randrange(1000)
+        while message_id in self._pending:
+            message_id += 1
+        self._pending[message_id] = {
+            'email_data': dict(email_data),
+            'kind': kind,
+            'queued': int(now),
+            'attempts': 0,
+            'next_attempt': int(now),
+            'claimed_until': 0,
+            'last_error': None,
+        }
+        if recipients is not None:
+            self._pending[message_id].update(recipients=list(recipients), report=report)
+        return message_id
+
+    def claim(self, limit=BATCH_SIZE, now=None):
+        """Reserve up to ``limit`` due messages, returning ``(id, message)`` pairs."""
+        now = int(time.time()) if now is None else now
+        claimed = []
+        for message_id, message in self._pending.items():
+            if message['next_attempt'] > now or message['claimed_until'] > now:
+                continue
+            self._pending[message_id] = dict(message, claimed_until=now + LEASE)
+            claimed.append((message_id, message))
+            if len(claimed) >= limit:
+                break
+        return claimed
+
+    def delivered(self, message_id):
+        if self._pending.pop(message_id, None) is not None:
+            self._sent.change(1)
+
+    def failed(self, message_id, error, now=None, recipients=None):
+        """Record a failed attempt, rescheduling or giving up on the message.
+
+        For bulk messages, ``recipients`` are the addresses left to retry.
+        """
+        now = int(time.time()) if now is None else now
+        message = self._pending.get(message_id)
+        if message is None:
+            return
+        attempts = message['attempts'] + 1
+        message = dict(message, attempts=attempts, last_error=error, claimed_until=0,
+                       next_attempt=now + backoff(attempts))
+        if recipients is not None:
+            message['recipients'] = list(recipients)
+        if attempts >= MAX_ATTEMPTS:
+            del self._pending[message_id]
+            self._failed[message_id] = message
+            if message.get('report') is not None:
+                message['report'].record(
+                    {address: (bulk_email.FAILED, error) for address in message['recipients']}
+                )
+        else:
+            self._pending[message_id] = message
+
+    def bulk_sent(self, message_id, results, now=None):
+        """Record the per-recipient results of sending a bulk message."""
+        message = self._pending.get(message_id)
+        if message is None:
+            return
+        if message.get('report') is not None:
+            message['report'].record(results, now)
+        retry = [address for address, (state, _detail) in results.items()
+                 if state == bulk_email.RETRY]
+        if retry:
+            self.failed(message_id, f"{len(retry)} recipients failed, e.g. {results[retry[0]][1]}",
+                        now, recipients=retry)
+        else:
+            self.delivered(message_id)
+
+    def retry_failed(self):
+        """Move all failed messages back into the queue."""
+        now = int(time.time())
+        for message_id, message in list(self._failed.items()):
+            self._pending[message_id] = dict(message, attempts=0, next_attempt=now)
+        count = len(self._failed)
+        self._failed.clear()
+        return count
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'failed': len(self._failed),
+            'sent': self._sent(),
+        }
+
+    def failed_messages(self):
+        return list(self._failed.items())
+
+
+def get_outbox(site=None, create=False):
+    """Get the outbox of a site, by default the current one."""
+    annotations = IAnnotations(site if site is not None else api.portal.get())
+    outbox = annotations.get(ANNOTATION_KEY)
+    if outbox is None and create:
+        outbox = Outbox()
+        annotations[ANNOTATION_KEY] = outbox
+    return outbox
+
+
+def queue_email(email_data, kind, recipients=None, report=None):
+    """Queue an email to be sent after the current transaction commits.
+
+    Pass ``recipients`` instead of ``to`` in ``email_data`` to send every
+    recipient a copy of their own.
+    """
+    site = api.portal.get()
+    get_outbox(site, create=True).add(email_data, kind, recipients=recipients, report=report)
+    path = '/'.join(site.getPhysicalPath())
+    transaction.get().addAfterCommitHook(_committed, args=(path,))
+    count = len(recipients) if recipients is not None else len(email_data.get('to', []))
+    logger.info(f"Queued {kind} email '{email_data.get('subject')}' to {count} recipients")
+
+
+def _committed(status, path):
+    # Called with status False when the commit failed; nothing was queued then
+    if status:
+        wake(path)
+
+
+def wake(path):
+    """Have the delivery thread of this process look at a site's outbox now."""
+    if _worker is not None:
+        _worker.wake(path)
+
+
+def send(email_data):
+    """Send one message through the provider.
+
+    In ``RESEND_TEST_MODE`` the message goes into ``bulk_email.sink``
+    instead. Raises on any delivery error, so the message is retried.
+    """
+    if os.environ.get('RESEND_TEST_MODE', 'false').lower() == 'true':
+        return bulk_email.TestModeProvider().send(email_data)
+
+    provider = bulk_email.ResendProvider()
+    bulk_email.get_rate_limiter().acquire()
+    return provider.send(email_data)
+
+
+class OutboxWorker:
+    """Delivers the outbox messages of all sites of a database."""
+
+    def __init__(self, db, send=send, dispatcher=None, send_threads=SEND_THREADS):
+        self.db = db
+        self.send = send
+        self.dispatcher = dispatcher
+        self.send_threads = send_threads
+        self._sites = set()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='retreat-email-outbox', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def wake(self, path):
+        with self._lock:
+            self._sites.add(path)
+        self._wakeup.set()
+
+    def run(self):
+        logger.info("Email outbox worker started")
+        self._find_sites()
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            with self._lock:
+                sites = sorted(self._sites)
+            for path in sites:
+                try:
+                    while self.deliver(path) and not self._stopped.is_set():
+                        pass
+                except Exception:
+                    logger.exception(f"Email outbox delivery failed for {path}")
+            self._wakeup.wait(POLL_INTERVAL)
+
+    def _find_sites(self):
+        """Remember all Plone sites of the database."""
+        tm = transaction.TransactionManager()
+        connection = self.db.open(transaction_manager=tm)
+        try:
+            app = connection.root()['Application']
+            with self._lock:
+                for site in app.objectValues():
+                    if IPloneSiteRoot.providedBy(site):
+                        self._sites.add('/'.join(site.getPhysicalPath()))
+        finally:
+            tm.abort()
+            connection.close()
+
+    def deliver(self, path):
+        """Claim, send and settle one batch of a site.
+
+        Returns the number of messages handled.
+        """
+        tm = transaction.TransactionManager()
+        connection = self.db.open(transaction_manager=tm)
+        try:
+            claimed = self._transact(tm, connection, path, lambda outbox: outbox.claim())
+            if not claimed:
+                return 0
+
+            with ThreadPoolExecutor(max_workers=self.send_threads) as pool:
+                results = list(pool.map(self._send, claimed))
+
+            def settle(outbox):
+                for (message_id, message), (error, recipient_results) in zip(claimed, results):
+                    if recipient_results is not None:
+                        outbox.bulk_sent(message_id, recipient_results)
+                    elif error is None:
+                        outbox.delivered(message_id)
+                    else:
+                        outbox.failed(message_id, error)
+                        logger.warning(
+                            f"Sending {message['kind']} email '{message['email_data'].get('subject')}' "
+                            f"failed (attempt {message['attempts'] + 1}): {error}"
+                        )
+            self._transact(tm, connection, path, settle)
+            sent = [error for error, _recipient_results in results].count(None)
+            logger.info(f"Delivered {sent} of {len(claimed)} queued emails")
+            return len(claimed)
+        finally:
+            tm.abort()
+            connection.close()
+
+    def _send(self, claimed):
+        """Send a message, returning the error and any per-recipient results."""
+        _message_id, message = claimed
+        try:
+            if message.get('recipients') is not None:
+                if self.dispatcher is None:
+                    self.dispatcher = bulk_email.get_dispatcher()
+                return None, self.dispatcher.dispatch(message['email_data'], message['recipients'])
+            self.send(message['email_data'])
+        except Exception as e:
+            return bulk_email.describe(e), None
+        return None, None
+
+    def outbox(self, connection, path):
+        """Return the outbox of the site at ``path``, or None."""
+        site = connection.root()['Application'].unrestrictedTraverse(path.lstrip('/'))
+        return get_outbox(site)
+
+    def _transact(self, tm, connection, path, change, attempts=5):
+        """Apply ``change`` to the outbox of a site and commit, retrying conflicts."""
+        for attempt in range(attempts):
+            tm.begin()
+            try:
+                outbox = self.outbox(connection, path)
+                result = change(outbox) if outbox is not None else None
+                tm.commit()
+                return result
+            except ConflictError:
+                tm.abort()
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(random.uniform(0.05, 0.2) * (attempt + 1))
+
+
+_worker = None
+
+
+def start_worker(event):
+    """Start the delivery thread once the database is open.
+
+    Set ``EMAIL_OUTBOX_WORKER=off`` to deliver from a separate process with
+    ``email_outbox_worker.py`` instead.
+    """
+    global _worker
+    if os.environ.get('EMAIL_OUTBOX_WORKER', 'thread').lower() == 'off':
+        logger.info("Email outbox worker thread disabled")
+        return
+    if _worker is None:
+        _worker = OutboxWorker(event.database)
+        _worker.start()
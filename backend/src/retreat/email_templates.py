@@ -0,0 +1,236 @@
+"""Notification email templates, compiled once and rendered in two steps.
+
+Templates are HTML with ``${field}`` placeholders, in the syntax of
+``string.Template``. The registered ones are compiled into literal text
+and field names when this module is imported at startup, so rendering is
+a join.
+
+A notification is rendered in two steps. ``render_shared`` fills in the
+fields every recipient shares, e.g. the title and message of an alert,
+once per content object, and keeps the result until the object is
+modified. That leaves a template of the personal fields, ``fullname`` and
+``email``, which the bulk dispatcher fills in for each recipient. Field
+values are HTML-escaped.
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from html import escape
+from string import Template as _StringTemplate
+import threading
+
+# Content objects whose shared rendering is kept
+SHARED_CACHE_SIZE = 256
+
+
+class Template:
+    """A template compiled into literal text and field names.
+
+    ``parts`` alternate between literal text and field names, starting and
+    ending with text.
+    """
+
+    def __init__(self, source=None, parts=None):
+        self._parts = tuple(parts) if parts is not None else _compile(source)
+        self.fields = frozenset(self._parts[1::2])
+
+    def render(self, values):
+        """Fill in all fields, missing ones with nothing."""
+        parts = list(self._parts)
+        for i in range(1, len(parts), 2):
+            parts[i] = escape(str(values.get(parts[i], '')))
+        return ''.join(parts)
+
+    def fill(self, values):
+        """Return a template with the given fields filled in."""
+        parts = [self._parts[0]]
+        for i in range(1, len(self._parts), 2):
+            name, text = self._parts[i], self._parts[i + 1]
+            if name in values:
+                parts[-1] += escape(str(values[name])) + text
+            else:
+                parts += [name, text]
+        return Template(parts=parts)
+
+    @property
+    def source(self):
+        """The template in ``string.Template`` syntax, for storing it."""
+        parts = list(self._parts)
+        for i in range(len(parts)):
+            parts[i] = f'${{{parts[i]}}}' if i % 2 else parts[i].replace('$', '$$')
+        return ''.join(parts)
+
+
+def _compile(source):
+    parts = []
+    text = []
+    position = 0
+    for match in _StringTemplate.pattern.finditer(source):
+        text.append(source[position:match.start()])
+        position = match.end()
+        if match.group('escaped') is not None:
+            text.append('$')
+        elif match.group('invalid') is not None:
+            raise ValueError(f"Invalid placeholder in template at {match.start('invalid')}")
+        else:
+            parts += [''.join(text), match.group('named') or match.group('braced')]
+            text = []
+    text.append(source[position:])
+    parts.append(''.join(text))
+    return tuple(parts)
+
+
+@lru_cache(maxsize=256)
+def compile_template(source):
+    """Compile a template source, e.g. of a queued message, once per process."""
+    return Template(source)
+
+
+_templates = {}
+
+
+def register(name, source):
+    _templates[name] = Template(source)
+
+
+def get_template(name):
+    return _templates[name]
+
+
+_shared = OrderedDict()
+_lock = threading.Lock()
+
+
+def _key(obj):
+    uid = getattr(obj, 'UID', None)
+    return uid() if callable(uid) else '/'.join(obj.getPhysicalPath())
+
+
+def _revision(obj):
+    modified = getattr(obj, 'modified', None)
+    return str(modified()) if callable(modified) else None
+
+
+def render_shared(name, obj, values):
+    """Fill in the fields of a template shared by all recipients.
+
+    Args:
+        name: Name of the registered template
+        obj: Content object the message is about
+        values: Callable returning the shared field values, called only
+            when nothing is cached for the object as it is now
+
+    Returns:
+        Template of the personal fields
+    """
+    key = (name, _key(obj))
+    revision = _revision(obj)
+    with _lock:
+        cached = _shared.get(key)
+        if cached is not None and cached[0] == revision:
+            _shared.move_to_end(key)
+            return cached[1]
+    template = get_template(name).fill(values())
+    with _lock:
+        _shared[key] = (revision, template)
+        _shared.move_to_end(key)
+        while len(_shared) > SHARED_CACHE_SIZE:
+            _shared.popitem(last=False)
+    return template
+
+
+def clear_cache():
+    with _lock:
+        _shared.clear()
+
+
+register('camp_alert', """
+        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+            <div style="background-color: ${color}; color: white; padding: 20px; text-align: center;">
+                <h1 style="margin: 0; font-size: 24px;">
+                    ${emoji} ${heading}
+                </h1>
+            </div>
+
+            <div style="padding: 30px; background-color: #f8f9fa;">
+                <p style="color: #333;">Hi ${fullname},</p>
+
+                <h2 style="color: #333; margin-top: 0;">${title}</h2>
+
+                <div style="background-color: white; padding: 20px; border-radius: 5px; margin: 20px 0;">
+                    <p style="margin: 0; line-height: 1.6; white-space: pre-wrap;">${message}</p>
+                </div>
+
+                <div style="color: #666; font-size: 14px; margin-top: 20px;">
+                    <p>Sent by: ${sender}</p>
+                </div>
+            </div>
+
+            <div style="background-color: #e9ecef; padding: 20px; text-align: center; font-size: 12px; color: #666;">
+                <p>This is an automated message from the Camp Coordinator system.</p>
+                <p>You are receiving this at ${email} because you are registered at the camp.</p>
+            </div>
+        </div>
+        """)
+
+register('issue', """
+        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+            <h2 style="color: #333;">New Issue Reported</h2>
+
+            <p style="color: #333;">Hi ${fullname},</p>
+
+            <table style="width: 100%; border-collapse: collapse;">
+                <tr>
+                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
+                        <strong>Title:</strong>
+                    </td>
+                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
+                        ${title}
+                    </td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
+                        <strong>Location:</strong>
+                    </td>
+                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
+                        ${location}
+                    </td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
+                        <strong>Priority:</strong>
+                    </td>
+                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
+                        ${priority}
+                    </td>
+                </tr>
+                <tr>
+                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
+                        <strong>Submitted by:</strong>
+                    </td>
+                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
+                        ${creator}
+                    </td>
+                </tr>
+            </table>
+
+            <div style="margin-top: 20px;">
+                <strong>Description:</strong>
+                <p style="background-color: #f5f5f5; padding: 15px; border-radius: 5px;">
+                    ${description}
+                </p>
+            </div>
+
+            <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee;">
+                <a href="${url}"
+                   style="display: inline-block; padding: 10px 20px; background-color: #007bff;
+                          color: white; text-decoration: none; border-radius: 5px;">
+                    View Issue
+                </a>
+            </div>
+
+            <div style="margin-top: 30px; font-size: 12px; color: #666;">
+                <p>You are receiving this email at ${email} because you are a staff member or director.</p>
+            </div>
+        </div>
+        """)
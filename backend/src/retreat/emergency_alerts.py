@@ -0,0 +1,199 @@
+"""Emergency alerts, sent over all transports at once.
+
+Other alerts go through the email outbox, behind whatever it holds. An
+emergency alert skips it: once the transaction creating the alert
+commits, the recipients of every transport are split into batches, and
+the batches are sent on a pool of ``EMERGENCY_THREADS`` threads kept for
+emergencies, with their email requests ahead of other emails in the rate
+limit.
+
+Each transport has a ``DeliveryReport`` on the alert. It is written when
+the last batch of the transport is done, so the report's time to last
+delivery counts from the creation of the alert. Emails that failed for a
+transient reason then go into the outbox to be retried from there; the
+other transports have no retries.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from ZODB.POSException import ConflictError
+from . import bulk_email
+from . import email_outbox
+import logging
+import random
+import threading
+import time
+import transaction
+
+logger = logging.getLogger('retreat.emergency_alerts')
+
+# Threads sending emergency alerts, shared by all alerts of the process
+EMERGENCY_THREADS = 16
+
+_pool = None
+_lock = threading.Lock()
+
+
+def get_pool():
+    """The thread pool of the process for emergency alerts."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=EMERGENCY_THREADS,
+                                       thread_name_prefix='retreat-emergency')
+        return _pool
+
+
+class Fanout:
+    """Sends one alert over several transports at once.
+
+    Every transport gets ``threads`` lanes on the pool, which take its
+    batches in turn, so a long email run doesn't hold up SMS and push.
+
+    Args:
+        alert: Alert dict, see ``transports``
+        transports: Dict mapping transport names to transports
+        addresses: Dict mapping transport names to addresses
+        done: Called from a pool thread with ``(name, results, finished)``
+            once the last batch of a transport is done
+        created: Time the alert was created, by default when it is started
+    """
+
+    def __init__(self, alert, transports, addresses, done=None, created=None):
+        self.alert = alert
+        self.transports = transports
+        self.addresses = addresses
+        self.done = done
+        self.created = created
+        # transport name -> time its last batch was done
+        self.finished = {}
+        self.results = {name: {} for name in addresses}
+        self._lanes = {}
+        self._lock = threading.Lock()
+        self._complete = threading.Event()
+
+    def start(self, pool):
+        if self.created is None:
+            self.created = time.time()
+        lanes = []
+        for name, addresses in self.addresses.items():
+            transport = self.transports[name]
+            size = transport.batch_size
+            batches = deque(addresses[i:i + size] for i in range(0, len(addresses), size))
+            self._lanes[name] = max(min(transport.threads, len(batches)), 1)
+            lanes += [(name, batches)] * self._lanes[name]
+        if not lanes:
+            self._complete.set()
+        for name, batches in lanes:
+            pool.submit(self._lane, name, batches)
+        return self
+
+    def wait(self, timeout=None):
+        """Wait until every transport is done, returning whether they are."""
+        return self._complete.wait(timeout)
+
+    def time_to_last_delivery(self):
+        """Seconds from creation until the last transport was done, or None."""
+        if not self._complete.is_set() or not self.finished:
+            return None
+        return max(self.finished.values()) - self.created
+
+    def _lane(self, name, batches):
+        transport = self.transports[name]
+        results = {}
+        while True:
+            with self._lock:
+                if not batches:
+                    break
+                batch = batches.popleft()
+            try:
+                results.update(transport.send(self.alert, batch))
+            except Exception as e:
+                logger.error(f"Sending emergency alert by {name} failed: {bulk_email.describe(e)}")
+                state = bulk_email.FAILED if bulk_email.is_permanent(e) else bulk_email.RETRY
+                results.update({address: (state, bulk_email.describe(e)) for address in batch})
+
+        with self._lock:
+            self.results[name].update(results)
+            self._lanes[name] -= 1
+            if self._lanes[name]:
+                return
+            finished = self.finished[name] = time.time()
+            complete = len(self.finished) == len(self.addresses)
+        if self.done is not None:
+            try:
+                self.done(name, self.results[name], finished)
+            except Exception:
+                logger.exception(f"Recording emergency alert deliveries by {name} failed")
+        if complete:
+            self._complete.set()
+            logger.info(
+                f"Emergency alert '{self.alert['subject']}' sent by {', '.join(self.finished)}, "
+                f"last delivery after {self.time_to_last_delivery():.1f}s"
+            )
+
+
+def send_emergency_alert(obj, alert, transports, addresses, site):
+    """Send an alert over all transports once the current transaction commits.
+
+    Args:
+        obj: The alert content, which gets a delivery report per transport
+        alert: Alert dict, see ``transports``
+        transports: Dict mapping transport names to transports
+        addresses: Dict mapping transport names to addresses
+        site: The Plone site, whose outbox retries failed emails
+    """
+    now = time.time()
+    for name, transport_addresses in addresses.items():
+        bulk_email.create_report(obj, transport_addresses, name, now)
+    transaction.get().addAfterCommitHook(_committed, args=(
+        site._p_jar.db(),
+        '/'.join(obj.getPhysicalPath()),
+        '/'.join(site.getPhysicalPath()),
+        alert, transports, addresses, now,
+    ))
+
+
+def _committed(status, db, path, site_path, alert, transports, addresses, created):
+    # The alert doesn't exist when the commit failed
+    if not status:
+        return
+
+    def done(name, results, finished):
+        _record(db, path, site_path, alert, name, results, finished)
+
+    Fanout(alert, transports, addresses, done, created).start(get_pool())
+
+
+def _record(db, path, site_path, alert, name, results, finished, attempts=5):
+    """Store the results of a transport on the alert, queueing emails to retry."""
+    retry = [address for address, (state, _detail) in results.items() if state == bulk_email.RETRY]
+    tm = transaction.TransactionManager()
+    connection = db.open(transaction_manager=tm)
+    try:
+        for attempt in range(attempts):
+            tm.begin()
+            try:
+                app = connection.root()['Application']
+                report = bulk_email.get_report(app.unrestrictedTraverse(path.lstrip('/')), name)
+                report.record(results, finished)
+                if name == 'email' and retry:
+                    site = app.unrestrictedTraverse(site_path.lstrip('/'))
+                    email_data = {key: alert[key] for key in ('from', 'subject', 'html', 'personalize')
+                                  if key in alert}
+                    email_outbox.get_outbox(site, create=True).add(
+                        email_data, 'camp_alert', recipients=retry, report=report
+                    )
+                tm.commit()
+                break
+            except ConflictError:
+                tm.abort()
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(random.uniform(0.05, 0.2) * (attempt + 1))
+    finally:
+        tm.abort()
+        connection.close()
+    if name == 'email' and retry:
+        logger.warning(f"Queued {len(retry)} emergency alert emails to retry")
+        email_outbox.wake(site_path)
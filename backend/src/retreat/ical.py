@@ -0,0 +1,223 @@
+"""iCalendar feeds of conference room bookings.
+
+``@@ical`` on a conference room serves the bookings of that room, and on
+the site root the bookings of all rooms. Bookings the viewer may see show
+up with their title, owner and purpose; the others only as opaque busy
+times. Calendar clients poll these feeds often, so the rendered output is
+cached per process, keyed by the viewer and the booking serials of the
+rooms in the booking index. Responses carry an ETag and a Last-Modified
+header, and conditional requests are answered with a 304 as long as no
+booking of the room changed.
+"""
+
+from collections import OrderedDict
+from datetime import date
+from datetime import datetime
+from datetime import timezone
+from email.utils import formatdate
+from email.utils import parsedate_to_datetime
+from icalendar import Calendar
+from icalendar import Event
+from plone import api
+from Products.Five import BrowserView
+from . import booking_index
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger('retreat.ical')
+
+# Bookings that ended more than this many days ago are left out
+PAST_DAYS = 30
+
+# Bookings starting more than this many days ahead are left out
+FUTURE_DAYS = 365
+
+DAY = 24 * 60 * 60
+
+# Maximum number of rendered feeds kept in memory
+MAX_CACHED = 200
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cached(key, render):
+    """Return the rendered feed for a key, rendering it on a miss."""
+    with _lock:
+        body = _cache.get(key)
+        if body is not None:
+            _cache.move_to_end(key)
+            return body
+    body = render()
+    with _lock:
+        _cache[key] = body
+        while len(_cache) > MAX_CACHED:
+            _cache.popitem(last=False)
+    return body
+
+
+def _utc(dt):
+    """Booking times are stored as naive UTC."""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _etag_matches(request, etag):
+    header = request.getHeader('If-None-Match')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def _not_modified_since(request, last_modified):
+    header = request.getHeader('If-Modified-Since')
+    if not header or request.getHeader('If-None-Match'):
+        # If-None-Match takes precedence when both are sent
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return int(last_modified) <= since.timestamp()
+
+
+def _viewer():
+    """The current user, with the roles and groups deciding what they see."""
+    user = api.user.get_current()
+    return (
+        user.getId(),
+        tuple(sorted(user.getRoles())),
+        tuple(sorted(getattr(user, 'getGroups', list)())),
+    )
+
+
+def serve_feed(view, rooms, name):
+    """Answer a request for the calendar of some rooms.
+
+    Args:
+        view: The browser view serving the feed
+        rooms: The conference rooms of the feed
+        name: Name of the calendar shown by clients
+    """
+    index = booking_index.get_index()
+    versions = [index.version(room.UID()) if index is not None else (0, 0) for room in rooms]
+
+    # Room titles show up in the events, so room changes count as well
+    last_modified = max(
+        [changed for _serial, changed in versions]
+        + [room.modified().timeTime() for room in rooms]
+        + [0]
+    )
+    today = date.today()
+    key = (
+        '/'.join(view.context.getPhysicalPath()),
+        _viewer(),
+        today.isoformat(),
+        tuple(
+            (room.UID(), serial, room.modified().timeTime())
+            for room, (serial, _changed) in zip(rooms, versions)
+        ),
+    )
+    etag = '"{}"'.format(hashlib.sha1(repr(key).encode()).hexdigest()[:16])
+
+    response = view.request.response
+    response.setHeader('ETag', etag)
+    response.setHeader('Last-Modified', formatdate(last_modified, usegmt=True))
+    response.setHeader('Cache-Control', 'private, max-age=0, must-revalidate')
+
+    if _etag_matches(view.request, etag) or _not_modified_since(view.request, last_modified):
+        response.setStatus(304)
+        return b''
+
+    body = _cached(key, lambda: render_feed(index, rooms, name, today))
+    response.setHeader('Content-Type', 'text/calendar; charset=utf-8')
+    response.setHeader('Content-Disposition', f'inline; filename="{view.context.getId()}.ics"')
+    return body
+
+
+def render_feed(index, rooms, name, today):
+    """Render the bookings of rooms around ``today`` as an iCalendar file."""
+    calendar = Calendar()
+    calendar.add('prodid', '-//Retreat Platform//Room bookings//EN')
+    calendar.add('version', '2.0')
+    calendar.add('x-wr-calname', name)
+
+    midnight = booking_index.to_epoch(datetime.combine(today, datetime.min.time()))
+    window_start = midnight - PAST_DAYS * DAY
+    window_end = midnight + FUTURE_DAYS * DAY
+    catalog = api.portal.get_tool('portal_catalog')
+
+    for room in rooms:
+        intervals = index.room(room.UID()) if index is not None else None
+        if intervals is None:
+            continue
+        bookings = list(intervals.overlapping(window_start, window_end))
+        if not bookings:
+            continue
+        brains = catalog(
+            portal_type='room_booking',
+            UID=[uid for uid, _start, _end in bookings],
+            sort_on='start_datetime'
+        )
+        visible = set()
+        for brain in brains:
+            visible.add(brain.UID)
+            calendar.add_component(_event(room, brain))
+        _serial, changed = index.version(room.UID())
+        for uid, start, end in bookings:
+            if uid not in visible:
+                calendar.add_component(_busy(room, uid, start, end, changed))
+
+    count = len(calendar.subcomponents)
+    logger.info(f"Rendered calendar {name} with {count} bookings")
+    return calendar.to_ical()
+
+
+def _event(room, brain):
+    event = Event()
+    event.add('uid', f'{brain.UID}@retreat')
+    event.add('summary', brain.Title)
+    event.add('dtstart', _utc(brain.start_datetime))
+    event.add('dtend', _utc(brain.end_datetime))
+    event.add('dtstamp', _utc(brain.modified.asdatetime()))
+    event.add('location', room.title)
+    event.add('url', brain.getURL())
+    if isinstance(brain.purpose, str) and brain.purpose:
+        event.add('description', brain.purpose)
+    return event
+
+
+def _busy(room, uid, start, end, changed):
+    """An event only showing that the room is taken, for hidden bookings."""
+    event = Event()
+    event.add('uid', f"busy-{hashlib.sha1(uid.encode()).hexdigest()[:16]}@retreat")
+    event.add('summary', 'Busy')
+    event.add('dtstart', datetime.fromtimestamp(start, timezone.utc))
+    event.add('dtend', datetime.fromtimestamp(end, timezone.utc))
+    event.add('dtstamp', datetime.fromtimestamp(changed, timezone.utc))
+    event.add('location', room.title)
+    event.add('transp', 'OPAQUE')
+    event.add('class', 'PRIVATE')
+    return event
+
+
+class RoomCalendarFeed(BrowserView):
+    """Bookings of one conference room."""
+
+    def __call__(self):
+        return serve_feed(self, [self.context], self.context.title)
+
+
+class AllRoomsCalendarFeed(BrowserView):
+    """Bookings of all conference rooms."""
+
+    def __call__(self):
+        catalog = api.portal.get_tool('portal_catalog')
+        rooms = [
+            brain.getObject()
+            for brain in catalog(portal_type='conference_room', sort_on='sortable_title')
+        ]
+        return serve_feed(self, rooms, f"{api.portal.get().title} rooms")
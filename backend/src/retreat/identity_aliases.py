@@ -0,0 +1,240 @@
+"""Identity alias map for booking ownership.
+
+Users signing in through OAuth may show up under several identities: the
+Plone user id, the login name, the email address, or the bare numeric id
+of the OAuth provider that ends the user id. Content created under any of
+them belongs to the same person. The alias map, stored in a portal
+annotation, resolves each of these identities to the canonical user id.
+It is filled when users are created, log in or change their properties.
+
+Bookings are indexed with the canonical id of their creator as
+``booking_owner``, so listing the bookings of a user is one catalog query.
+"""
+
+from BTrees.OOBTree import OOBTree
+from BTrees.OOBTree import OOTreeSet
+from persistent import Persistent
+from plone import api
+from zope.annotation.interfaces import IAnnotations
+import logging
+import re
+
+logger = logging.getLogger('retreat.identity_aliases')
+
+ANNOTATION_KEY = 'retreat.identity_aliases'
+
+# Trailing numeric id of an OAuth user id, e.g. "google-104238716590"
+OAUTH_ID = re.compile(r'(\d{6,})$')
+
+
+def normalize(alias):
+    """Aliases are case-insensitive, like email addresses."""
+    return alias.strip().lower()
+
+
+class IdentityAliases(Persistent):
+    """Two-way map between canonical user ids and their aliases."""
+
+    def __init__(self):
+        # alias -> canonical user id
+        self._canonical = OOBTree()
+        # canonical user id -> aliases
+        self._aliases = OOBTree()
+
+    def __len__(self):
+        return len(self._aliases)
+
+    def canonical(self, alias):
+        """Return the canonical user id of an alias, or None."""
+        if not alias:
+            return None
+        return self._canonical.get(normalize(alias))
+
+    def aliases(self, user_id):
+        """Return the aliases of a user."""
+        return set(self._aliases.get(user_id, ()))
+
+    def claim(self, user_id):
+        """Map a user id to its user, taking it back from anyone holding it.
+
+        A real user id always belongs to its user, even when another user
+        has it as email or login name.
+
+        Returns:
+            Whether the id was newly mapped to the user
+        """
+        alias = normalize(user_id)
+        owner = self._canonical.get(alias)
+        if owner == user_id:
+            return False
+        if owner is not None:
+            logger.warning(f"Taking alias {alias} back from {owner} for the user of that id")
+            self._aliases[owner].remove(alias)
+        known = self._aliases.get(user_id)
+        if known is None:
+            known = self._aliases[user_id] = OOTreeSet()
+        self._canonical[alias] = user_id
+        known.add(alias)
+        return True
+
+    def register(self, user_id, aliases, user_exists=None):
+        """Map a user id and its aliases to the user.
+
+        An alias already claimed by another user is left alone, so a user
+        can't take over the bookings of someone else by changing their email.
+        Neither can an alias that is the id of another user, as told by
+        ``user_exists``.
+
+        Returns:
+            Set of the aliases that were newly mapped to the user
+        """
+        added = set()
+        if self.claim(user_id):
+            added.add(normalize(user_id))
+        known = self._aliases[user_id]
+        for alias in aliases:
+            if not alias:
+                continue
+            alias = normalize(alias)
+            if alias == normalize(user_id):
+                continue
+            owner = self._canonical.get(alias)
+            if owner == user_id:
+                continue
+            if owner is not None:
+                logger.warning(f"Alias {alias} of {user_id} already belongs to {owner}")
+                continue
+            if user_exists is not None and user_exists(alias):
+                logger.warning(f"Alias {alias} of {user_id} is the id of another user")
+                continue
+            self._canonical[alias] = user_id
+            known.add(alias)
+            added.add(alias)
+        return added
+
+    def unregister(self, user_id):
+        """Drop a user and all its aliases."""
+        for alias in self._aliases.pop(user_id, ()):
+            if self._canonical.get(alias) == user_id:
+                del self._canonical[alias]
+
+    def clear(self):
+        self._canonical.clear()
+        self._aliases.clear()
+
+
+def get_aliases(create=False):
+    """Get the alias map of the site, or None if there is none yet."""
+    annotations = IAnnotations(api.portal.get())
+    alias_map = annotations.get(ANNOTATION_KEY)
+    if alias_map is None and create:
+        alias_map = IdentityAliases()
+        annotations[ANNOTATION_KEY] = alias_map
+    return alias_map
+
+
+def user_aliases(user):
+    """Collect the identities a user may appear under as content creator."""
+    user_id = user.getId()
+    aliases = {user_id, user.getUserName(), user.getProperty('email', '') or ''}
+    match = OAUTH_ID.search(user_id)
+    if match and match.group(1) != user_id:
+        aliases.add(match.group(1))
+    return {alias for alias in aliases if alias}
+
+
+def owner_key(creator_id):
+    """Return the canonical user id owning content created as ``creator_id``.
+
+    Unknown creators are their own owner.
+    """
+    alias_map = get_aliases()
+    canonical = alias_map.canonical(creator_id) if alias_map is not None else None
+    return canonical or creator_id
+
+
+def register_user(user):
+    """Add the aliases of a user and reindex the bookings they now own.
+
+    Nothing is written when the user's aliases are already known, so this
+    is cheap to call on every login.
+
+    Returns:
+        Set of the aliases that were newly mapped to the user
+    """
+    user_id = user.getId()
+    aliases = user_aliases(user)
+    alias_map = get_aliases()
+    if alias_map is not None and all(alias_map.canonical(a) == user_id for a in aliases):
+        return set()
+
+    added = get_aliases(create=True).register(
+        user_id, aliases, lambda alias: api.user.get(userid=alias) is not None
+    )
+    # Bookings created under a new alias, or under the user id while another
+    # user held it, now belong to this user
+    creators = [alias for alias in aliases if normalize(alias) in added]
+    if creators:
+        reindex_owned_bookings(creators)
+    return added
+
+
+def reindex_owned_bookings(creator_ids):
+    """Reindex the owner key of bookings created under any of the given ids.
+
+    Returns the number of reindexed bookings.
+    """
+    catalog = api.portal.get_tool('portal_catalog')
+    brains = catalog.unrestrictedSearchResults(
+        portal_type='room_booking',
+        Creator=list(creator_ids)
+    )
+    for brain in brains:
+        catalog.catalog_object(
+            brain._unrestrictedGetObject(),
+            uid=brain.getPath(),
+            idxs=['booking_owner']
+        )
+    return len(brains)
+
+
+def rebuild_aliases():
+    """Rebuild the alias map from all users.
+
+    Returns the number of registered users.
+    """
+    alias_map = get_aliases(create=True)
+    alias_map.clear()
+    users = api.user.get_users()
+    # User ids first, so no other user can claim one as alias
+    for user in users:
+        alias_map.claim(user.getId())
+    user_ids = {normalize(user.getId()) for user in users}
+    for user in users:
+        alias_map.register(user.getId(), user_aliases(user), lambda alias: alias in user_ids)
+    count = len(users)
+    logger.info(f"Rebuilt identity alias map with {count} users")
+    return count
+
+
+def user_changed(event):
+    """Event subscriber registering aliases of created, updated or logged in users."""
+    principal = event.principal
+    # Groups and bare ids have no aliases
+    if isinstance(principal, str) or not hasattr(principal, 'getUserName'):
+        return
+    try:
+        register_user(principal)
+    except Exception as e:
+        # Never break logins or user management over the alias map
+        logger.error(f"Could not register aliases of {principal.getId()}: {str(e)}")
+
+
+def user_deleted(event):
+    """Event subscriber dropping deleted users from the alias map."""
+    principal = event.principal
+    # Deletion events carry the bare user id
+    user_id = principal if isinstance(principal, str) else principal.getId()
+    alias_map = get_aliases()
+    if alias_map is not None:
+        alias_map.unregister(user_id)
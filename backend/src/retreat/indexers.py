@@ -0,0 +1,81 @@
+"""Catalog indexers for retreat content"""
+
+from plone.dexterity.interfaces import IDexterityContent
+from plone.indexer import indexer
+from .identity_aliases import owner_key
+from .interfaces import IRoomBooking
+
+# Sort ranks, most urgent first
+PRIORITY_RANKS = {'critical': 0, 'high': 1, 'normal': 2, 'low': 3}
+STATUS_RANKS = {'new': 0, 'in_progress': 1, 'resolved': 2}
+
+
+def _issue_value(obj, name):
+    """Get an issue field as a plain string for the catalog.
+
+    Choice fields may hold vocabulary term objects, which are normalized to
+    their token. Other content keeps the default attribute lookup, so types
+    with a field of the same name (e.g. an event's location) are unaffected.
+    """
+    if getattr(obj, 'portal_type', None) != 'issue':
+        return getattr(obj, name)
+
+    value = getattr(obj, name, None)
+    if hasattr(value, 'token'):
+        value = value.token
+    if value is None or value == '':
+        # Don't put empty values in the catalog
+        raise AttributeError(name)
+    return str(value)
+
+
+@indexer(IDexterityContent)
+def status(obj):
+    return _issue_value(obj, 'status')
+
+
+@indexer(IDexterityContent)
+def priority(obj):
+    return _issue_value(obj, 'priority')
+
+
+@indexer(IDexterityContent)
+def location(obj):
+    return _issue_value(obj, 'location')
+
+
+@indexer(IDexterityContent)
+def assigned_to(obj):
+    return _issue_value(obj, 'assigned_to')
+
+
+@indexer(IDexterityContent)
+def issue_priority_rank(obj):
+    if getattr(obj, 'portal_type', None) != 'issue':
+        raise AttributeError('issue_priority_rank')
+    return PRIORITY_RANKS.get(_issue_value(obj, 'priority'), len(PRIORITY_RANKS))
+
+
+@indexer(IDexterityContent)
+def issue_status_rank(obj):
+    if getattr(obj, 'portal_type', None) != 'issue':
+        raise AttributeError('issue_status_rank')
+    return STATUS_RANKS.get(_issue_value(obj, 'status'), len(STATUS_RANKS))
+
+
+@indexer(IRoomBooking)
+def room_uid(obj):
+    """UID of the booked room, so bookings can be queried by room."""
+    room = obj.room.to_object if obj.room else None
+    if room is None:
+        raise AttributeError('room_uid')
+    return room.UID()
+
+
+@indexer(IRoomBooking)
+def booking_owner(obj):
+    """Canonical id of the user owning a booking, resolving creator aliases."""
+    creator_id = obj.creators[0] if obj.creators else obj.Creator()
+    if not creator_id:
+        raise AttributeError('booking_owner')
+    return owner_key(creator_id)
@@ -1,6 +1,7 @@
 """Interfaces for retreat package"""
 
 from zope import schema
+from zope.interface import Attribute
 from zope.interface import Interface
 from z3c.relationfield.schema import RelationChoice
 from plone.app.vocabularies.catalog import CatalogSource
@@ -31,6 +32,29 @@ class ICampAlert(Interface):
     )
 
 
+class IAlertTransport(Interface):
+    """A way of reaching participants with an alert, e.g. email or SMS.
+
+    Transports are named utilities, registered under their ``name``.
+    """
+
+    name = Attribute("Name of the transport, e.g. 'sms'")
+
+    batch_size = Attribute("Most addresses handed to one send call")
+
+    threads = Attribute("Send calls that may run at once")
+
+    def address(user):
+        """Return the address of a user on this transport, or None."""
+
+    def send(alert, addresses):
+        """Send an alert to each address.
+
+        Returns a dict mapping each address to ``(state, detail)``, with
+        the states of ``bulk_email``.
+        """
+
+
 class IConferenceRoom(Interface):
     """Conference Room schema"""
     
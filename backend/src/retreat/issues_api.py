@@ -0,0 +1,168 @@
+"""Compact issue listing endpoint for the issues dashboard"""
+
+from collections import OrderedDict
+from plone import api
+from plone.restapi.serializer.converters import json_compatible
+from plone.restapi.services import Service
+import threading
+
+# Summary fields stored as catalog metadata
+SUMMARY_FIELDS = ('status', 'priority', 'location', 'assigned_to')
+
+# Filters accepted as query parameters (repeatable), all catalog indexes
+FILTER_FIELDS = ('status', 'priority', 'location', 'assigned_to')
+
+# Sort options and the catalog index they use
+SORT_INDEXES = {
+    'created': 'created',
+    'modified': 'modified',
+    'title': 'sortable_title',
+    'priority': 'issue_priority_rank',
+    'status': 'issue_status_rank',
+}
+
+# Sorts by rank put the most urgent issues first by default
+RANKED_SORTS = ('priority', 'status')
+
+# Facets counted with the catalog index of the same name
+FACET_INDEXES = ('status', 'priority', 'location')
+
+# Facet counts kept per catalog state and user
+FACET_CACHE_SIZE = 500
+
+DEFAULT_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 500
+
+_facet_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _as_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class IssuesSummary(Service):
+    """List issues with summary fields from catalog metadata.
+
+    Query parameters:
+        status, priority, location, assigned_to, creator: filters, repeatable
+        sort_on: created (default), modified, title, priority or status
+        sort_order: descending (default for dates) or ascending
+        b_start, b_size: batching
+
+    Filtering and sorting are done by catalog indexes and only the requested
+    page of brains is materialized. Issue objects are never loaded; the
+    response also carries facet counts over all issues the user can see,
+    counted by the indexes, so the dashboard statistics don't need a second
+    query.
+    """
+
+    def reply(self):
+        form = self.request.form
+        try:
+            b_start = int(form.get('b_start', 0))
+            b_size = min(int(form.get('b_size', DEFAULT_BATCH_SIZE)), MAX_BATCH_SIZE)
+        except ValueError:
+            b_start = b_size = None
+        if b_start is None or b_start < 0 or b_size < 1:
+            self.request.response.setStatus(400)
+            return {'error': 'b_start must be a non-negative integer and b_size a positive one'}
+
+        sort_on = form.get('sort_on', 'created')
+        if sort_on not in SORT_INDEXES:
+            self.request.response.setStatus(400)
+            return {'error': f'Unsupported sort_on: {sort_on}'}
+        descending = form.get('sort_order', 'descending') != 'ascending'
+
+        query = {'portal_type': 'issue'}
+        creators = _as_list(form.get('creator'))
+        if creators:
+            query['Creator'] = creators
+        for field in FILTER_FIELDS:
+            values = _as_list(form.get(field))
+            if values:
+                query[field] = values
+
+        if sort_on in RANKED_SORTS:
+            # Rank 0 is the most urgent, so "descending" means ascending ranks;
+            # newest first within the same rank
+            query['sort_on'] = (SORT_INDEXES[sort_on], 'created')
+            query['sort_order'] = ('ascending' if descending else 'descending', 'descending')
+        else:
+            query['sort_on'] = SORT_INDEXES[sort_on]
+            query['sort_order'] = 'descending' if descending else 'ascending'
+
+        # Let the catalog only sort as much as the requested page needs
+        query['b_start'] = b_start
+        query['b_size'] = b_size
+
+        catalog = api.portal.get_tool('portal_catalog')
+        brains = catalog(query)
+        page = brains[b_start:b_start + b_size]
+
+        return {
+            '@id': f'{self.context.absolute_url()}/@issues-summary',
+            'items': [self._summary(brain) for brain in page],
+            'items_total': brains.actual_result_count,
+            'facets': self._facets(catalog),
+            'b_start': b_start,
+            'b_size': b_size,
+        }
+
+    def _summary(self, brain):
+        item = {
+            '@id': brain.getURL(),
+            'UID': brain.UID,
+            'id': brain.getId,
+            'title': brain.Title,
+            'description': brain.Description,
+            'Creator': brain.Creator,
+            'created': json_compatible(brain.created),
+            'modified': json_compatible(brain.modified),
+        }
+        for field in SUMMARY_FIELDS:
+            value = getattr(brain, field, None)
+            # Missing.Value for issues indexed before the column existed
+            item[field] = value if isinstance(value, str) else None
+        return item
+
+    def _facets(self, catalog):
+        """Count the issues the user can see per status, priority and location.
+
+        Each value is counted with a security-filtered search on its index,
+        so no brain or issue is loaded and the counts never include issues
+        the user isn't allowed to see. The counts are kept until the catalog
+        changes, per user, their roles and their groups.
+        """
+        user = api.user.get_current()
+        key = (
+            catalog.getCounter(),
+            user.getId(),
+            tuple(sorted(user.getRoles())),
+            tuple(sorted(getattr(user, 'getGroups', list)())),
+        )
+        with _lock:
+            facets = _facet_cache.get(key)
+            if facets is not None:
+                _facet_cache.move_to_end(key)
+                return facets
+
+        facets = {}
+        for name in FACET_INDEXES:
+            counts = {}
+            for value in catalog.uniqueValuesFor(name):
+                count = len(catalog(portal_type='issue', **{name: value}))
+                if count:
+                    counts[value] = count
+            facets[name] = counts
+        facets['total'] = len(catalog(portal_type='issue'))
+
+        with _lock:
+            _facet_cache[key] = facets
+            while len(_facet_cache) > FACET_CACHE_SIZE:
+                _facet_cache.popitem(last=False)
+        return facets
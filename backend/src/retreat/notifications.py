@@ -3,6 +3,11 @@ import os
 import logging
 from plone import api
 from . import activities
+from . import bulk_email
+from . import display_names
+from . import email_outbox
+from . import email_templates
+from .recipients import get_recipients
 
 logger = logging.getLogger('retreat.notifications')
 
@@ -60,40 +65,18 @@ def notify_new_issue(obj, event):
     # Check for test mode
     test_mode = os.environ.get('RESEND_TEST_MODE', 'false').lower() == 'true'
     
+    if not test_mode and not os.environ.get('RESEND_API_KEY'):
+        logger.error("RESEND_API_KEY not found in environment variables")
+        return
+    
     try:
-        # Import resend here to avoid import errors if not installed
-        import resend
-        
-        # Initialize Resend API
-        resend.api_key = os.environ.get('RESEND_API_KEY')
-        
-        if not resend.api_key:
-            logger.error("RESEND_API_KEY not found in environment variables")
-            return
-        
         # Get users to notify (Staff and Directors)
-        recipients = []
-        
-        for user in api.user.get_users():
-            user_roles = api.user.get_roles(user=user)
-            
-            # Check if user is Staff (Editor) or Director (Manager)
-            if 'Manager' in user_roles or 'Editor' in user_roles:
-                email = user.getProperty('email')
-                if email:
-                    recipients.append({
-                        'email': email,
-                        'fullname': user.getProperty('fullname', user.getId())
-                    })
+        recipients = get_recipients(['Manager', 'Editor'])
         
         if not recipients:
             logger.info("No recipients found for issue notification")
             return
         
-        # Get issue details
-        creator = api.user.get(userid=obj.Creator())
-        creator_name = creator.getProperty('fullname', obj.Creator()) if creator else obj.Creator()
-        
         # Build issue URL
         portal_url = api.portal.get().absolute_url()
         issue_path = '/'.join(obj.getPhysicalPath()[2:])  # Skip /Plone prefix
@@ -106,95 +89,38 @@ def notify_new_issue(obj, event):
             'high': 'High',
             'urgent': 'Urgent'
         }
-        priority_display = priority_map.get(obj.priority, obj.priority)
         
-        # Create email content
-        email_html = f"""
-        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <h2 style="color: #333;">New Issue Reported</h2>
-            
-            <table style="width: 100%; border-collapse: collapse;">
-                <tr>
-                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
-                        <strong>Title:</strong>
-                    </td>
-                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
-                        {obj.title}
-                    </td>
-                </tr>
-                <tr>
-                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
-                        <strong>Location:</strong>
-                    </td>
-                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
-                        {obj.location}
-                    </td>
-                </tr>
-                <tr>
-                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
-                        <strong>Priority:</strong>
-                    </td>
-                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
-                        {priority_display}
-                    </td>
-                </tr>
-                <tr>
-                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
-                        <strong>Submitted by:</strong>
-                    </td>
-                    <td style="padding: 8px 0; border-bottom: 1px solid #eee;">
-                        {creator_name}
-                    </td>
-                </tr>
-            </table>
-            
-            <div style="margin-top: 20px;">
-                <strong>Description:</strong>
-                <p style="background-color: #f5f5f5; padding: 15px; border-radius: 5px;">
-                    {obj.issue_description or 'No description provided'}
-                </p>
-            </div>
-            
-            <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee;">
-                <a href="{issue_url}" 
-                   style="display: inline-block; padding: 10px 20px; background-color: #007bff; 
-                          color: white; text-decoration: none; border-radius: 5px;">
-                    View Issue
-                </a>
-            </div>
-            
-            <div style="margin-top: 30px; font-size: 12px; color: #666;">
-                <p>You are receiving this email because you are a staff member or director.</p>
-            </div>
-        </div>
-        """
+        def shared_fields():
+            return {
+                'title': obj.title,
+                'location': obj.location,
+                'priority': priority_map.get(obj.priority, obj.priority),
+                'creator': display_names.get_display_name(obj.Creator()),
+                'description': obj.issue_description or 'No description provided',
+                'url': issue_url,
+            }
+        
+        # The issue part of the email, rendered once for all recipients
+        template = email_templates.render_shared('issue', obj, shared_fields)
+        
+        # Everybody gets a copy addressed to them
+        personalize = {}
+        for recipient in recipients:
+            personalize.setdefault(recipient['email'], {'fullname': recipient['fullname']})
+        addresses = list(personalize)
         
         # Prepare email data
         email_data = {
             "from": "Camp Coordinator <noreply@coolapps.jackwimbish.com>",
-            "to": [r['email'] for r in recipients],
             "subject": f"New Issue: {obj.title}",
-            "html": email_html
+            "html": template.source,
+            "personalize": personalize,
         }
         
-        if test_mode:
-            # Test mode - just log the email details
-            logger.info("=== TEST MODE - Email would be sent ===")
-            logger.info(f"From: {email_data['from']}")
-            logger.info(f"To: {email_data['to']}")
-            logger.info(f"Subject: {email_data['subject']}")
-            logger.info(f"Recipients: {[r['fullname'] + ' <' + r['email'] + '>' for r in recipients]}")
-            logger.info("=== Email HTML Preview ===")
-            logger.info(email_html)
-            logger.info("=== End of test email ===")
-        else:
-            # Production mode - send the email
-            result = resend.Emails.send(email_data)
-            logger.info(f"Email sent successfully. Resend ID: {result.get('id', 'unknown')}")
-            logger.info(f"Sent to {len(recipients)} recipients")
+        # Sent by the outbox worker once this transaction commits
+        report = bulk_email.create_report(obj, addresses)
+        email_outbox.queue_email(email_data, 'issue', recipients=addresses, report=report)
     
-    except ImportError:
-        logger.error("resend package not installed. Run: pip install resend")
     except Exception as e:
         # Log error but don't block issue creation
-        logger.error(f"Failed to send issue notification email: {str(e)}", exc_info=True)
\ No newline at end of file
+        logger.error(f"Failed to queue issue notification email: {str(e)}", exc_info=True)
@@ -0,0 +1,108 @@
+"""API endpoints for outgoing notifications"""
+
+from datetime import datetime
+from plone import api
+from plone.restapi.services import Service
+from . import bulk_email
+from . import email_outbox
+
+
+def _timestamp(seconds):
+    return datetime.utcfromtimestamp(seconds).isoformat() if seconds else None
+
+
+def mask(address):
+    """Hide most of an address, keeping enough to tell recipients apart."""
+    name, at, domain = address.partition('@')
+    if at:
+        return f'{name[:1]}***@{domain}'
+    return f'***{address[-4:]}' if len(address) > 6 else '***'
+
+
+class EmailOutboxStatus(Service):
+    """Counters of the email outbox and the messages that gave up"""
+
+    def reply(self):
+        outbox = email_outbox.get_outbox()
+        if outbox is None:
+            return {'pending': 0, 'failed': 0, 'sent': 0, 'items': []}
+        result = outbox.stats()
+        result['items'] = [
+            {
+                'id': message_id,
+                'kind': message['kind'],
+                'subject': message['email_data'].get('subject'),
+                'recipients': len(message.get('recipients') or message['email_data'].get('to', [])),
+                'queued': _timestamp(message['queued']),
+                'attempts': message['attempts'],
+                'last_error': message['last_error'],
+            }
+            for message_id, message in outbox.failed_messages()
+        ]
+        return result
+
+
+class EmailOutboxRetry(Service):
+    """Queue all failed messages again"""
+
+    def reply(self):
+        outbox = email_outbox.get_outbox()
+        count = outbox.retry_failed() if outbox is not None else 0
+        return {'requeued': count}
+
+
+class DeliveryStatus(Service):
+    """Per-recipient delivery status of the alert sent for this content.
+
+    Emergency alerts have a report per transport, every transport is
+    summed up under ``transports`` with its time to last delivery.
+    Recipients may include Managers notified of an issue, so only users
+    who can manage the portal see their addresses in full.
+
+    Query parameters:
+        transport: List the recipients of this transport, default email
+        state: Only list recipients in this state (pending, sent, failed
+            or retry)
+    """
+
+    def reply(self):
+        reports = bulk_email.get_reports(self.context)
+        transport = self.request.form.get('transport') or 'email'
+        report = reports.get(transport)
+        if report is None:
+            self.request.response.setStatus(404)
+            return {'error': f'Nothing was sent by {transport} for this item'}
+        state = self.request.form.get('state') or None
+        full = api.user.has_permission('Manage portal', obj=self.context)
+        items = []
+        for address, item_state, detail, when in report.items(state):
+            if not full:
+                # Provider errors may quote the address
+                if isinstance(detail, str):
+                    detail = detail.replace(address, mask(address))
+                address = mask(address)
+            items.append(
+                {'address': address, 'state': item_state, 'detail': detail, 'time': _timestamp(when)}
+            )
+        transports = {
+            name: {
+                'queued': _timestamp(transport_report.queued),
+                'last_sent': _timestamp(transport_report.last_sent),
+                'counts': transport_report.counts(),
+                'time_to_last_delivery': transport_report.time_to_last_delivery(),
+            }
+            for name, transport_report in reports.items()
+        }
+        times = [summary['time_to_last_delivery'] for summary in transports.values()]
+        return {
+            '@id': f'{self.context.absolute_url()}/@delivery-status',
+            'transport': transport,
+            'queued': _timestamp(report.queued),
+            'last_sent': _timestamp(report.last_sent),
+            'counts': report.counts(),
+            # Until every transport is done
+            'time_to_last_delivery': None if None in times else max(times),
+            'transports': transports,
+            'items': items,
+            'items_total': len(items),
+        }
@@ -0,0 +1,208 @@
+"""Role-indexed recipients of notification emails.
+
+Notifications go to the holders of a few roles, e.g. Managers and Editors
+for new issues. Finding them used to mean loading every user and asking
+PAS for their roles. The recipient index, a portal annotation, keeps the
+email address and fullname of every user and, per role, the ids of the
+users holding it, directly or through a group.
+
+PAS events keep it current: property changes, logins and new users
+update a user's entry, and deleted users, new users and group membership
+changes drop the role entries. PAS has no event for granting or revoking
+a role, so the members of a role are also looked up again after
+``ROLE_TTL`` seconds, from the role assignments rather than from all
+users.
+"""
+
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+from plone import api
+from zope.annotation.interfaces import IAnnotations
+import logging
+import time
+
+logger = logging.getLogger('retreat.recipients')
+
+ANNOTATION_KEY = 'retreat.recipients'
+
+# Seconds before the members of a role are looked up again
+ROLE_TTL = 300
+
+
+class RecipientIndex(Persistent):
+    """Contact details of users and the users holding each role."""
+
+    def __init__(self):
+        # user id -> (email, fullname)
+        self._people = OOBTree()
+        # role -> (time of lookup, tuple of user ids)
+        self._roles = OOBTree()
+
+    def __len__(self):
+        return len(self._people)
+
+    def person(self, user_id):
+        """Return ``(email, fullname)`` of a user, or None if unknown."""
+        return self._people.get(user_id)
+
+    def set_person(self, user_id, email, fullname):
+        """Store the contact details of a user, writing only on changes."""
+        if self._people.get(user_id) != (email, fullname):
+            self._people[user_id] = (email, fullname)
+
+    def remove_person(self, user_id):
+        self._people.pop(user_id, None)
+
+    def role_members(self, role, now=None):
+        """Return the user ids holding a role, or None if they need a lookup."""
+        entry = self._roles.get(role)
+        now = time.time() if now is None else now
+        if entry is None or entry[0] + ROLE_TTL < now:
+            return None
+        return entry[1]
+
+    def set_role_members(self, role, user_ids, now=None):
+        now = time.time() if now is None else now
+        self._roles[role] = (now, tuple(sorted(user_ids)))
+
+    def invalidate_roles(self):
+        """Look up the members of all roles again on next use."""
+        if len(self._roles):
+            self._roles.clear()
+
+    def clear(self):
+        self._people.clear()
+        self._roles.clear()
+
+
+def get_recipient_index(create=False):
+    """Get the recipient index of the site, or None if there is none yet."""
+    annotations = IAnnotations(api.portal.get())
+    index = annotations.get(ANNOTATION_KEY)
+    if index is None and create:
+        index = RecipientIndex()
+        annotations[ANNOTATION_KEY] = index
+    return index
+
+
+def _contact(user):
+    # Read from the user, the display name cache may not have seen the change yet
+    return (
+        user.getProperty('email', '') or '',
+        user.getProperty('fullname', '') or user.getId(),
+    )
+
+
+def _group_members(group_id, seen):
+    """Return the user ids in a group, following nested groups.
+
+    Returns None if there is no such group, i.e. the id is a user's.
+    """
+    group = api.group.get(groupname=group_id)
+    if group is None:
+        return None
+    members = set()
+    if group_id in seen:
+        return members
+    seen.add(group_id)
+    for member_id in group.getGroupMemberIds():
+        nested = _group_members(member_id, seen)
+        members.update({member_id} if nested is None else nested)
+    return members
+
+
+def lookup_role_members(role):
+    """Find the users holding a global role, directly or through groups."""
+    role_manager = api.portal.get_tool('acl_users').portal_role_manager
+    user_ids = set()
+    seen = set()
+    for principal_id, _title in role_manager.listAssignedPrincipals(role):
+        members = _group_members(principal_id, seen)
+        user_ids.update({principal_id} if members is None else members)
+    return user_ids
+
+
+def get_recipients(roles):
+    """List the users holding any of the roles who have an email address.
+
+    Returns:
+        List of ``{'email': ..., 'fullname': ...}`` dicts ordered by user id
+    """
+    index = get_recipient_index(create=True)
+    user_ids = set()
+    for role in roles:
+        members = index.role_members(role)
+        if members is None:
+            members = lookup_role_members(role)
+            index.set_role_members(role, members)
+        user_ids.update(members)
+
+    recipients = []
+    for user_id in sorted(user_ids):
+        contact = index.person(user_id)
+        if contact is None:
+            user = api.user.get(userid=user_id)
+            if user is None:
+                continue
+            contact = _contact(user)
+            index.set_person(user_id, *contact)
+        email, fullname = contact
+        if email:
+            recipients.append({'email': email, 'fullname': fullname})
+    return recipients
+
+
+def rebuild_recipients():
+    """Rebuild the contact details of all users.
+
+    Role members are looked up again on next use. Returns the number of
+    users.
+    """
+    index = get_recipient_index(create=True)
+    index.clear()
+    count = 0
+    for user in api.user.get_users():
+        index.set_person(user.getId(), *_contact(user))
+        count += 1
+    logger.info(f"Rebuilt recipient index with {count} users")
+    return count
+
+
+def user_changed(event):
+    """Event subscriber updating the contact details of a user."""
+    principal = event.principal
+    # Groups and bare ids have no contact details
+    if isinstance(principal, str) or not hasattr(principal, 'getUserName'):
+        return
+    try:
+        index = get_recipient_index(create=True)
+        index.set_person(principal.getId(), *_contact(principal))
+    except Exception as e:
+        # Never break logins or user management over the recipient index
+        logger.error(f"Could not update recipient {principal.getId()}: {str(e)}")
+
+
+def user_created(event):
+    """Event subscriber adding new users, who may come with roles."""
+    user_changed(event)
+    index = get_recipient_index()
+    if index is not None:
+        index.invalidate_roles()
+
+
+def user_deleted(event):
+    """Event subscriber dropping deleted users."""
+    principal = event.principal
+    # Deletion events carry the bare user id
+    user_id = principal if isinstance(principal, str) else principal.getId()
+    index = get_recipient_index()
+    if index is not None:
+        index.remove_person(user_id)
+        index.invalidate_roles()
+
+
+def groups_changed(event):
+    """Event subscriber for group membership changes and deleted groups."""
+    index = get_recipient_index()
+    if index is not None:
+        index.invalidate_roles()
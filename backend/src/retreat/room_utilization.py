@@ -0,0 +1,309 @@
+"""Precomputed room utilization aggregates.
+
+For every conference room the aggregates hold two ``IIBTree`` counters
+keyed by hour since the epoch (UTC): the booked seconds within that hour,
+and the number of bookings starting in it. Utilization per day or per
+hour-of-week over any date range is a range scan of these counters, so
+reports never touch the bookings themselves.
+
+The counters are kept up to date by event subscribers on ``room_booking``
+objects. Bookings that are deleted after they ended, which is what the
+booking archive does, stay counted: the room was used. Cancelling a
+booking that has not ended yet takes it out again.
+
+``recompute`` rebuilds all counters from the booking index and the booking
+archive in one vectorized pass with numpy when it is installed, for
+backfills and after changing the counting rules.
+"""
+
+from BTrees.IIBTree import IIBTree
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+from plone import api
+from zope.annotation.interfaces import IAnnotations
+from . import booking_archive
+from . import booking_index
+import logging
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger('retreat.room_utilization')
+
+ANNOTATION_KEY = 'retreat.room_utilization'
+
+HOUR = 60 * 60
+
+# 1970-01-01 was a Thursday; hours_of_week count from Monday 00:00
+EPOCH_HOUR_OF_WEEK = 3 * 24
+
+
+def hour_of_week(hour):
+    """Hour of the week of an hour since the epoch, 0 is Monday 00:00."""
+    return (hour + EPOCH_HOUR_OF_WEEK) % (7 * 24)
+
+
+def hour_pieces(start, end):
+    """Yield ``(hour, seconds)`` of the part of ``[start, end)`` in each hour."""
+    hour = start // HOUR
+    while hour * HOUR < end:
+        seconds = min(end, (hour + 1) * HOUR) - max(start, hour * HOUR)
+        if seconds > 0:
+            yield hour, seconds
+        hour += 1
+
+
+def _change(counters, key, delta):
+    value = counters.get(key, 0) + delta
+    if value:
+        counters[key] = value
+    else:
+        counters.pop(key, None)
+
+
+class RoomCounters(Persistent):
+    """Hourly booking counters of one room."""
+
+    def __init__(self):
+        # hour since the epoch -> booked seconds
+        self.booked = IIBTree()
+        # hour since the epoch -> number of bookings starting in it
+        self.starts = IIBTree()
+
+    def add(self, start, end, sign=1):
+        """Count a booking, or take it out again with ``sign=-1``."""
+        for hour, seconds in hour_pieces(start, end):
+            _change(self.booked, hour, sign * seconds)
+        _change(self.starts, start // HOUR, sign)
+
+    def hours(self, first, last):
+        """Yield ``(hour, booked seconds, starts)`` of hours in ``[first, last)``.
+
+        Hours without bookings are left out.
+        """
+        starts = self.starts
+        for hour, seconds in self.booked.items(first, last, excludemax=True):
+            yield hour, seconds, starts.get(hour, 0)
+
+
+class RoomUtilization(Persistent):
+    """Booking counters of all rooms."""
+
+    def __init__(self):
+        # room UID -> RoomCounters
+        self._rooms = OOBTree()
+        # booking UID -> (room UID, start, end) as counted
+        self._bookings = OOBTree()
+
+    def room(self, room_uid):
+        """Return the counters of a room, or None if it was never booked."""
+        return self._rooms.get(room_uid)
+
+    def room_uids(self):
+        return list(self._rooms.keys())
+
+    def _counters(self, room_uid):
+        counters = self._rooms.get(room_uid)
+        if counters is None:
+            counters = self._rooms[room_uid] = RoomCounters()
+        return counters
+
+    def count(self, uid, room_uid, start, end):
+        """Count a booking, replacing what was counted for it before."""
+        current = self._bookings.get(uid)
+        if current == (room_uid, start, end):
+            return
+        if current is not None:
+            self._counters(current[0]).add(current[1], current[2], -1)
+        self._counters(room_uid).add(start, end)
+        self._bookings[uid] = (room_uid, start, end)
+
+    def discount(self, uid, now=None):
+        """Forget a removed booking.
+
+        Bookings that already ended stay in the counters, only bookings
+        that are cancelled before their end are taken out.
+        """
+        current = self._bookings.pop(uid, None)
+        if current is None:
+            return
+        room_uid, start, end = current
+        if now is None:
+            now = int(time.time())
+        if end > now:
+            self._counters(room_uid).add(start, end, -1)
+
+    def clear(self):
+        self._rooms.clear()
+        self._bookings.clear()
+
+
+def get_utilization(create=False):
+    """Get the utilization aggregates of the site, or None if there are none yet."""
+    annotations = IAnnotations(api.portal.get())
+    utilization = annotations.get(ANNOTATION_KEY)
+    if utilization is None and create:
+        utilization = RoomUtilization()
+        annotations[ANNOTATION_KEY] = utilization
+    return utilization
+
+
+def booking_added(obj, event):
+    """Event subscriber counting new bookings."""
+    if obj.portal_type != 'room_booking':
+        return
+    interval = booking_index.booking_interval(obj)
+    if interval is not None:
+        get_utilization(create=True).count(obj.UID(), *interval)
+
+
+def booking_modified(obj, event):
+    """Event subscriber moving the counts of edited bookings."""
+    if obj.portal_type != 'room_booking':
+        return
+    interval = booking_index.booking_interval(obj)
+    utilization = get_utilization(create=True)
+    if interval is None:
+        utilization.discount(obj.UID())
+    else:
+        utilization.count(obj.UID(), *interval)
+
+
+def booking_removed(obj, event):
+    """Event subscriber dropping cancelled bookings from the counts."""
+    if obj.portal_type != 'room_booking':
+        return
+    utilization = get_utilization()
+    if utilization is not None:
+        utilization.discount(obj.UID())
+
+
+def summarize(counters, first, last, tz_hours=0):
+    """Fold the hourly counters of a room over ``[first, last)``.
+
+    Args:
+        counters: RoomCounters of the room, or None
+        first: First hour since the epoch (UTC)
+        last: Hour since the epoch to stop at (exclusive)
+        tz_hours: Hours the local time is ahead of UTC, for days and hours
+            of the week
+
+    Returns:
+        Tuple of a dict mapping local day number since the epoch to
+        ``[booked seconds, bookings]`` and a list of booked seconds for
+        each of the 168 local hours of the week
+    """
+    days = {}
+    week = [0] * (7 * 24)
+    if counters is None:
+        return days, week
+    for hour, seconds, starts in counters.hours(first, last):
+        local = hour + tz_hours
+        day = days.setdefault(local // 24, [0, 0])
+        day[0] += seconds
+        day[1] += starts
+        week[hour_of_week(local)] += seconds
+    return days, week
+
+
+def hours_of_week_count(first, last, tz_hours=0):
+    """Count how often each local hour of the week occurs in ``[first, last)``."""
+    total = max(last - first, 0)
+    offset = hour_of_week(first + tz_hours)
+    return [
+        total // (7 * 24) + (1 if (how - offset) % (7 * 24) < total % (7 * 24) else 0)
+        for how in range(7 * 24)
+    ]
+
+
+# Bits of the hour in the combined room and hour keys of ``_aggregate``
+HOUR_BITS = 32
+
+
+def _aggregate(rooms, starts, ends):
+    """Sum bookings into hourly counters with numpy.
+
+    Args:
+        rooms: Array of room numbers, one per booking
+        starts: Array of booking starts in epoch seconds
+        ends: Array of booking ends in epoch seconds
+
+    Returns:
+        Two ``(keys, totals)`` pairs of arrays, booked seconds and starts,
+        with one ``room << HOUR_BITS | hour`` key in ascending order for
+        every room and hour with bookings
+    """
+    first_hour = starts // HOUR
+    span = int(((ends - 1) // HOUR - first_hour).max()) + 1
+    # One column per hour a booking can touch, empty pieces are dropped
+    hours = first_hour[:, None] + numpy.arange(span)[None, :]
+    seconds = (
+        numpy.minimum(ends[:, None], (hours + 1) * HOUR)
+        - numpy.maximum(starts[:, None], hours * HOUR)
+    )
+    used = seconds > 0
+    room_keys = (rooms << HOUR_BITS)[:, None]
+
+    def sum_by(keys, weights=None):
+        unique, inverse = numpy.unique(keys, return_inverse=True)
+        totals = numpy.bincount(inverse.ravel(), weights=weights, minlength=len(unique))
+        return unique, totals.astype(numpy.int64)
+
+    booked = sum_by((room_keys + hours)[used], seconds[used])
+    started = sum_by(room_keys[:, 0] + first_hour)
+    return booked, started
+
+
+def _recompute_numpy(utilization, room_uids, records):
+    rooms, starts, ends = (numpy.array(column, dtype=numpy.int64) for column in zip(*records))
+    booked, started = _aggregate(rooms, starts, ends)
+
+    for (keys, totals), attribute in ((booked, 'booked'), (started, 'starts')):
+        key_rooms = keys >> HOUR_BITS
+        key_hours = keys & ((1 << HOUR_BITS) - 1)
+        # Keys are sorted by room first, so every room is one slice
+        bounds = numpy.searchsorted(key_rooms, numpy.arange(len(room_uids) + 1))
+        for number, room_uid in enumerate(room_uids):
+            first, last = bounds[number], bounds[number + 1]
+            if first < last:
+                getattr(utilization._counters(room_uid), attribute).update(
+                    dict(zip(key_hours[first:last].tolist(), totals[first:last].tolist()))
+                )
+
+
+def recompute():
+    """Rebuild the utilization aggregates of all bookings.
+
+    Live bookings are read from the booking index and archived ones from
+    the booking archive, so no booking object is loaded.
+
+    Returns the number of counted bookings.
+    """
+    utilization = get_utilization(create=True)
+    utilization.clear()
+
+    room_numbers = {}
+    records = []
+    index = booking_index.get_index()
+    if index is not None:
+        for uid, (room_uid, start, end) in index.items():
+            utilization._bookings[uid] = (room_uid, start, end)
+            records.append((room_numbers.setdefault(room_uid, len(room_numbers)), start, end))
+    archive = booking_archive.get_archive()
+    if archive is not None:
+        for record in archive.records():
+            number = room_numbers.setdefault(record['room_uid'], len(room_numbers))
+            records.append((number, record['start'], record['end']))
+
+    room_uids = list(room_numbers)
+    if numpy is not None and records:
+        _recompute_numpy(utilization, room_uids, records)
+    else:
+        for number, start, end in records:
+            utilization._counters(room_uids[number]).add(start, end)
+
+    logger.info(f"Recomputed room utilization of {len(records)} bookings in {len(room_uids)} rooms")
+    return len(records)
@@ -0,0 +1,176 @@
+"""Transports delivering alerts by email, SMS and push notification.
+
+A transport is a named ``IAlertTransport`` utility. It is handed an alert
+dict with the ``from``, ``subject``, ``html`` and plain ``text`` of the
+alert, its ``url``, optional shorter ``sms`` and ``push`` texts and the
+``personalize`` values of the email template. It makes its own kind of
+message out of it and returns ``(state, detail)`` for each address, with
+the states of ``bulk_email``.
+
+The email transport sends through the bulk dispatcher. There is no SMS
+gateway or push service yet: ``sms`` and ``push`` are local stand-ins
+keeping what they would have sent in memory, for tests and benchmarks. A
+package with a real gateway registers it under the same name in its
+overrides.zcml. ``ALERT_TRANSPORTS`` lists the transports alerts use.
+"""
+
+from collections import deque
+from zope.component import queryUtility
+from zope.interface import implementer
+from . import bulk_email
+from .interfaces import IAlertTransport
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+logger = logging.getLogger('retreat.transports')
+
+DEFAULT_TRANSPORTS = 'email,sms,push'
+
+SMS_LENGTH = 160
+PUSH_LENGTH = 180
+
+# E.164, after dropping spaces, dashes, dots and parentheses
+PHONE = re.compile(r'^\+[1-9][0-9]{6,14}$')
+
+
+def shorten(text, length):
+    """Collapse whitespace and cut ``text`` to ``length`` characters."""
+    text = ' '.join((text or '').split())
+    return text if len(text) <= length else text[:length - 1] + '…'
+
+
+@implementer(IAlertTransport)
+class EmailTransport:
+    """Emails every address through the bulk dispatcher.
+
+    Its requests go ahead of other emails in the rate limit of the process.
+    """
+
+    name = 'email'
+    threads = bulk_email.DISPATCH_THREADS
+
+    def __init__(self, dispatcher=None):
+        self._dispatcher = dispatcher
+
+    @property
+    def dispatcher(self):
+        # Built on first use, the provider settings come from the environment
+        if self._dispatcher is None:
+            dispatcher = bulk_email.get_dispatcher()
+            dispatcher.priority = True
+            # Batches are sent concurrently by the caller already
+            dispatcher.threads = 1
+            self._dispatcher = dispatcher
+        return self._dispatcher
+
+    @property
+    def batch_size(self):
+        return self.dispatcher.batch_size
+
+    def address(self, user):
+        return user.getProperty('email', '') or None
+
+    def send(self, alert, addresses):
+        email_data = {key: alert[key] for key in ('from', 'subject', 'html', 'personalize')
+                      if key in alert}
+        return self.dispatcher.dispatch(email_data, addresses)
+
+
+def sms_message(alert):
+    return shorten(alert.get('sms') or f"{alert['subject']}: {alert['text']}", SMS_LENGTH)
+
+
+def push_message(alert):
+    return {
+        'title': alert['subject'],
+        'body': shorten(alert.get('push') or alert['text'], PUSH_LENGTH),
+        'url': alert.get('url'),
+    }
+
+
+class LocalTransport:
+    """Keeps the messages it would send in memory instead of sending them.
+
+    Args:
+        message: Callable making the message of an alert
+        latency: Seconds each send call takes, like a request to a gateway
+        keep: Number of sent messages kept in ``sent``
+    """
+
+    name = None
+    batch_size = 100
+    threads = 4
+
+    def __init__(self, message, latency=0, keep=10000):
+        self.message = message
+        self.latency = latency
+        self.sent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def valid(self, address):
+        return True
+
+    def send(self, alert, addresses):
+        message = self.message(alert)
+        if self.latency:
+            time.sleep(self.latency)
+        results = {}
+        with self._lock:
+            for address in addresses:
+                if self.valid(address):
+                    self.sent.append((address, message))
+                    results[address] = (bulk_email.SENT, f'local-{uuid.uuid4().hex[:12]}')
+                else:
+                    results[address] = (bulk_email.FAILED, f'Invalid {self.name} address')
+        logger.info(f"LOCAL {self.name.upper()} - Would send '{alert['subject']}' to "
+                    f"{len(addresses)} recipients")
+        return results
+
+
+@implementer(IAlertTransport)
+class LocalSmsTransport(LocalTransport):
+    """Stand-in for an SMS gateway, texting the ``mobile`` property of users."""
+
+    name = 'sms'
+
+    def __init__(self, latency=0, keep=10000):
+        super().__init__(sms_message, latency, keep)
+
+    def address(self, user):
+        number = re.sub(r'[\s().-]', '', user.getProperty('mobile', '') or '')
+        return number or None
+
+    def valid(self, address):
+        return bool(PHONE.match(address))
+
+
+@implementer(IAlertTransport)
+class LocalPushTransport(LocalTransport):
+    """Stand-in for a push service, which knows the devices of each user id."""
+
+    name = 'push'
+
+    def __init__(self, latency=0, keep=10000):
+        super().__init__(push_message, latency, keep)
+
+    def address(self, user):
+        return user.getId()
+
+
+def get_transports():
+    """Return the transports named in ``ALERT_TRANSPORTS``, in that order."""
+    transports = []
+    for name in os.environ.get('ALERT_TRANSPORTS', DEFAULT_TRANSPORTS).split(','):
+        name = name.strip()
+        if not name:
+            continue
+        transport = queryUtility(IAlertTransport, name=name)
+        if transport is None:
+            logger.warning(f"No alert transport named '{name}'")
+        else:
+            transports.append(transport)
+    return transports
@@ -0,0 +1,146 @@
+"""Upgrade steps for the retreat profile"""
+
+from plone import api
+from .booking_index import rebuild_index
+from .booking_utils import BOOKINGS_PATH
+from .booking_utils import get_bookings_container
+from .identity_aliases import rebuild_aliases
+from .recipients import rebuild_recipients
+from .room_utilization import recompute
+import logging
+import transaction
+
+logger = logging.getLogger('retreat.upgrades')
+
+PROFILE_ID = 'profile-retreat:default'
+
+# Indexes added to the catalog in profile version 1001
+ISSUE_INDEXES = [
+    'status',
+    'priority',
+    'location',
+    'assigned_to',
+    'issue_priority_rank',
+    'issue_status_rank',
+]
+
+# Indexes added to the catalog in profile version 1003
+BOOKING_INDEXES = [
+    'room_uid',
+    'start_datetime',
+    'end_datetime',
+]
+
+# Indexes added to the catalog in profile version 1004
+OWNER_INDEXES = [
+    'booking_owner',
+]
+
+# Indexes added to the catalog in profile version 1006
+ROOM_INDEXES = [
+    'capacity',
+]
+
+# Number of objects reindexed between savepoints
+BATCH_SIZE = 200
+
+
+def reindex_type(portal_type, idxs=None, update_metadata=True, batch_size=BATCH_SIZE):
+    """Reindex all content of a type, optionally limited to some indexes.
+
+    Works in batches with a savepoint after each one, so the ZODB cache can
+    release the objects already processed.
+
+    Returns the number of reindexed objects.
+    """
+    catalog = api.portal.get_tool('portal_catalog')
+    brains = catalog.unrestrictedSearchResults(portal_type=portal_type)
+    total = len(brains)
+    for i, brain in enumerate(brains, 1):
+        obj = brain._unrestrictedGetObject()
+        catalog.catalog_object(
+            obj,
+            uid=brain.getPath(),
+            idxs=idxs or [],
+            update_metadata=update_metadata
+        )
+        if i % batch_size == 0:
+            transaction.savepoint(optimistic=True)
+            logger.info(f"Reindexed {i}/{total} {portal_type} objects")
+    logger.info(f"Reindexed {total} {portal_type} objects")
+    return total
+
+
+def reindex_issues(idxs=None, update_metadata=True, batch_size=BATCH_SIZE):
+    """Reindex all issues. Returns the number of reindexed issues."""
+    return reindex_type('issue', idxs, update_metadata, batch_size)
+
+
+def reindex_bookings(idxs=None, update_metadata=True, batch_size=BATCH_SIZE):
+    """Reindex all room bookings. Returns the number of reindexed bookings."""
+    return reindex_type('room_booking', idxs, update_metadata, batch_size)
+
+
+def add_issue_indexes(context):
+    """Add the issue indexes and fill only those, plus the summary metadata."""
+    setup_tool = api.portal.get_tool('portal_setup')
+    setup_tool.runImportStepFromProfile(PROFILE_ID, 'catalog')
+    reindex_issues(idxs=ISSUE_INDEXES)
+
+
+def build_booking_index(context):
+    """Index existing room bookings in the per-room interval index."""
+    rebuild_index()
+
+
+def add_booking_indexes(context):
+    """Add the booking room and time indexes and fill them for existing bookings."""
+    setup_tool = api.portal.get_tool('portal_setup')
+    setup_tool.runImportStepFromProfile(PROFILE_ID, 'catalog')
+    reindex_bookings(idxs=BOOKING_INDEXES)
+
+
+def add_booking_owner_index(context):
+    """Build the identity alias map and index the owner of existing bookings."""
+    setup_tool = api.portal.get_tool('portal_setup')
+    setup_tool.runImportStepFromProfile(PROFILE_ID, 'catalog')
+    rebuild_aliases()
+    reindex_bookings(idxs=OWNER_INDEXES)
+
+
+def partition_bookings(context):
+    """Move bookings from the flat bookings folder into monthly containers."""
+    bookings = api.content.get(path=BOOKINGS_PATH)
+    if bookings is None:
+        return
+    flat = [obj for obj in bookings.objectValues() if obj.portal_type == 'room_booking']
+    for i, booking in enumerate(flat, 1):
+        container = get_bookings_container(booking.start_datetime)
+        api.content.move(source=booking, target=container)
+        if i % BATCH_SIZE == 0:
+            transaction.savepoint(optimistic=True)
+            logger.info(f"Moved {i}/{len(flat)} bookings")
+    logger.info(f"Moved {len(flat)} bookings into monthly containers")
+
+
+def add_capacity_index(context):
+    """Add the room capacity index and fill it for existing rooms."""
+    setup_tool = api.portal.get_tool('portal_setup')
+    setup_tool.runImportStepFromProfile(PROFILE_ID, 'catalog')
+    reindex_type('conference_room', idxs=ROOM_INDEXES)
+
+
+def build_room_utilization(context):
+    """Count existing and archived bookings into the utilization aggregates."""
+    recompute()
+
+
+def build_recipient_index(context):
+    """Index the contact details of existing users for notifications."""
+    rebuild_recipients()
+
+
+def rebuild_owner_aliases(context):
+    """Give user ids claimed as alias by other users back to their users."""
+    rebuild_aliases()
+    reindex_bookings(idxs=OWNER_INDEXES)
@@ -1,7 +1,7 @@
 """Public API endpoint for user display names"""
 
-from plone import api
 from plone.restapi.services import Service
+from . import display_names
 import json
 
 
@@ -14,16 +14,62 @@ class UserDisplayName(Service):
             self.request.response.setStatus(400)
             return {'error': 'user_id parameter is required'}
         
-        # Get the user
-        user = api.user.get(userid=user_id)
-        if not user:
+        # Get the fullname from the shared display name cache
+        fullname = display_names.get_fullname(user_id)
+        if fullname is None:
             return {'display_name': user_id}  # Return the ID if user not found
         
         # Get display name (fullname or username)
-        fullname = user.getProperty('fullname', '')
-        display_name = fullname if fullname else user.getId()
+        display_name = fullname if fullname else user_id
         
         return {
             'user_id': user_id,
             'display_name': display_name
-        }
\ No newline at end of file
+        }
+
+class UserDisplayNames(Service):
+    """Get display names for many users in one request - public endpoint
+    
+    Accepts repeated ``user_id`` query parameters on GET, or a JSON body
+    ``{"user_ids": [...]}`` on POST.
+    """
+    
+    # Maximum number of user ids resolved per request
+    max_user_ids = 500
+
+    def reply(self):
+        if self.request.get('REQUEST_METHOD') == 'POST':
+            try:
+                data = json.loads(self.request.get('BODY') or '{}')
+            except ValueError:
+                self.request.response.setStatus(400)
+                return {'error': 'Invalid JSON body'}
+            user_ids = data.get('user_ids') or []
+        else:
+            user_ids = self.request.form.get('user_id') or []
+        if isinstance(user_ids, str):
+            user_ids = [user_ids]
+        
+        if not user_ids:
+            self.request.response.setStatus(400)
+            return {'error': 'user_id parameter is required'}
+        if len(user_ids) > self.max_user_ids:
+            self.request.response.setStatus(400)
+            return {'error': f'At most {self.max_user_ids} user ids can be requested at once'}
+        
+        fullnames = display_names.get_fullnames(str(user_id) for user_id in user_ids)
+        
+        # Same fallback as the single endpoint: the user id itself
+        return {
+            'display_names': {
+                user_id: fullname or user_id
+                for user_id, fullname in fullnames.items()
+            }
+        }
+
+
+class DisplayNameCacheStats(Service):
+    """Hit/miss counters of the display name cache of this process"""
+
+    def reply(self):
+        return display_names.stats()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Stress test concurrent @activities POSTs against a single issue
+
+Creates a throwaway issue, posts comments to it from many threads at once
+and checks that every comment ended up in the activity log exactly once.
+Run it against a local instance with several WSGI threads enabled.
+"""
+
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = os.environ.get('PLONE_URL', 'http://localhost:8080/Plone')
+AUTH = ('admin', os.environ.get('ADMIN_PASSWORD', 'admin'))
+HEADERS = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+
+WORKERS = int(os.environ.get('STRESS_WORKERS', '16'))
+COMMENTS = int(os.environ.get('STRESS_COMMENTS', '200'))
+
+
+def create_issue():
+    """Create the issue the comments are posted to"""
+    response = requests.post(
+        f"{BASE_URL}/++api++/issues",
+        json={
+            '@type': 'issue',
+            'title': f'Activity stress test {uuid.uuid4().hex[:8]}',
+            'location': 'Stress test',
+            'issue_description': 'Created by stress_test_activities.py',
+        },
+        auth=AUTH,
+        headers=HEADERS,
+    )
+    response.raise_for_status()
+    return response.json()['@id']
+
+
+def post_comment(issue_url, text):
+    """POST one comment, returning the status code"""
+    session = requests.Session()
+    response = session.post(
+        f"{issue_url}/@activities",
+        json={'text': text},
+        auth=AUTH,
+        headers=HEADERS,
+    )
+    return response.status_code
+
+
+def main():
+    print(f"Creating test issue on {BASE_URL}...")
+    issue_url = create_issue()
+    print(f"✓ Created {issue_url}")
+
+    texts = [f'stress comment {i} {uuid.uuid4().hex}' for i in range(COMMENTS)]
+
+    print(f"Posting {COMMENTS} comments from {WORKERS} threads...")
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        statuses = list(pool.map(lambda text: post_comment(issue_url, text), texts))
+    elapsed = time.time() - started
+
+    failed = [status for status in statuses if status != 201]
+    print(f"  {COMMENTS - len(failed)} succeeded, {len(failed)} failed "
+          f"in {elapsed:.2f}s ({COMMENTS / elapsed:.1f} req/s)")
+
+    response = requests.get(f"{issue_url}/@activities", auth=AUTH, headers=HEADERS)
+    response.raise_for_status()
+    stored = [
+        item['data']['text'] for item in response.json()['items']
+        if item['type'] == 'comment'
+    ]
+
+    missing = set(texts) - set(stored)
+    duplicated = len(stored) - len(set(stored))
+    print(f"  {len(stored)} comments stored, {len(missing)} missing, {duplicated} duplicated")
+
+    if failed or missing or duplicated:
+        print("✗ Stress test failed")
+        return 1
+    print("✓ All comments stored exactly once")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
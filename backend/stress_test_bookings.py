@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""Stress test concurrent @book-room requests against a single room
+
+First fires many requests for the very same slot at once and checks that
+exactly one of them succeeds. Then books random, partly overlapping slots
+from many threads and checks that no two stored bookings of the room
+overlap. Run it against a local instance with several WSGI threads or
+workers enabled. The bookings created are cancelled at the end.
+"""
+
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+BASE_URL = os.environ.get('PLONE_URL', 'http://localhost:8080/Plone')
+AUTH = ('admin', os.environ.get('ADMIN_PASSWORD', 'admin'))
+HEADERS = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+
+WORKERS = int(os.environ.get('STRESS_WORKERS', '16'))
+REQUESTS = int(os.environ.get('STRESS_BOOKINGS', '200'))
+
+
+def find_room():
+    """UID and title of the first conference room"""
+    response = requests.get(
+        f"{BASE_URL}/++api++/@search",
+        params={'portal_type': 'conference_room', 'metadata_fields': 'UID'},
+        auth=AUTH,
+        headers=HEADERS,
+    )
+    response.raise_for_status()
+    items = response.json()['items']
+    if not items:
+        return None
+    return items[0]['UID'], items[0]['title']
+
+
+def book(room_uid, start, end):
+    """POST one booking, returning the status code and response body"""
+    session = requests.Session()
+    response = session.post(
+        f"{BASE_URL}/++api++/@book-room",
+        json={
+            'room': room_uid,
+            'start_datetime': start.isoformat(),
+            'end_datetime': end.isoformat(),
+            'purpose': 'Created by stress_test_bookings.py',
+            'title': f'Booking stress test {uuid.uuid4().hex[:8]}',
+        },
+        auth=AUTH,
+        headers=HEADERS,
+    )
+    return response.status_code, response.json()
+
+
+def run(label, room_uid, slots):
+    """Book all slots concurrently, returning the created bookings"""
+    print(f"{label}: {len(slots)} requests from {WORKERS} threads...")
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(lambda slot: book(room_uid, *slot), slots))
+    elapsed = time.time() - started
+
+    created = [body for status, body in results if status == 201]
+    rejected = [body for status, body in results if status == 409]
+    errors = [status for status, _body in results if status not in (201, 409)]
+    print(f"  {len(created)} created, {len(rejected)} rejected as conflicts, "
+          f"{len(errors)} errors in {elapsed:.2f}s")
+    return created, errors
+
+
+def overlaps(bookings):
+    """Pairs of bookings whose times overlap"""
+    ordered = sorted(bookings, key=lambda b: b['start_datetime'])
+    return [
+        (a['title'], b['title'])
+        for a, b in zip(ordered, ordered[1:])
+        if b['start_datetime'] < a['end_datetime']
+    ]
+
+
+def cancel(bookings):
+    for booking in bookings:
+        requests.delete(
+            f"{BASE_URL}/++api++/@cancel-booking/{booking['UID']}",
+            auth=AUTH,
+            headers=HEADERS,
+        )
+
+
+def main():
+    room = find_room()
+    if room is None:
+        print("✗ No conference room found, run setup_conference_rooms.py first")
+        return 1
+    room_uid, room_title = room
+    print(f"Booking {room_title} on {BASE_URL}")
+    print("-" * 60)
+
+    # A random day far enough ahead not to collide with real bookings
+    day = datetime(2030, 1, 1) + timedelta(days=random.randrange(3000))
+    failed = False
+    created = []
+
+    try:
+        # Everybody wants the same slot
+        start = day.replace(hour=14)
+        same_slot = [(start, start + timedelta(minutes=90))] * WORKERS
+        batch, errors = run("Same slot", room_uid, same_slot)
+        created += batch
+        if len(batch) != 1 or errors:
+            print(f"✗ Expected exactly one booking, got {len(batch)}")
+            failed = True
+
+        # Random slots of 30 minutes to 3 hours over one day
+        slots = []
+        for _ in range(REQUESTS):
+            start = day + timedelta(days=1, minutes=30 * random.randrange(40))
+            slots.append((start, start + timedelta(minutes=30 * random.randint(1, 6))))
+        batch, errors = run("Random slots", room_uid, slots)
+        created += batch
+        if errors:
+            failed = True
+
+        double_booked = overlaps(created)
+        if double_booked:
+            print(f"✗ {len(double_booked)} overlapping bookings: {double_booked[:5]}")
+            failed = True
+    finally:
+        print(f"Cancelling {len(created)} test bookings...")
+        cancel(created)
+
+    if failed:
+        print("✗ Stress test failed")
+        return 1
+    print("✓ No double bookings")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
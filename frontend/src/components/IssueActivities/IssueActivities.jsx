@@ -3,7 +3,7 @@
  * Displays and manages activities and comments for an issue.
  */
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Segment,
   Header,
@@ -27,16 +27,21 @@ const IssueActivities = ({ content }) => {
   const [loading, setLoading] = useState(true);
   const [commenting, setCommenting] = useState(false);
   const [comment, setComment] = useState('');
+  // Cursor of the newest activity we have, so refreshes only fetch new ones
+  const sinceCursor = useRef(null);
   
   const token = useSelector((state) => state.userSession.token);
   const currentUser = useSelector((state) => state.users.user);
 
-  // Fetch activities
-  const fetchActivities = async () => {
+  // Fetch activities - only the ones added since the last fetch when possible
+  const fetchActivities = async (incremental = false) => {
     try {
       // Get the path from the content ID and prepend the API prefix
       const contentPath = content['@id'].replace(/^.*\/\/[^\/]+/, ''); // Remove protocol and host
-      const apiUrl = `/++api++${contentPath}/@activities`;
+      const since = incremental && sinceCursor.current;
+      const apiUrl = since
+        ? `/++api++${contentPath}/@activities?since=${encodeURIComponent(since)}`
+        : `/++api++${contentPath}/@activities`;
       
       const response = await fetch(apiUrl, {
         headers: {
@@ -48,7 +53,12 @@ const IssueActivities = ({ content }) => {
       if (response.ok) {
         const data = await response.json();
         console.log('Activities data:', data.items); // Debug log
-        setActivities(data.items || []);
+        if (since) {
+          setActivities((current) => [...current, ...(data.items || [])]);
+        } else {
+          setActivities(data.items || []);
+        }
+        sinceCursor.current = data.batching?.since || sinceCursor.current;
       } else {
         console.error('Failed to fetch activities:', response.status, response.statusText);
       }
@@ -61,6 +71,7 @@ const IssueActivities = ({ content }) => {
   };
 
   useEffect(() => {
+    sinceCursor.current = null;
     fetchActivities();
   }, [content['@id'], token]);
 
@@ -86,7 +97,7 @@ const IssueActivities = ({ content }) => {
       
       if (response.ok) {
         setComment('');
-        await fetchActivities();
+        await fetchActivities(true);
         toast.success('Comment added successfully');
       } else {
         console.error('Failed to add comment:', response.status, response.statusText);
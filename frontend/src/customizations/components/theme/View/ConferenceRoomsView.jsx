@@ -176,29 +176,29 @@ const ConferenceRoomsView = (props) => {
     if (uniqueUserIds.length === 0) return;
     
     const newDisplayNames = {};
+    uniqueUserIds.forEach((userId) => {
+      newDisplayNames[userId] = userId; // Fallback to ID
+    });
     
-    for (const userId of uniqueUserIds) {
-      try {
-        const response = await fetch(
-          `/++api++/${content?.['@id'] ? content['@id'].replace(window.location.origin, '') : '/'}/@user-display-name?user_id=${encodeURIComponent(userId)}`,
-          {
-            headers: {
-              'Accept': 'application/json',
-            },
-            credentials: 'same-origin',
-          }
-        );
-        
-        if (response.ok) {
-          const data = await response.json();
-          newDisplayNames[userId] = data.display_name;
-        } else {
-          newDisplayNames[userId] = userId; // Fallback to ID
+    try {
+      // Resolve all names in one request via the public batch endpoint
+      const query = uniqueUserIds.map((id) => `user_id=${encodeURIComponent(id)}`).join('&');
+      const response = await fetch(
+        `/++api++/${content?.['@id'] ? content['@id'].replace(window.location.origin, '') : '/'}/@user-display-names?${query}`,
+        {
+          headers: {
+            'Accept': 'application/json',
+          },
+          credentials: 'same-origin',
         }
-      } catch (error) {
-        console.error('Error fetching display name for', userId, error);
-        newDisplayNames[userId] = userId; // Fallback to ID
+      );
+      
+      if (response.ok) {
+        const data = await response.json();
+        Object.assign(newDisplayNames, data.display_names);
       }
+    } catch (error) {
+      console.error('Error fetching display names for', uniqueUserIds, error);
     }
     
     setUserDisplayNames(prev => ({ ...prev, ...newDisplayNames }));
@@ -419,8 +419,9 @@ const ConferenceRoomsView = (props) => {
     setCancellingBooking(bookingId);
     
     try {
-      // Extract booking ID from full path
-      const bookingIdOnly = bookingId.split('/').pop();
+      // Cancel by UID, booking ids are only unique within a month
+      const booking = bookings.find(b => b['@id'] === bookingId);
+      const bookingIdOnly = booking?.UID || bookingId.split('/').pop();
       
       // Use custom cancel endpoint for OAuth compatibility
       const response = await fetch(`/++api++/@cancel-booking/${bookingIdOnly}`, {
@@ -485,18 +486,18 @@ const ConferenceRoomsView = (props) => {
       }
       
       const bookingData = {
-        '@type': 'room_booking',
         title: `Booking: ${selectedRoom.title} - ${userDisplayName}`,
-        room: selectedRoom['@id'],
+        room: selectedRoom.UID,
         start_datetime: formatAsUTC(bookingForm.start_datetime),
         end_datetime: formatAsUTC(bookingForm.end_datetime),
         purpose: bookingForm.purpose || ''
       };
 
       console.log('Booking data to send:', bookingData);
-      console.log('API URL:', '/++api++/conference-rooms/bookings');
+      console.log('API URL:', '/++api++/@book-room');
 
-      const response = await fetch('/++api++/conference-rooms/bookings', {
+      // @book-room checks for conflicts and creates the booking atomically
+      const response = await fetch('/++api++/@book-room', {
         method: 'POST',
         headers: {
           'Accept': 'application/json',
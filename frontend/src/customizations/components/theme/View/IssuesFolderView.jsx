@@ -17,7 +17,8 @@ import {
   Grid,
   Statistic,
   Card,
-  Loader
+  Loader,
+  Button
 } from 'semantic-ui-react';
 import { FormattedDate } from '@plone/volto/components';
 import { flattenToAppURL } from '@plone/volto/helpers';
@@ -32,9 +33,11 @@ const IssuesFolderView = (props) => {
   const [priorityFilter, setPriorityFilter] = useState('all');
   const [locationFilter, setLocationFilter] = useState('all');
   const [sortBy, setSortBy] = useState('created');
-  const [issuesWithFullData, setIssuesWithFullData] = useState([]);
-  const [uniqueLocations, setUniqueLocations] = useState([]);
+  const [issues, setIssues] = useState([]);
+  const [itemsTotal, setItemsTotal] = useState(0);
+  const [facets, setFacets] = useState({ total: 0, status: {}, priority: {}, location: {} });
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [creatorNames, setCreatorNames] = useState({});
   
   // Configuration
@@ -73,160 +76,116 @@ const IssuesFolderView = (props) => {
     { key: 'status', text: 'Status', value: 'status' }
   ];
 
-  // Fetch all issues system-wide
-  useEffect(() => {
-    const fetchAllIssues = async () => {
-      setLoading(true);
+  const pageSize = 50;
+
+  // Fetch one page of issue summaries, filtered and sorted on the server
+  const fetchIssues = async (bStart = 0) => {
+    const headers = {
+      'Accept': 'application/json',
+    };
+    
+    // Add auth token if available
+    if (token) {
+      headers['Authorization'] = `Bearer ${token}`;
+    }
+    
+    const params = new URLSearchParams({
+      sort_on: sortBy,
+      b_start: bStart,
+      b_size: pageSize,
+    });
+    if (statusFilter !== 'all') params.append('status', statusFilter);
+    if (priorityFilter !== 'all') params.append('priority', priorityFilter);
+    if (locationFilter !== 'all') params.append('location', locationFilter);
+    
+    const response = await fetch(`/++api++/@issues-summary?${params.toString()}`, {
+      headers,
+      credentials: 'same-origin',
+    });
+    if (!response.ok) {
+      throw new Error(`Failed to fetch issues: ${response.status}`);
+    }
+    const data = await response.json();
+    
+    // Fetch creator names we don't know yet
+    const uniqueCreators = [...new Set((data.items || []).map(i => i.Creator).filter(Boolean))]
+      .filter(id => !creatorNames[id]);
+    if (uniqueCreators.length > 0) {
+      const names = {};
+      uniqueCreators.forEach((creatorId) => {
+        names[creatorId] = creatorId;
+      });
       try {
-        // Search for all issues in the system
-        const headers = {
-          'Accept': 'application/json',
-        };
-        
-        // Add auth token if available
-        if (token) {
-          headers['Authorization'] = `Bearer ${token}`;
-        }
-        
-        const searchResponse = await fetch('/++api++/@search?portal_type=issue&metadata_fields=created&metadata_fields=modified&metadata_fields=location&metadata_fields=status&metadata_fields=priority&metadata_fields=Creator&b_size=1000&fullobjects=true', {
-          headers,
-          credentials: 'same-origin',
+        // Resolve all creators in one request via the public batch endpoint
+        const anyIssuePath = data.items[0]['@id'].replace(/^.*\/\/[^\/]+/, '');
+        const query = uniqueCreators.map((id) => `user_id=${encodeURIComponent(id)}`).join('&');
+        const namesResponse = await fetch(`/++api++${anyIssuePath}/@user-display-names?${query}`, {
+          headers: { 'Accept': 'application/json' }
         });
-        
-        if (searchResponse.ok) {
-          const searchData = await searchResponse.json();
-          const issues = searchData.items || [];
-          
-          // Process issues to add parent path information
-          const processedIssues = issues.map(issue => {
-            // Extract parent path from the @id
-            const fullPath = issue['@id'];
-            const pathParts = fullPath.split('/').filter(p => p);
-            // Remove the domain and the issue itself to get parent path
-            const parentParts = pathParts.slice(pathParts.indexOf('Plone') + 1, -1);
-            const parentPath = parentParts.length > 0 ? parentParts.join(' > ') : 'Home';
-            
-            return {
-              ...issue,
-              parentPath: parentPath
-            };
-          });
-          
-          setIssuesWithFullData(processedIssues);
-          
-          // Extract unique locations
-          const locations = [...new Set(processedIssues.map(i => i.location).filter(Boolean))];
-          setUniqueLocations(locations.sort());
-          
-          // Fetch creator names
-          const uniqueCreators = [...new Set(processedIssues.map(i => i.creators?.[0] || i.Creator).filter(Boolean))];
-          const names = {};
-          
-          for (const creatorId of uniqueCreators) {
-            try {
-              // Use any issue's path to call the public endpoint
-              const anyIssuePath = processedIssues[0]['@id'].replace(/^.*\/\/[^\/]+/, '');
-              const response = await fetch(`/++api++${anyIssuePath}/@user-display-name?user_id=${creatorId}`, {
-                headers: { 'Accept': 'application/json' }
-              });
-              if (response.ok) {
-                const data = await response.json();
-                names[creatorId] = data.display_name;
-              } else {
-                names[creatorId] = creatorId;
-              }
-            } catch (error) {
-              names[creatorId] = creatorId;
-            }
-          }
-          
-          setCreatorNames(names);
+        if (namesResponse.ok) {
+          const namesData = await namesResponse.json();
+          Object.assign(names, namesData.display_names);
         }
+      } catch (error) {
+        console.error('Error fetching creator names:', error);
+      }
+      setCreatorNames(prev => ({ ...prev, ...names }));
+    }
+    
+    return data;
+  };
+
+  // Reload the first page whenever filters or sorting change
+  useEffect(() => {
+    const loadIssues = async () => {
+      setLoading(true);
+      try {
+        const data = await fetchIssues(0);
+        setIssues(data.items || []);
+        setItemsTotal(data.items_total || 0);
+        setFacets(data.facets);
       } catch (error) {
         console.error('Error fetching issues:', error);
-        setIssuesWithFullData([]);
+        setIssues([]);
+        setItemsTotal(0);
       } finally {
         setLoading(false);
       }
     };
 
-    fetchAllIssues();
-  }, []); // Only run once on mount
-
-  // Apply filters and sorting
-  const filteredAndSortedIssues = useMemo(() => {
-    let filtered = issuesWithFullData;
+    loadIssues();
+  }, [statusFilter, priorityFilter, locationFilter, sortBy]);
 
-    // Status filter
-    if (statusFilter !== 'all') {
-      filtered = filtered.filter(issue => 
-        (issue.status?.token || issue.status) === statusFilter
-      );
+  // Append the next page
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const data = await fetchIssues(issues.length);
+      setIssues(prev => [...prev, ...(data.items || [])]);
+      setItemsTotal(data.items_total || 0);
+    } catch (error) {
+      console.error('Error fetching issues:', error);
+    } finally {
+      setLoadingMore(false);
     }
+  };
 
-    // Priority filter
-    if (priorityFilter !== 'all') {
-      filtered = filtered.filter(issue => 
-        (issue.priority?.token || issue.priority) === priorityFilter
-      );
-    }
-
-    // Location filter
-    if (locationFilter !== 'all') {
-      filtered = filtered.filter(issue => 
-        issue.location === locationFilter
-      );
-    }
-
-    // Sorting
-    const sorted = [...filtered].sort((a, b) => {
-      switch (sortBy) {
-        case 'priority':
-          const priorityOrder = { critical: 0, high: 1, normal: 2, low: 3 };
-          const aPriority = priorityOrder[a.priority?.token || a.priority] || 2;
-          const bPriority = priorityOrder[b.priority?.token || b.priority] || 2;
-          return aPriority - bPriority;
-        case 'status':
-          const statusOrder = { new: 0, in_progress: 1, resolved: 2 };
-          const aStatus = statusOrder[a.status?.token || a.status] || 0;
-          const bStatus = statusOrder[b.status?.token || b.status] || 0;
-          return aStatus - bStatus;
-        case 'created':
-        default:
-          // Handle missing dates
-          const aDate = a.created ? new Date(a.created) : new Date(0);
-          const bDate = b.created ? new Date(b.created) : new Date(0);
-          return bDate - aDate;
-      }
-    });
-
-    return sorted;
-  }, [issuesWithFullData, statusFilter, priorityFilter, locationFilter, sortBy]);
-
-  // Calculate statistics
-  const stats = useMemo(() => {
-    const counts = {
-      total: issuesWithFullData.length,
-      new: 0,
-      in_progress: 0,
-      resolved: 0,
-      critical: 0,
-      high: 0
-    };
+  const filteredAndSortedIssues = issues;
 
-    issuesWithFullData.forEach(issue => {
-      const status = issue.status?.token || issue.status;
-      const priority = issue.priority?.token || issue.priority;
-      
-      if (status === 'new') counts.new++;
-      if (status === 'in_progress') counts.in_progress++;
-      if (status === 'resolved') counts.resolved++;
-      if (priority === 'critical') counts.critical++;
-      if (priority === 'high') counts.high++;
-    });
+  const uniqueLocations = useMemo(
+    () => Object.keys(facets.location || {}).sort(),
+    [facets]
+  );
 
-    return counts;
-  }, [issuesWithFullData]);
+  // Statistics over all issues, counted by the server
+  const stats = {
+    total: facets.total || 0,
+    new: facets.status?.new || 0,
+    in_progress: facets.status?.in_progress || 0,
+    resolved: facets.status?.resolved || 0,
+    critical: facets.priority?.critical || 0,
+    high: facets.priority?.high || 0
+  };
 
   // Render issue row for table
   const renderIssueRow = (issue) => {
@@ -469,6 +428,14 @@ const IssuesFolderView = (props) => {
                 {filteredAndSortedIssues.map(renderIssueCard)}
               </Card.Group>
             </div>
+
+            {issues.length < itemsTotal && (
+              <Segment basic textAlign="center">
+                <Button onClick={loadMore} loading={loadingMore} disabled={loadingMore}>
+                  Load more ({itemsTotal - issues.length} remaining)
+                </Button>
+              </Segment>
+            )}
           </>
         )}
         </>
@@ -60,8 +60,8 @@ const RoomBookingView = (props) => {
     setError(null);
     
     try {
-      // Extract booking ID from content
-      const bookingId = content.id || content['@id'].split('/').pop();
+      // Cancel by UID, booking ids are only unique within a month
+      const bookingId = content.UID || content.id || content['@id'].split('/').pop();
       
       // Use custom cancel endpoint for OAuth compatibility
       const response = await fetch(`/++api++/@cancel-booking/${bookingId}`, {